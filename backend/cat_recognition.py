@@ -7,6 +7,9 @@ from typing import Dict, Iterable, List, Optional, Tuple
 import numpy as np
 from PIL import Image
 
+from backend.lsh import LEGACY_HASH_VERSION, ProjectionHasher, legacy_hash
+from backend.tracing import span
+
 try:
     import torch
     from torchvision import models, transforms
@@ -88,6 +91,7 @@ class CatFaceRecognizer:
         model_filename: str = "cat_resnet18.pth",
         device: Optional[str] = None,
         hash_length: Optional[int] = None,
+        hasher: Optional[ProjectionHasher] = None,
     ):
         self.model_dir = model_dir
         os.makedirs(self.model_dir, exist_ok=True)
@@ -96,6 +100,7 @@ class CatFaceRecognizer:
         self.model_path = _resolve_model_path(self.model_dir, self.model_filename)
         self.device = torch.device(device or _default_device())
         self.hash_length_override = hash_length
+        self.hasher = hasher
 
         self._model = None
         self._model_lock = threading.Lock()
@@ -147,33 +152,46 @@ class CatFaceRecognizer:
         return int(output.shape[1])
 
     def _compute_embedding(self, image: Image.Image) -> np.ndarray:
-        image = image.convert("RGB")
-        tensor = self.transform(image).unsqueeze(0).to(self.device)
+        with span("transform"):
+            image = image.convert("RGB")
+            tensor = self.transform(image).unsqueeze(0).to(self.device)
         model = self._load_model()
-        with torch.no_grad():
+        with span("forward"), torch.no_grad():
             embedding = model(tensor).cpu().numpy().flatten()
         norm = np.linalg.norm(embedding)
         if norm == 0:
             return embedding
         return embedding / norm
 
-    def compute_signature(self, image_bytes: bytes) -> Tuple[np.ndarray, str, np.ndarray]:
-        image = Image.open(io.BytesIO(image_bytes))
-        embedding = self._compute_embedding(image)
+    @property
+    def hash_version(self) -> str:
+        if self.hasher is not None:
+            return self.hasher.version
+        if self.hash_length_override:
+            return f"{LEGACY_HASH_VERSION}-{self.hash_length_override}"
+        return LEGACY_HASH_VERSION
+
+    def hash_signature(self, embedding: np.ndarray) -> Tuple[str, np.ndarray]:
+        """Hash an embedding with the configured LSH family (legacy ``v1`` when none is set)."""
+        if self.hasher is not None:
+            if embedding.size == self.hasher.dim:
+                bits = self.hasher.hash(embedding)[0]
+                return _bits_to_hex(bits), bits
+            print(
+                f"[CatRecognition] Embedding dimension {embedding.size} does not match hasher "
+                f"{self.hasher.version}; falling back to the legacy hash."
+            )
 
-        if self.hash_length_override and self.hash_length_override < embedding.size:
-            truncated = embedding[: self.hash_length_override]
-        else:
-            truncated = embedding
+        bits = legacy_hash(embedding, self.hash_length_override)
+        return _bits_to_hex(bits), bits
 
-        mean = float(np.mean(truncated)) if truncated.size else 0.0
-        std = float(np.std(truncated)) if truncated.size else 0.0
-        if std > 0:
-            normalized = (truncated - mean) / std
-        else:
-            normalized = truncated - mean
-        bits = normalized >= 0
-        hash_hex = _bits_to_hex(bits)
+    def compute_signature(self, image_bytes: bytes) -> Tuple[np.ndarray, str, np.ndarray]:
+        with span("decode"):
+            image = Image.open(io.BytesIO(image_bytes))
+            image.load()
+        embedding = self._compute_embedding(image)
+        with span("hash"):
+            hash_hex, bits = self.hash_signature(embedding)
         return embedding.astype(np.float32), hash_hex, bits
 
     def match_against(
@@ -232,6 +250,39 @@ def summarize_embeddings(embeddings: Iterable[np.ndarray]) -> Optional[np.ndarra
     return centroid / norm
 
 
+def rank_by_centroid(
+    query_embedding: np.ndarray,
+    centroids: Iterable[Tuple[int, np.ndarray]],
+    top_k: int,
+) -> List[Tuple[int, float]]:
+    """Return the ``top_k`` ``(cat_id, similarity)`` pairs whose centroid is closest to the query."""
+    query = ensure_numpy_array(query_embedding).astype(np.float32).ravel()
+    query_norm = np.linalg.norm(query)
+    if query_norm == 0 or top_k <= 0:
+        return []
+    query = query / query_norm
+
+    cat_ids = []
+    vectors = []
+    for cat_id, centroid in centroids:
+        centroid = ensure_numpy_array(centroid).astype(np.float32).ravel()
+        if centroid.size != query.size:
+            continue
+        cat_ids.append(cat_id)
+        vectors.append(centroid)
+    if not vectors:
+        return []
+
+    matrix = np.stack(vectors)
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    similarities = (matrix @ query) / norms
+    top_k = min(top_k, len(cat_ids))
+    best = np.argpartition(-similarities, top_k - 1)[:top_k]
+    best = best[np.argsort(-similarities[best])]
+    return [(cat_ids[i], float(similarities[i])) for i in best]
+
+
 def aggregate_hashes(hashes: Iterable[np.ndarray]) -> Optional[str]:
     bit_arrays = [np.asarray(bits, dtype=bool) for bits in hashes if bits is not None]
     if not bit_arrays:
@@ -250,6 +301,45 @@ def aggregate_hashes(hashes: Iterable[np.ndarray]) -> Optional[str]:
     return _bits_to_hex(consensus)
 
 
+def update_embedding_sum(running_sum: Optional[np.ndarray], embedding: np.ndarray, sign: int = 1) -> np.ndarray:
+    """Add (``sign=1``) or remove (``sign=-1``) one embedding from a running vector sum."""
+    vector = np.asarray(embedding, dtype=np.float64).ravel()
+    if running_sum is None or running_sum.size == 0:
+        return sign * vector
+    if running_sum.size != vector.size:
+        raise ValueError("Embedding dimension does not match the running sum")
+    return np.asarray(running_sum, dtype=np.float64) + sign * vector
+
+
+def update_hash_votes(votes: Optional[np.ndarray], bits: np.ndarray, sign: int = 1) -> np.ndarray:
+    """Add or remove one hash from per-bit vote counts, zero-padding like ``aggregate_hashes``."""
+    bit_array = np.asarray(bits, dtype=bool).ravel()
+    current = np.zeros(0, dtype=np.int64) if votes is None else np.asarray(votes, dtype=np.int64)
+    length = max(current.size, bit_array.size)
+    updated = np.zeros(length, dtype=np.int64)
+    updated[: current.size] = current
+    updated[: bit_array.size] += sign * bit_array.astype(np.int64)
+    return updated
+
+
+def centroid_from_sum(running_sum: Optional[np.ndarray], count: int) -> Optional[np.ndarray]:
+    """Equivalent of ``summarize_embeddings`` computed from a running sum."""
+    if running_sum is None or count <= 0 or running_sum.size == 0:
+        return None
+    centroid = np.asarray(running_sum, dtype=np.float32)
+    norm = np.linalg.norm(centroid)
+    if norm == 0:
+        return centroid
+    return centroid / norm
+
+
+def consensus_from_votes(votes: Optional[np.ndarray], count: int) -> Optional[str]:
+    """Equivalent of ``aggregate_hashes`` computed from per-bit vote counts."""
+    if votes is None or count <= 0 or votes.size == 0:
+        return None
+    return _bits_to_hex(np.asarray(votes) >= (count / 2))
+
+
 def embedding_to_blob(embedding: np.ndarray) -> bytes:
     return embedding.astype(np.float32).tobytes()
 
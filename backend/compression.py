@@ -0,0 +1,207 @@
+"""
+Response compression negotiated through ``Accept-Encoding``.
+
+JSON responses are compressed on the fly by :class:`ResponseCompressor`,
+which wraps ``do_*`` methods the same way ``RequestMetrics.instrument`` does:
+it puts a proxy in front of ``wfile`` that looks at the header block when the
+handler flushes it. ``application/json`` responses without a
+``Content-Length`` / ``Content-Encoding`` are held back and, once the handler
+returns, sent compressed (when at least ``min_bytes`` long and the result is
+smaller) with ``Content-Length`` and ``Vary: Accept-Encoding``. Every other
+response, including event streams and static files, passes straight through.
+
+Static files are not compressed per request: the build step writes ``.gz`` and
+``.br`` variants next to them (see :mod:`backend.static_assets`).
+
+Brotli needs the optional ``brotli`` package; without it only gzip is offered.
+"""
+
+import functools
+import gzip
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli optional
+    brotli = None
+
+BROTLI_AVAILABLE = brotli is not None
+# Preference order when the client accepts several equally
+ENCODINGS: Tuple[str, ...] = ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)
+FILE_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+MIN_COMPRESS_BYTES = 1024
+# On-the-fly levels favour speed; build-time variants use the maximum.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """``"gzip, br;q=0.8"`` -> ``{"gzip": 1.0, "br": 0.8}``; malformed q-values count as 0."""
+    accepted: Dict[str, float] = {}
+    for item in (header or '').split(','):
+        parts = [part.strip() for part in item.split(';')]
+        coding = parts[0].lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate(header: Optional[str], available: Iterable[str] = ENCODINGS) -> Optional[str]:
+    """Best of ``available`` for an ``Accept-Encoding`` header, or ``None`` for identity."""
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """``level`` is the gzip level or brotli quality; defaults to the on-the-fly setting."""
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+    if encoding == 'br' and BROTLI_AVAILABLE:
+        return brotli.compress(body, quality=BROTLI_QUALITY if level is None else level)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def write_precompressed(path: str, min_bytes: int = MIN_COMPRESS_BYTES) -> List[str]:
+    """
+    Write ``path.gz`` (and ``path.br``) at maximum compression unless they are
+    already newer than ``path``. Variants that would not be smaller are
+    removed. Returns the encodings written.
+    """
+    stat = os.stat(path)
+    if stat.st_size < min_bytes:
+        return []
+    written = []
+    body = None
+    for encoding in ENCODINGS:
+        variant = path + FILE_SUFFIXES[encoding]
+        try:
+            if os.stat(variant).st_mtime_ns >= stat.st_mtime_ns:
+                continue
+        except FileNotFoundError:
+            pass
+        if body is None:
+            with open(path, 'rb') as handle:
+                body = handle.read()
+        compressed = compress(body, encoding, 11 if encoding == 'br' else 9)
+        if len(compressed) >= len(body):
+            if os.path.exists(variant):
+                os.remove(variant)
+            continue
+        with open(variant, 'wb') as handle:
+            handle.write(compressed)
+        written.append(encoding)
+    return written
+
+
+class _CompressingWriter:
+    """``wfile`` proxy that holds back compressible responses until the handler returns."""
+
+    def __init__(self, stream, encoding: str):
+        self._stream = stream
+        self.encoding = encoding
+        self.headers: Optional[bytes] = None
+        self.body: List[bytes] = []
+        self._decided = False
+
+    def write(self, data):
+        if self._decided:
+            if self.headers is None:
+                return self._stream.write(data)
+            self.body.append(bytes(data))
+            return len(data)
+        self._decided = True
+        # end_headers() flushes the whole header block in one write
+        if _is_compressible(bytes(data)):
+            self.headers = bytes(data)
+            return len(data)
+        return self._stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _is_compressible(header_block: bytes) -> bool:
+    if not header_block.endswith(b'\r\n\r\n'):
+        return False
+    lines = header_block.decode('latin-1').split('\r\n')
+    status = lines[0].split(' ', 2)
+    if len(status) < 2 or status[1] != '200':
+        return False
+    content_type = ''
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        name = name.strip().lower()
+        if name in ('content-length', 'content-encoding'):
+            return False
+        if name == 'content-type':
+            content_type = value.strip().lower()
+    return content_type.startswith('application/json')
+
+
+class ResponseCompressor:
+    """
+    Decorator factory for request handler methods.
+
+    ``on_compress(handler, encoding, bytes_in, bytes_out, cpu_seconds)`` is
+    called for every compressed body, so the cost can be tracked per route.
+    """
+
+    def __init__(
+        self,
+        min_bytes: int = MIN_COMPRESS_BYTES,
+        on_compress: Optional[Callable] = None,
+    ):
+        self.min_bytes = min_bytes
+        self.on_compress = on_compress
+
+    def instrument(self, handler_method: Callable) -> Callable:
+        compressor = self
+
+        @functools.wraps(handler_method)
+        def wrapper(handler, *args, **kwargs):
+            encoding = negotiate(handler.headers.get('Accept-Encoding'))
+            if encoding is None:
+                return handler_method(handler, *args, **kwargs)
+            writer = _CompressingWriter(handler.wfile, encoding)
+            handler.wfile = writer
+            try:
+                return handler_method(handler, *args, **kwargs)
+            finally:
+                handler.wfile = writer._stream
+                if writer.headers is not None:
+                    compressor._send(handler, writer)
+
+        return wrapper
+
+    def _send(self, handler, writer: _CompressingWriter) -> None:
+        body = b''.join(writer.body)
+        extra = [b'Vary: Accept-Encoding']
+        if len(body) >= self.min_bytes:
+            started = time.thread_time()
+            compressed = compress(body, writer.encoding)
+            cpu_seconds = time.thread_time() - started
+            if self.on_compress is not None:
+                self.on_compress(handler, writer.encoding, len(body), len(compressed), cpu_seconds)
+            if len(compressed) < len(body):
+                body = compressed
+                extra.append(f'Content-Encoding: {writer.encoding}'.encode('latin-1'))
+        extra.append(f'Content-Length: {len(body)}'.encode('latin-1'))
+        headers = writer.headers[:-2] + b'\r\n'.join(extra) + b'\r\n\r\n'
+        handler.wfile.write(headers)
+        handler.wfile.write(body)
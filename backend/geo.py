@@ -0,0 +1,184 @@
+"""
+Geographic filters and geohash cells for the location-history queries.
+
+A :class:`BoundingBox` is parsed from ``bbox=min_lat,min_lng,max_lat,max_lng``
+(the order Leaflet's ``LatLngBounds`` exposes as south-west / north-east) and
+rendered as plain ``BETWEEN`` range predicates on the stored ``latitude`` and
+``longitude`` columns, so SQLite can evaluate them from an index that carries
+both columns instead of reading every row. A box whose west edge is east of its
+east edge crosses the antimeridian and matches both sides of it.
+
+Rows also carry a geohash so the admin map can be answered per viewport:
+cluster counts per cell while zoomed out, individual points once zoomed in.
+"""
+
+from typing import List, Tuple
+
+
+class BoundingBox:
+    """Latitude/longitude rectangle; ``min_lng > max_lng`` means it wraps across 180°."""
+
+    def __init__(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float):
+        self.min_lat = min_lat
+        self.min_lng = min_lng
+        self.max_lat = max_lat
+        self.max_lng = max_lng
+
+    @property
+    def crosses_antimeridian(self) -> bool:
+        return self.min_lng > self.max_lng
+
+    def sql_filter(self, latitude_column: str, longitude_column: str) -> Tuple[str, List[float]]:
+        """A ``WHERE`` fragment (without leading ``AND``) and its parameters."""
+        clause = f'{latitude_column} BETWEEN ? AND ?'
+        params = [self.min_lat, self.max_lat]
+        if self.crosses_antimeridian:
+            clause += f' AND ({longitude_column} >= ? OR {longitude_column} <= ?)'
+        else:
+            clause += f' AND {longitude_column} BETWEEN ? AND ?'
+        params.extend([self.min_lng, self.max_lng])
+        return clause, params
+
+
+def parse_bbox(value: str) -> BoundingBox:
+    """Parse ``min_lat,min_lng,max_lat,max_lng``; raises ``ValueError`` when malformed."""
+    parts = [part.strip() for part in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_lat,min_lng,max_lat,max_lng")
+    try:
+        min_lat, min_lng, max_lat, max_lng = (float(part) for part in parts)
+    except ValueError as exc:
+        raise ValueError("bbox values must be numbers") from exc
+    if not (-90 <= min_lat <= 90 and -90 <= max_lat <= 90):
+        raise ValueError("bbox latitudes must be between -90 and 90")
+    if not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        raise ValueError("bbox longitudes must be between -180 and 180")
+    if min_lat > max_lat:
+        raise ValueError("bbox min_lat must not exceed max_lat")
+    return BoundingBox(min_lat, min_lng, max_lat, max_lng)
+
+
+# --- Geohash cells ---------------------------------------------------------
+#
+# Every location row stores a GEOHASH_PRECISION-character geohash (~5 m cells).
+# A geohash prefix is the enclosing coarser cell, so all rows inside a cell are
+# one contiguous key range: ``geohash >= prefix AND geohash < prefix || '~'``.
+# Viewport queries cover the box with a handful of such prefixes and seek each
+# range on an index instead of testing every row's coordinates.
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+# Cluster aggregates are kept for prefixes 1..MAX_CLUSTER_PRECISION (~1.2 km cells).
+MAX_CLUSTER_PRECISION = 6
+# From this Leaflet zoom level on, the map receives individual points.
+POINTS_MIN_ZOOM = 15
+_BASE32_INDEX = {char: index for index, char in enumerate(GEOHASH_ALPHABET)}
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def geohash_center(geohash: str) -> Tuple[float, float]:
+    """``(latitude, longitude)`` of the centre of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            interval = lng_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if (value >> shift) & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """``(height, width)`` in degrees of a cell with ``precision`` characters."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def prefix_range(prefix: str) -> Tuple[str, str]:
+    """Half-open key range of every geohash starting with ``prefix``."""
+    return prefix, prefix + '~'
+
+
+def cluster_precision(zoom: int, min_cell_pixels: int = 48) -> int:
+    """Finest prefix length whose cells are still at least ``min_cell_pixels`` wide at ``zoom``."""
+    world_pixels = 256 * (2 ** max(zoom, 0))
+    for precision in range(MAX_CLUSTER_PRECISION, 0, -1):
+        _, width = geohash_cell_size(precision)
+        if world_pixels * width / 360.0 >= min_cell_pixels:
+            return precision
+    return 1
+
+
+def _split_at_antimeridian(bbox: BoundingBox) -> List[BoundingBox]:
+    if not bbox.crosses_antimeridian:
+        return [bbox]
+    return [
+        BoundingBox(bbox.min_lat, bbox.min_lng, bbox.max_lat, 180.0),
+        BoundingBox(bbox.min_lat, -180.0, bbox.max_lat, bbox.max_lng),
+    ]
+
+
+def _grid(start: float, stop: float, step: float) -> List[float]:
+    values = []
+    value = start
+    while value < stop:
+        values.append(value)
+        value += step
+    values.append(stop)
+    return values
+
+
+def covering_geohashes(bbox: BoundingBox, max_cells: int = 16, max_precision: int = GEOHASH_PRECISION) -> List[str]:
+    """
+    The longest prefixes (at most ``max_precision`` characters) whose cells cover
+    ``bbox`` with no more than ``max_cells`` cells. Cells may extend past the box.
+    """
+    boxes = _split_at_antimeridian(bbox)
+    for precision in range(max_precision, 0, -1):
+        height, width = geohash_cell_size(precision)
+        estimate = sum(
+            (int((box.max_lat - box.min_lat) / height) + 2) * (int((box.max_lng - box.min_lng) / width) + 2)
+            for box in boxes
+        )
+        if estimate > max_cells * 4 and precision > 1:
+            continue
+        cells = set()
+        for box in boxes:
+            for latitude in _grid(box.min_lat, box.max_lat, height):
+                for longitude in _grid(box.min_lng, box.max_lng, width):
+                    cells.add(encode_geohash(latitude, longitude, precision))
+        if len(cells) <= max_cells or precision == 1:
+            return sorted(cells)
+    return []
@@ -0,0 +1,73 @@
+"""
+One-off background jobs with progress reporting.
+
+Unlike a :class:`~backend.migrations.Backfill`, which is re-checked on every
+runner pass, a job is submitted once by a request handler (an admin broadcast,
+say), runs on its own daemon thread and is then only looked up by id. The work
+function receives a ``progress(done)`` callback; its return value becomes the
+job's ``result``. Job state lives in memory and the most recent ``keep`` jobs
+are retained; ``on_update(job)``, if given, receives a snapshot on every change.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+
+class JobTracker:
+    def __init__(self, keep: int = 50, on_update: Optional[Callable[[Dict], None]] = None):
+        self.keep = keep
+        self.on_update = on_update
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, total: int, work: Callable[[Callable[[int], None]], Optional[Dict]]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "state": "running",
+                "total": total,
+                "done": 0,
+                "result": None,
+                "error": None,
+                "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "finished_at": None,
+            }
+            while len(self._jobs) > self.keep:
+                self._jobs.popitem(last=False)
+        self._notify(job_id)
+        threading.Thread(target=self._run, args=(job_id, work), name=f"job-{kind}", daemon=True).start()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+        self._notify(job_id)
+
+    def _notify(self, job_id: str) -> None:
+        if self.on_update is None:
+            return
+        job = self.get(job_id)
+        if job:
+            self.on_update(job)
+
+    def _run(self, job_id: str, work: Callable) -> None:
+        started = time.time()
+        try:
+            result = work(lambda done: self._update(job_id, done=done))
+        except Exception as exc:
+            print(f"[Jobs] Job {job_id} failed: {exc}")
+            self._update(job_id, state="failed", error=str(exc), finished_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+            return
+        self._update(job_id, state="done", result=result, finished_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+        print(f"[Jobs] Job {job_id} finished in {time.time() - started:.1f}s")
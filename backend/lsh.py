@@ -0,0 +1,181 @@
+"""
+Locality-sensitive hash families for cat embeddings.
+
+The original ``v1`` hash takes the sign of every standardized embedding
+dimension, which ties the hash length to the model and yields highly
+correlated bits. The hashers here project embeddings onto ``num_bits``
+directions instead:
+
+* ``random`` – random hyperplanes (SimHash), optionally centred on the mean
+  of the stored reference embeddings;
+* ``itq`` – iterative quantization: PCA down to ``num_bits`` dimensions
+  followed by a learned rotation that balances variance across bits.
+
+Both reduce to ``bits = (x - mean) @ projection >= 0`` and share one
+serialisable class.
+"""
+
+import hashlib
+import os
+from typing import Callable, List, Optional
+
+import numpy as np
+
+LEGACY_HASH_VERSION = "v1"
+HASH_METHODS = ("legacy", "random", "itq")
+
+
+def legacy_hash(embedding: np.ndarray, hash_length: Optional[int] = None) -> np.ndarray:
+    """The ``v1`` hash: sign of each standardized dimension, optionally truncated."""
+    embedding = np.asarray(embedding, dtype=np.float32).ravel()
+    if hash_length and hash_length < embedding.size:
+        embedding = embedding[:hash_length]
+    mean = float(np.mean(embedding)) if embedding.size else 0.0
+    std = float(np.std(embedding)) if embedding.size else 0.0
+    if std > 0:
+        normalized = (embedding - mean) / std
+    else:
+        normalized = embedding - mean
+    return normalized >= 0
+
+
+class ProjectionHasher:
+    """Sign-of-projection hasher shared by the random-hyperplane and ITQ families."""
+
+    def __init__(self, method: str, mean: np.ndarray, projection: np.ndarray):
+        if method not in ("random", "itq"):
+            raise ValueError(f"Unknown hash method: {method}")
+        self.method = method
+        self.mean = np.asarray(mean, dtype=np.float32).ravel()
+        self.projection = np.asarray(projection, dtype=np.float32)
+        if self.projection.ndim != 2 or self.projection.shape[0] != self.mean.size:
+            raise ValueError("projection must have shape (dim, num_bits)")
+        fingerprint = hashlib.sha1(self.mean.tobytes() + self.projection.tobytes()).hexdigest()[:8]
+        self.version = f"{method}-{self.num_bits}-{fingerprint}"
+
+    @property
+    def dim(self) -> int:
+        return int(self.projection.shape[0])
+
+    @property
+    def num_bits(self) -> int:
+        return int(self.projection.shape[1])
+
+    def hash(self, vectors: np.ndarray) -> np.ndarray:
+        """Return a boolean array of shape (N, num_bits)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+        return ((vectors - self.mean) @ self.projection) >= 0
+
+    def hash_hex(self, vectors: np.ndarray) -> List[str]:
+        bits = self.hash(vectors)
+        return [np.packbits(row.astype(np.uint8)).tobytes().hex() for row in bits]
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as handle:
+            np.savez(handle, method=np.array(self.method), mean=self.mean, projection=self.projection)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ProjectionHasher":
+        with np.load(path) as data:
+            return cls(str(data["method"]), data["mean"], data["projection"])
+
+
+def random_hyperplane_hasher(
+    dim: int,
+    num_bits: int,
+    *,
+    seed: int = 0,
+    mean: Optional[np.ndarray] = None,
+) -> ProjectionHasher:
+    if dim <= 0 or num_bits <= 0:
+        raise ValueError("dim and num_bits must be positive")
+    rng = np.random.default_rng(seed)
+    projection = rng.standard_normal((dim, num_bits)).astype(np.float32)
+    centre = np.zeros(dim, dtype=np.float32) if mean is None else np.asarray(mean, dtype=np.float32)
+    return ProjectionHasher("random", centre, projection)
+
+
+def train_itq_hasher(
+    vectors: np.ndarray,
+    num_bits: int,
+    *,
+    iterations: int = 50,
+    seed: int = 0,
+) -> ProjectionHasher:
+    """Learn PCA + rotation (Gong & Lazebnik's ITQ) from sample embeddings."""
+    vectors = np.asarray(vectors, dtype=np.float64)
+    if vectors.ndim != 2 or vectors.shape[0] < 2:
+        raise ValueError("ITQ needs at least two training vectors")
+    if num_bits <= 0 or num_bits > min(vectors.shape):
+        raise ValueError(
+            f"num_bits must be between 1 and {min(vectors.shape)} for {vectors.shape[0]} training vectors"
+        )
+
+    mean = vectors.mean(axis=0)
+    centred = vectors - mean
+    covariance = centred.T @ centred / (centred.shape[0] - 1)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    pca = eigenvectors[:, np.argsort(eigenvalues)[::-1][:num_bits]]
+    projected = centred @ pca
+
+    rng = np.random.default_rng(seed)
+    rotation, _ = np.linalg.qr(rng.standard_normal((num_bits, num_bits)))
+    for _ in range(iterations):
+        codes = np.where(projected @ rotation >= 0, 1.0, -1.0)
+        # Orthogonal Procrustes: rotation minimising ||codes - projected @ rotation||
+        u, _, vt = np.linalg.svd(projected.T @ codes)
+        rotation = u @ vt
+
+    return ProjectionHasher("itq", mean.astype(np.float32), (pca @ rotation).astype(np.float32))
+
+
+def hamming_candidate_recall(
+    vectors: np.ndarray,
+    bits: np.ndarray,
+    query_indices: np.ndarray,
+    *,
+    k: int = 10,
+    num_candidates: int = 100,
+    progress: Optional[Callable[[int], None]] = None,
+) -> float:
+    """
+    Fraction of each query's true top-``k`` cosine neighbours that fall inside
+    its ``num_candidates`` nearest neighbours by Hamming distance. The query
+    itself is excluded from both lists. ``progress`` receives the number of
+    queries evaluated so far.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    normalised = vectors / norms
+    bits = np.asarray(bits, dtype=bool)
+
+    top_k = min(k, len(vectors) - 1)
+    candidates_k = min(num_candidates, len(vectors) - 1)
+    if top_k <= 0:
+        return 0.0
+
+    found = 0
+    expected = 0
+    for done, index in enumerate(query_indices, start=1):
+        similarities = normalised @ normalised[index]
+        similarities[index] = -np.inf
+        distances = np.count_nonzero(bits != bits[index], axis=1).astype(np.float64)
+        distances[index] = np.inf
+
+        truth = np.argpartition(-similarities, top_k - 1)[:top_k]
+        candidates = np.argpartition(distances, candidates_k - 1)[:candidates_k]
+        found += np.isin(truth, candidates).sum()
+        expected += top_k
+        if progress is not None:
+            progress(done)
+    return float(found / expected) if expected else 0.0
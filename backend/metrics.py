@@ -0,0 +1,248 @@
+"""
+In-process HTTP request metrics rendered in the Prometheus text format.
+
+``RequestMetrics.instrument`` wraps a ``BaseHTTPRequestHandler.do_*`` method
+and records, per method and normalised route:
+
+* request counts by status code;
+* a latency histogram (cumulative buckets, sum and count);
+* request and response bytes;
+* handler CPU time (the calling thread's, so other threads are not counted);
+* the number of requests currently in flight.
+
+``record_compression`` adds, per route and encoding, how many bodies were
+compressed, bytes before and after, and the CPU time spent compressing.
+
+Recording is a handful of dict updates under one lock per request, so the
+instrumentation is meant to stay enabled in production.
+"""
+
+import functools
+import re
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_ROUTES = 500
+OVERFLOW_ROUTE = "other"
+
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{16,}|[0-9a-fA-F-]{36})$")
+
+
+def normalize_route(path: str) -> str:
+    """
+    Collapse a request path into a low-cardinality route label: the query
+    string is dropped, numeric / hex id segments become ``:id`` and all
+    non-API paths are reported as ``static``.
+    """
+    path = path.split("?", 1)[0].split("#", 1)[0]
+    if not path.startswith("/api/"):
+        return "static"
+    segments = [":id" if _ID_SEGMENT.match(segment) else segment for segment in path.split("/")]
+    return "/".join(segments).rstrip("/") or "/"
+
+
+class _CountingWriter:
+    """File-like proxy that counts bytes written to the response stream."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return self._stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class RequestMetrics:
+    """Thread-safe per-route counters, histograms and gauges."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS, max_routes: int = MAX_ROUTES):
+        self.buckets = tuple(sorted(buckets))
+        self.max_routes = max_routes
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, int], int] = {}
+        self._histograms: Dict[Tuple[str, str], list] = {}
+        self._durations: Dict[Tuple[str, str], list] = {}  # [sum, count]
+        self._bytes_in: Dict[Tuple[str, str], int] = {}
+        self._bytes_out: Dict[Tuple[str, str], int] = {}
+        self._cpu: Dict[Tuple[str, str], float] = {}
+        self._compression: Dict[Tuple[str, str, str], list] = {}  # [count, bytes_in, bytes_out, cpu]
+        self._in_flight: Dict[Tuple[str, str], int] = {}
+        self._routes = set()
+
+    def _route_label(self, route: str) -> str:
+        # Called with the lock held. Unknown routes beyond the cap share one label
+        # so probing clients cannot blow up the series count.
+        if route in self._routes:
+            return route
+        if len(self._routes) >= self.max_routes:
+            return OVERFLOW_ROUTE
+        self._routes.add(route)
+        return route
+
+    def start(self, method: str, path: str) -> Tuple[str, str]:
+        with self._lock:
+            key = (method, self._route_label(normalize_route(path)))
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        return key
+
+    def finish(
+        self,
+        key: Tuple[str, str],
+        status: int,
+        duration: float,
+        bytes_in: int,
+        bytes_out: int,
+        cpu_seconds: float = 0.0,
+    ) -> None:
+        with self._lock:
+            self._in_flight[key] -= 1
+            status_key = key + (status,)
+            self._requests[status_key] = self._requests.get(status_key, 0) + 1
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * len(self.buckets)
+                self._durations[key] = [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram[index] += 1
+                    break
+            totals = self._durations[key]
+            totals[0] += duration
+            totals[1] += 1
+            self._bytes_in[key] = self._bytes_in.get(key, 0) + bytes_in
+            self._bytes_out[key] = self._bytes_out.get(key, 0) + bytes_out
+            self._cpu[key] = self._cpu.get(key, 0.0) + cpu_seconds
+
+    def record_compression(
+        self, method: str, path: str, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float
+    ) -> None:
+        with self._lock:
+            key = (method, self._route_label(normalize_route(path)), encoding)
+            totals = self._compression.setdefault(key, [0, 0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += bytes_in
+            totals[2] += bytes_out
+            totals[3] += cpu_seconds
+
+    def instrument(self, handler_method: Callable) -> Callable:
+        """Decorator for ``do_GET`` / ``do_POST`` / ... on a request handler."""
+        metrics = self
+
+        @functools.wraps(handler_method)
+        def wrapper(handler, *args, **kwargs):
+            key = metrics.start(handler.command, handler.path)
+            try:
+                bytes_in = int(handler.headers.get("Content-Length") or 0)
+            except (TypeError, ValueError):
+                bytes_in = 0
+            writer = _CountingWriter(handler.wfile)
+            handler.wfile = writer
+            handler._metrics_status = None
+            started = time.perf_counter()
+            cpu_started = time.thread_time()
+            try:
+                return handler_method(handler, *args, **kwargs)
+            except Exception:
+                handler._metrics_status = handler._metrics_status or 500
+                raise
+            finally:
+                metrics.finish(
+                    key,
+                    handler._metrics_status or 0,
+                    time.perf_counter() - started,
+                    bytes_in,
+                    writer.bytes_written,
+                    time.thread_time() - cpu_started,
+                )
+                handler.wfile = writer._stream
+
+        return wrapper
+
+    def render_prometheus(self, prefix: str = "catalist") -> str:
+        with self._lock:
+            requests = dict(self._requests)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+            durations = {key: list(value) for key, value in self._durations.items()}
+            bytes_in = dict(self._bytes_in)
+            bytes_out = dict(self._bytes_out)
+            cpu = dict(self._cpu)
+            compression = {key: list(value) for key, value in self._compression.items()}
+            in_flight = dict(self._in_flight)
+
+        def labels(method: str, route: str, **extra) -> str:
+            pairs = [("method", method), ("route", route)] + [(name, str(value)) for name, value in extra.items()]
+            return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+        lines = [
+            f"# HELP {prefix}_http_requests_total HTTP requests by method, route and status.",
+            f"# TYPE {prefix}_http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(f"{prefix}_http_requests_total{labels(method, route, status=status)} {count}")
+
+        lines += [
+            f"# HELP {prefix}_http_request_duration_seconds Time spent handling a request.",
+            f"# TYPE {prefix}_http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram):
+                cumulative += count
+                lines.append(
+                    f"{prefix}_http_request_duration_seconds_bucket{labels(method, route, le=bound)} {cumulative}"
+                )
+            total, count = durations[(method, route)]
+            lines.append(f"{prefix}_http_request_duration_seconds_bucket{labels(method, route, le='+Inf')} {count}")
+            lines.append(f"{prefix}_http_request_duration_seconds_sum{labels(method, route)} {total:.6f}")
+            lines.append(f"{prefix}_http_request_duration_seconds_count{labels(method, route)} {count}")
+
+        for name, help_text, values in (
+            ("http_request_bytes_total", "Request body bytes received.", bytes_in),
+            ("http_response_bytes_total", "Response bytes sent, headers included.", bytes_out),
+        ):
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} counter"]
+            for (method, route), value in sorted(values.items()):
+                lines.append(f"{prefix}_{name}{labels(method, route)} {value}")
+
+        lines += [
+            f"# HELP {prefix}_http_request_cpu_seconds_total CPU time spent handling requests.",
+            f"# TYPE {prefix}_http_request_cpu_seconds_total counter",
+        ]
+        for (method, route), value in sorted(cpu.items()):
+            lines.append(f"{prefix}_http_request_cpu_seconds_total{labels(method, route)} {value:.6f}")
+
+        for name, help_text, position in (
+            ("http_compressed_responses_total", "Response bodies compressed on the fly.", 0),
+            ("http_compression_input_bytes_total", "Response body bytes before compression.", 1),
+            ("http_compression_output_bytes_total", "Response body bytes after compression.", 2),
+            ("http_compression_cpu_seconds_total", "CPU time spent compressing response bodies.", 3),
+        ):
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} counter"]
+            for (method, route, encoding), totals in sorted(compression.items()):
+                value = f"{totals[position]:.6f}" if position == 3 else totals[position]
+                lines.append(f"{prefix}_{name}{labels(method, route, encoding=encoding)} {value}")
+
+        lines += [
+            f"# HELP {prefix}_http_requests_in_flight Requests currently being handled.",
+            f"# TYPE {prefix}_http_requests_in_flight gauge",
+        ]
+        for (method, route), value in sorted(in_flight.items()):
+            lines.append(f"{prefix}_http_requests_in_flight{labels(method, route)} {value}")
+
+        lines += [
+            f"# HELP {prefix}_process_start_time_seconds Unix time the server process started.",
+            f"# TYPE {prefix}_process_start_time_seconds gauge",
+            f"{prefix}_process_start_time_seconds {self.started_at:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,190 @@
+"""
+Versioned schema migrations and batched background backfills for SQLite.
+
+Schema changes are ordered :class:`Migration` steps. Each applied version is
+recorded in a ``schema_version`` table, so opening a database that is already
+current costs a single ``SELECT MAX(version)``. Steps must be idempotent
+(``CREATE ... IF NOT EXISTS``, tolerant ``ALTER TABLE``): SQLite commits DDL
+immediately, so a step interrupted half-way is simply re-run on the next start.
+
+Data rewrites that touch many rows do not belong in a migration step, because
+migrations run before the server accepts requests. They are :class:`Backfill`
+jobs instead: ``pending`` says whether any work is left and ``run_batch``
+processes one bounded batch in its own transaction. A :class:`BackfillRunner`
+works through them on a daemon thread, pausing between batches so request
+handlers keep getting the database lock. Because progress is derived from the
+data itself, an interrupted backfill resumes where it stopped.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+
+class Migration:
+    """One schema step: ``apply(cursor)`` brings the schema to ``version``."""
+
+    def __init__(self, version: int, description: str, apply: Callable):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+def current_schema_version(conn: sqlite3.Connection) -> int:
+    """Highest applied version, or 0 for a database that predates ``schema_version``."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except sqlite3.OperationalError:
+        return 0
+    return cursor.fetchone()[0] or 0
+
+
+def apply_migrations(conn: sqlite3.Connection, migrations: Sequence[Migration]) -> List[int]:
+    """Apply the steps newer than the recorded version, in order; returns the versions applied."""
+    latest = max((migration.version for migration in migrations), default=0)
+    current = current_schema_version(conn)
+    if current >= latest:
+        return []
+
+    cursor = conn.cursor()
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''
+    )
+    applied = []
+    for migration in sorted(migrations, key=lambda item: item.version):
+        if migration.version <= current:
+            continue
+        started = time.time()
+        migration.apply(cursor)
+        cursor.execute(
+            'INSERT OR REPLACE INTO schema_version (version, description) VALUES (?, ?)',
+            (migration.version, migration.description),
+        )
+        conn.commit()
+        applied.append(migration.version)
+        print(f"[DB] Applied migration {migration.version}: {migration.description} ({time.time() - started:.2f}s)")
+    return applied
+
+
+class Backfill:
+    """
+    A resumable bulk data rewrite. ``pending()`` reports whether work is left;
+    ``run_batch(batch_size)`` processes at most ``batch_size`` items and returns
+    how many it handled (0 means done). ``finish()`` runs once after the last batch.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        pending: Callable[[], bool],
+        run_batch: Callable[[int], int],
+        finish: Optional[Callable[[], None]] = None,
+    ):
+        self.name = name
+        self.pending = pending
+        self.run_batch = run_batch
+        self.finish = finish
+
+
+class BackfillRunner:
+    """Runs registered backfills batch by batch on a background thread."""
+
+    def __init__(self, batch_size: int = 500, pause_seconds: float = 0.05):
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self._backfills: List[Backfill] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._rerun = False
+        self._status: Dict[str, Dict] = {}
+
+    def register(self, backfill: Backfill) -> None:
+        self._backfills.append(backfill)
+        self._status[backfill.name] = {"state": "idle", "processed": 0, "error": None, "finished_at": None}
+
+    def start(self, *queued: str) -> None:
+        """
+        Check every backfill on a background thread; a call during a run queues
+        another pass. Backfills named in ``queued`` report ``queued`` until the
+        pass reaches them, so callers can treat their data as stale right away.
+        """
+        with self._lock:
+            for name in queued:
+                if self._status[name]["state"] != "running":
+                    self._status[name]["state"] = "queued"
+            if self._thread is not None and self._thread.is_alive():
+                self._rerun = True
+                return
+            self._rerun = False
+            self._thread = threading.Thread(target=self._run, name="backfills", daemon=True)
+            self._thread.start()
+
+    def is_running(self, name: str) -> bool:
+        return self._status.get(name, {}).get("state") == "running"
+
+    def is_active(self, name: str) -> bool:
+        """Running, or queued by ``start`` and not reached yet."""
+        return self._status.get(name, {}).get("state") in ("running", "queued")
+
+    def status(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._status.items()}
+
+    def _run(self) -> None:
+        while True:
+            for backfill in self._backfills:
+                try:
+                    if backfill.pending():
+                        self._run_backfill(backfill, pause=True)
+                    else:
+                        self._clear_queued(backfill.name, "idle")
+                except Exception as exc:
+                    self._clear_queued(backfill.name, "failed")
+                    print(f"[DB] Backfill {backfill.name} failed: {exc}")
+            with self._lock:
+                if not self._rerun:
+                    self._thread = None
+                    return
+                self._rerun = False
+
+    def _clear_queued(self, name: str, state: str) -> None:
+        with self._lock:
+            if self._status[name]["state"] == "queued":
+                self._status[name]["state"] = state
+
+    def _run_backfill(self, backfill: Backfill, pause: bool) -> int:
+        with self._lock:
+            self._status[backfill.name].update(state="running", processed=0, error=None)
+        print(f"[DB] Backfill {backfill.name} started")
+        started = time.time()
+        total = 0
+        try:
+            while True:
+                processed = backfill.run_batch(self.batch_size)
+                if not processed:
+                    break
+                total += processed
+                with self._lock:
+                    self._status[backfill.name]["processed"] = total
+                if pause and self.pause_seconds:
+                    time.sleep(self.pause_seconds)
+            if backfill.finish is not None:
+                backfill.finish()
+        except Exception as exc:
+            with self._lock:
+                self._status[backfill.name].update(state="failed", error=str(exc))
+            raise
+        with self._lock:
+            self._status[backfill.name].update(
+                state="done", processed=total, finished_at=time.strftime("%Y-%m-%d %H:%M:%S")
+            )
+        print(f"[DB] Backfill {backfill.name} finished: {total} items in {time.time() - started:.1f}s")
+        return total
@@ -0,0 +1,159 @@
+"""
+Multi-index hashing (MIH) for exact Hamming-radius search over reference hashes.
+
+Each ``num_bits`` hash is split into ``num_chunks`` disjoint substrings and
+every substring is stored in its own hash table.  If two hashes are within
+Hamming distance ``r`` then, by the pigeonhole principle, at least one pair of
+substrings is within ``r // num_chunks``; probing each table with all
+substrings inside that smaller radius therefore yields a candidate set that
+contains every true neighbour.  Candidates are then verified against the full
+hash, so results are exact.
+
+Hashes whose length differs from ``num_bits`` (e.g. references left over from
+an older hash version) cannot be split consistently; they are kept aside and
+always verified, which keeps the search exact during a rehash migration.
+"""
+
+import threading
+from itertools import combinations
+from math import comb
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    bits = np.asarray(bits, dtype=bool).ravel()
+    if bits.size == 0:
+        return 0
+    return int.from_bytes(np.packbits(bits.astype(np.uint8)).tobytes(), "big") >> (-bits.size % 8)
+
+
+class MultiIndexHash:
+    """Substring hash tables over fixed-length binary codes keyed by reference id."""
+
+    def __init__(self, num_bits: int, num_chunks: Optional[int] = None, max_probes: int = 200000):
+        if num_bits <= 0:
+            raise ValueError("num_bits must be positive")
+        if num_chunks is None:
+            # ~16-bit substrings keep the per-table buckets small for catalogues
+            # up to a few hundred thousand references.
+            num_chunks = max(1, num_bits // 16)
+        if not 1 <= num_chunks <= num_bits:
+            raise ValueError("num_chunks must be between 1 and num_bits")
+        self.num_bits = int(num_bits)
+        self.num_chunks = int(num_chunks)
+        self.max_probes = int(max_probes)
+
+        # Chunks are taken from the most significant bit down; their lengths
+        # differ by at most one.
+        base, extra = divmod(self.num_bits, self.num_chunks)
+        self._chunk_lengths = [base + (1 if i < extra else 0) for i in range(self.num_chunks)]
+        self._chunk_shifts = []
+        remaining = self.num_bits
+        for length in self._chunk_lengths:
+            remaining -= length
+            self._chunk_shifts.append(remaining)
+
+        self._codes: Dict[int, int] = {}
+        self._tables: List[Dict[int, Set[int]]] = [dict() for _ in range(self.num_chunks)]
+        self._unindexed: Dict[int, np.ndarray] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._codes) + len(self._unindexed)
+
+    def _chunks(self, code: int) -> List[int]:
+        return [
+            (code >> shift) & ((1 << length) - 1)
+            for shift, length in zip(self._chunk_shifts, self._chunk_lengths)
+        ]
+
+    def add(self, reference_id: int, bits: np.ndarray) -> None:
+        """Insert or replace the hash stored for ``reference_id``."""
+        bits = np.asarray(bits, dtype=bool).ravel()
+        reference_id = int(reference_id)
+        with self._lock:
+            self.remove(reference_id)
+            if bits.size != self.num_bits:
+                self._unindexed[reference_id] = bits
+                return
+            code = _bits_to_int(bits)
+            self._codes[reference_id] = code
+            for table, chunk in zip(self._tables, self._chunks(code)):
+                table.setdefault(chunk, set()).add(reference_id)
+
+    def add_many(self, items: Iterable[Tuple[int, np.ndarray]]) -> None:
+        with self._lock:
+            for reference_id, bits in items:
+                self.add(reference_id, bits)
+
+    def remove(self, reference_id: int) -> bool:
+        reference_id = int(reference_id)
+        with self._lock:
+            if self._unindexed.pop(reference_id, None) is not None:
+                return True
+            code = self._codes.pop(reference_id, None)
+            if code is None:
+                return False
+            for table, chunk in zip(self._tables, self._chunks(code)):
+                bucket = table.get(chunk)
+                if bucket is not None:
+                    bucket.discard(reference_id)
+                    if not bucket:
+                        del table[chunk]
+            return True
+
+    def probe_count(self, radius: int) -> int:
+        """Number of table lookups an r-neighbour query needs."""
+        sub_radius = max(radius, 0) // self.num_chunks
+        return sum(
+            sum(comb(length, k) for k in range(min(sub_radius, length) + 1))
+            for length in self._chunk_lengths
+        )
+
+    def _candidates(self, query_chunks: List[int], sub_radius: int) -> Set[int]:
+        candidates: Set[int] = set()
+        for table, chunk, length in zip(self._tables, query_chunks, self._chunk_lengths):
+            for flips in range(min(sub_radius, length) + 1):
+                for positions in combinations(range(length), flips):
+                    mask = 0
+                    for position in positions:
+                        mask |= 1 << position
+                    bucket = table.get(chunk ^ mask)
+                    if bucket:
+                        candidates.update(bucket)
+        return candidates
+
+    def search(self, query_bits: np.ndarray, radius: int) -> Optional[List[Tuple[int, int]]]:
+        """
+        Return every ``(reference_id, distance)`` with ``distance <= radius``,
+        closest first, or ``None`` if the query would need more than
+        ``max_probes`` lookups and a linear scan is cheaper.
+        """
+        query_bits = np.asarray(query_bits, dtype=bool).ravel()
+        if radius < 0:
+            return []
+        if query_bits.size != self.num_bits or self.probe_count(radius) > self.max_probes:
+            return None
+
+        query_code = _bits_to_int(query_bits)
+        with self._lock:
+            candidates = self._candidates(self._chunks(query_code), radius // self.num_chunks)
+            codes = {reference_id: self._codes[reference_id] for reference_id in candidates}
+            unindexed = list(self._unindexed.items())
+
+        matches = []
+        for reference_id, code in codes.items():
+            distance = bin(code ^ query_code).count("1")
+            if distance <= radius:
+                matches.append((reference_id, distance))
+        for reference_id, bits in unindexed:
+            if bits.size == 0:
+                continue
+            shared = min(bits.size, query_bits.size)
+            distance = int(np.count_nonzero(bits[:shared] != query_bits[:shared])) + abs(bits.size - query_bits.size)
+            if distance <= radius:
+                matches.append((reference_id, distance))
+        matches.sort(key=lambda item: (item[1], item[0]))
+        return matches
@@ -0,0 +1,136 @@
+"""
+Per-cat movement summaries: last-seen position, convex-hull home range and a
+Douglas–Peucker simplified trajectory of the recent sightings.
+
+Coordinates are projected onto a local equirectangular plane in metres around
+the points' mean latitude, which is accurate at the few-kilometre scale a cat
+roams; ranges spanning the antimeridian are not handled.
+
+The hull is exact under incremental updates (the hull of a set plus one point
+is the hull of the old hull vertices plus that point), so a new sighting can
+be folded in with :func:`extend_hull` without reading the history again. The
+simplified trajectory depends on the whole recent window and is recomputed in
+the background with :func:`recent_trajectory` from the last
+``TRAJECTORY_WINDOW`` sightings; :func:`summarize_movement` builds everything
+from the full history.
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Most recent sightings the trajectory is drawn from.
+TRAJECTORY_WINDOW = 200
+# Maximum deviation, in metres, of a dropped point from the simplified path.
+SIMPLIFY_TOLERANCE_METERS = 25.0
+_EARTH_RADIUS_METERS = 6371000.0
+
+LatLng = Tuple[float, float]
+
+
+def _projector(points: Sequence[LatLng]):
+    mean_latitude = sum(point[0] for point in points) / len(points)
+    scale_x = math.radians(1) * _EARTH_RADIUS_METERS * math.cos(math.radians(mean_latitude))
+    scale_y = math.radians(1) * _EARTH_RADIUS_METERS
+    return lambda point: (point[1] * scale_x, point[0] * scale_y)
+
+
+def convex_hull(points: Sequence[LatLng]) -> List[LatLng]:
+    """Hull vertices in counter-clockwise order (Andrew's monotone chain)."""
+    unique = sorted(set((float(lat), float(lng)) for lat, lng in points), key=lambda point: (point[1], point[0]))
+    if len(unique) <= 2:
+        return unique
+
+    def cross(origin: LatLng, a: LatLng, b: LatLng) -> float:
+        return (a[1] - origin[1]) * (b[0] - origin[0]) - (a[0] - origin[0]) * (b[1] - origin[1])
+
+    lower: List[LatLng] = []
+    for point in unique:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    upper: List[LatLng] = []
+    for point in reversed(unique):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    return lower[:-1] + upper[:-1]
+
+
+def extend_hull(hull: Sequence[LatLng], point: LatLng) -> List[LatLng]:
+    return convex_hull(list(hull) + [point])
+
+
+def hull_area_m2(hull: Sequence[LatLng]) -> float:
+    if len(hull) < 3:
+        return 0.0
+    project = _projector(hull)
+    xy = [project(point) for point in hull]
+    twice_area = 0.0
+    for index, (x1, y1) in enumerate(xy):
+        x2, y2 = xy[(index + 1) % len(xy)]
+        twice_area += x1 * y2 - x2 * y1
+    return abs(twice_area) / 2.0
+
+
+def simplify_path(points: Sequence[LatLng], tolerance_m: float = SIMPLIFY_TOLERANCE_METERS) -> List[int]:
+    """Indices of the points Douglas–Peucker keeps; the endpoints are always kept."""
+    count = len(points)
+    if count <= 2:
+        return list(range(count))
+    project = _projector(points)
+    xy = [project(point) for point in points]
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        (x1, y1), (x2, y2) = xy[start], xy[end]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+        farthest, farthest_distance = None, tolerance_m
+        for index in range(start + 1, end):
+            px, py = xy[index]
+            if length_sq == 0:
+                distance = math.hypot(px - x1, py - y1)
+            else:
+                t = max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length_sq))
+                distance = math.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+            if distance > farthest_distance:
+                farthest, farthest_distance = index, distance
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((start, farthest))
+            stack.append((farthest, end))
+    return [index for index in range(count) if keep[index]]
+
+
+def recent_trajectory(sightings: Sequence[Tuple[float, float, str]]) -> List[List]:
+    """Simplified path through the last ``TRAJECTORY_WINDOW`` sightings as ``[lat, lng, created_at]``."""
+    recent = list(sightings[-TRAJECTORY_WINDOW:])
+    kept = simplify_path([(lat, lng) for lat, lng, _ in recent])
+    return [list(recent[index]) for index in kept]
+
+
+def summarize_movement(sightings: Sequence[Tuple[float, float, str]]) -> Optional[Dict]:
+    """
+    Full summary of ``(latitude, longitude, created_at)`` sightings, oldest
+    first. ``home_range`` is the hull as ``[lat, lng]`` pairs and
+    ``trajectory`` the simplified recent path as ``[lat, lng, created_at]``.
+    """
+    if not sightings:
+        return None
+    positions = [(lat, lng) for lat, lng, _ in sightings]
+    hull = convex_hull(positions)
+    last_latitude, last_longitude, last_seen_at = sightings[-1]
+    return {
+        "sighting_count": len(sightings),
+        "first_seen_at": sightings[0][2],
+        "last_seen_at": last_seen_at,
+        "last_latitude": last_latitude,
+        "last_longitude": last_longitude,
+        "centroid_latitude": sum(lat for lat, _ in positions) / len(positions),
+        "centroid_longitude": sum(lng for _, lng in positions) / len(positions),
+        "home_range": [list(point) for point in hull],
+        "home_range_area_m2": round(hull_area_m2(hull), 1),
+        "trajectory": recent_trajectory(sightings),
+    }
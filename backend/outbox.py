@@ -0,0 +1,179 @@
+"""
+Durable email outbox.
+
+Request handlers never talk to the mail provider: they insert a row into
+``email_outbox`` and return. :class:`OutboxWorker` sends due rows on a daemon
+thread, several per provider call, and reschedules failures with exponential
+backoff until ``MAX_ATTEMPTS`` is reached. Rows left ``sending`` by a crash are
+returned to ``pending`` at start-up, so a message may be delivered twice but
+is never lost.
+
+Transports take a list of messages (``{"from", "to", "subject", "html",
+"text"}``) and either return or raise :class:`TransportError`.
+:class:`ResendTransport` uses Resend's batch endpoint; :class:`StubTransport`
+only records what it was given, for local development and tests.
+"""
+
+import json
+import random
+import threading
+import urllib.error
+import urllib.request
+from typing import Callable, Dict, List, Optional
+
+RESEND_BATCH_URL = 'https://api.resend.com/emails/batch'
+# Resend accepts at most 100 emails per batch request.
+MAX_BATCH_SIZE = 100
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30.0
+BACKOFF_MAX_SECONDS = 6 * 3600.0
+
+
+class TransportError(Exception):
+    """A send failed; ``retryable`` is False when resending the same batch cannot succeed."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number ``attempts`` (1-based): doubling from 30 s, capped, with ±20 % jitter."""
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class ResendTransport:
+    def __init__(self, api_key: str, timeout: float = 15.0):
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def send(self, messages: List[Dict]) -> None:
+        payload = []
+        for message in messages:
+            email_data = {
+                "from": message["from"],
+                "to": message["to"],
+                "subject": message["subject"],
+                "html": message["html"],
+            }
+            if message.get("text"):
+                email_data["text"] = message["text"]
+            payload.append(email_data)
+        req = urllib.request.Request(
+            RESEND_BATCH_URL,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json'
+            }
+        )
+        try:
+            response = urllib.request.urlopen(req, timeout=self.timeout)
+        except urllib.error.HTTPError as exc:
+            error_body = exc.read().decode('utf-8', errors='replace')
+            # Rate limits and server errors clear up; other 4xx mean the request itself is wrong.
+            retryable = exc.code == 429 or exc.code >= 500
+            raise TransportError(f"Resend API HTTP error: {exc.code} - {error_body}", retryable) from exc
+        except Exception as exc:
+            raise TransportError(f"Error sending email: {exc}") from exc
+        if response.getcode() != 200:
+            raise TransportError(f"Resend API error: {response.getcode()}")
+
+
+class StubTransport:
+    """Keeps sent messages in memory instead of delivering them."""
+
+    def __init__(self):
+        self.sent: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def send(self, messages: List[Dict]) -> None:
+        with self._lock:
+            self.sent.extend(messages)
+        for message in messages:
+            print(f"[Email] (stub) to {', '.join(message['to'])}: {message['subject']}")
+
+
+class OutboxWorker:
+    """
+    Sends due outbox rows in batches on a background thread.
+
+    ``claim(limit)`` returns due rows and marks them ``sending``; the worker then
+    calls ``mark_sent(ids)`` or ``mark_failed(id, error, retry_in_seconds)``
+    (``None`` = give up). ``transport()`` returns the transport to use, or
+    ``None`` while email is not configured.
+    """
+
+    def __init__(
+        self,
+        claim: Callable[[int], List[Dict]],
+        mark_sent: Callable[[List[int]], None],
+        mark_failed: Callable[[int, str, Optional[float]], None],
+        transport: Callable[[], Optional[object]],
+        poll_seconds: float = 5.0,
+    ):
+        self._claim = claim
+        self._mark_sent = mark_sent
+        self._mark_failed = mark_failed
+        self._transport = transport
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="email-outbox", daemon=True)
+            self._thread.start()
+
+    def notify(self) -> None:
+        """Wake the worker after a message was queued."""
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                processed = self.run_once()
+            except Exception as exc:
+                print(f"[Email] Outbox worker failed: {exc}")
+                processed = 0
+            if not processed:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def run_once(self) -> int:
+        """Send one batch of due messages; returns how many were attempted."""
+        transport = self._transport()
+        if transport is None:
+            return 0
+        rows = self._claim(MAX_BATCH_SIZE)
+        if not rows:
+            return 0
+        try:
+            transport.send([row["message"] for row in rows])
+        except TransportError as exc:
+            if len(rows) > 1 and not exc.retryable:
+                # One bad message rejects the whole batch; isolate it by sending singly.
+                for row in rows:
+                    self._send_one(transport, row)
+                return len(rows)
+            print(f"[Email] Batch of {len(rows)} messages failed: {exc}")
+            for row in rows:
+                self._fail(row, str(exc), exc.retryable)
+            return len(rows)
+        self._mark_sent([row["id"] for row in rows])
+        return len(rows)
+
+    def _send_one(self, transport, row: Dict) -> None:
+        try:
+            transport.send([row["message"]])
+        except TransportError as exc:
+            print(f"[Email] Message {row['id']} failed: {exc}")
+            self._fail(row, str(exc), exc.retryable)
+            return
+        self._mark_sent([row["id"]])
+
+    def _fail(self, row: Dict, error: str, retryable: bool) -> None:
+        attempts = row["attempts"] + 1
+        retry_in = backoff_seconds(attempts) if retryable and attempts < MAX_ATTEMPTS else None
+        self._mark_failed(row["id"], error, retry_in)
@@ -0,0 +1,86 @@
+"""
+Keyset pagination over ``(created_at, id)`` for the list APIs.
+
+A page is requested with ``?page_size=N`` and/or ``?cursor=<token>``; without
+either parameter the endpoints keep returning the full JSON array. Paged
+responses are ``{"items": [...], "next_cursor": <token or null>}``.
+
+The cursor is the ``(created_at, id)`` of the last row on the previous page,
+base64url-encoded so clients treat it as opaque. Queries continue with
+``(created_at, id) < (?, ?)`` in ``ORDER BY created_at DESC, id DESC`` order,
+which an index ending in ``created_at`` (the rowid is implicitly its last
+column) serves as a seek instead of an ``OFFSET`` scan. One row beyond the
+page size is fetched to know whether another page exists.
+"""
+
+import base64
+import binascii
+import json
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: str, row_id: int) -> str:
+    raw = json.dumps([created_at, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[str, int]:
+    """Inverse of :func:`encode_cursor`; raises ``ValueError`` for malformed tokens."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, row_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(created_at, str) or not isinstance(row_id, int):
+        raise ValueError("Invalid cursor")
+    return created_at, row_id
+
+
+class Page:
+    """A requested page: ``size`` rows after the ``after`` key (``None`` for the first page)."""
+
+    def __init__(self, size: int, after: Optional[Tuple[str, int]] = None):
+        self.size = size
+        self.after = after
+
+    @property
+    def fetch_limit(self) -> int:
+        return self.size + 1
+
+    def wrap(self, rows: List[Dict]) -> Dict:
+        """Trim the look-ahead row and build the response envelope."""
+        items = rows[: self.size]
+        next_cursor = None
+        if len(rows) > self.size and items:
+            last = items[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        return {"items": items, "next_cursor": next_cursor}
+
+
+def parse_page(
+    query_params: Dict[str, List[str]],
+    default_size: int = DEFAULT_PAGE_SIZE,
+    max_size: int = MAX_PAGE_SIZE,
+) -> Optional[Page]:
+    """
+    Read ``page_size`` / ``cursor`` from ``urllib.parse.parse_qs`` output.
+    Returns ``None`` when neither is present (legacy, unpaged response) and
+    raises ``ValueError`` for a malformed size or cursor.
+    """
+    size_param = query_params.get("page_size", [None])[0]
+    cursor_param = query_params.get("cursor", [None])[0]
+    if size_param is None and cursor_param is None:
+        return None
+    size = default_size
+    if size_param:
+        try:
+            size = int(size_param)
+        except ValueError as exc:
+            raise ValueError("page_size must be an integer") from exc
+        if size < 1:
+            raise ValueError("page_size must be positive")
+    after = decode_cursor(cursor_param) if cursor_param else None
+    return Page(min(size, max_size), after)
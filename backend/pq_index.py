@@ -0,0 +1,279 @@
+"""
+Product-quantization (PQ) index for large cat reference catalogues.
+
+Each embedding is split into ``num_subspaces`` contiguous chunks and every
+chunk is quantized against its own trainable codebook, so a 2048-d float32
+vector (8 KiB) is stored as ``num_subspaces`` bytes.  Queries are scored with
+asymmetric distance computation (ADC): the query stays in float32, is compared
+once against every codebook to build a lookup table, and each stored reference
+is scored by summing table entries selected by its codes.
+
+Embeddings produced by ``CatFaceRecognizer`` are L2-normalised, so the ADC
+score is an approximation of the cosine similarity used by ``match_against``.
+"""
+
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+PQ_INDEX_FORMAT_VERSION = 1
+
+
+def _nearest_centroids(data: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """Return the index of the closest centroid (L2) for every row of ``data``."""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(data.shape[0], dtype=np.int64)
+    for start in range(0, data.shape[0], batch_size):
+        chunk = data[start:start + batch_size]
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2; ||x||^2 does not change the argmin.
+        distances = centroid_norms[None, :] - 2.0 * (chunk @ centroids.T)
+        assignments[start:start + batch_size] = np.argmin(distances, axis=1)
+    return assignments
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Plain Lloyd's k-means, reseeding empty clusters from random samples."""
+    n = data.shape[0]
+    k = min(k, n)
+    centroids = data[rng.choice(n, size=k, replace=False)].astype(np.float32, copy=True)
+    for _ in range(iterations):
+        assignments = _nearest_centroids(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        counts = np.bincount(assignments, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(n, size=int(empty.sum()), replace=False)]
+    return centroids
+
+
+class ProductQuantizer:
+    """Trainable product quantizer with per-subspace k-means codebooks."""
+
+    def __init__(self, dim: int, num_subspaces: int = 16, num_centroids: int = 256):
+        if dim <= 0:
+            raise ValueError("dim must be positive")
+        if num_subspaces <= 0:
+            raise ValueError("num_subspaces must be positive")
+        if not 1 <= num_centroids <= 256:
+            raise ValueError("num_centroids must be between 1 and 256 (codes are stored as uint8)")
+        self.dim = int(dim)
+        self.num_subspaces = int(num_subspaces)
+        self.num_centroids = int(num_centroids)
+        # Pad the vector with zeros so it splits evenly into subspaces.
+        self.sub_dim = -(-self.dim // self.num_subspaces)
+        self.padded_dim = self.sub_dim * self.num_subspaces
+        self.codebooks: Optional[np.ndarray] = None  # (M, K, sub_dim)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+        if self.padded_dim != self.dim:
+            padded = np.zeros((vectors.shape[0], self.padded_dim), dtype=np.float32)
+            padded[:, : self.dim] = vectors
+            vectors = padded
+        return vectors.reshape(vectors.shape[0], self.num_subspaces, self.sub_dim)
+
+    def train(self, vectors: np.ndarray, iterations: int = 20, seed: int = 0) -> None:
+        subvectors = self._split(vectors)
+        if subvectors.shape[0] == 0:
+            raise ValueError("Cannot train a product quantizer without vectors")
+        rng = np.random.default_rng(seed)
+        k = min(self.num_centroids, subvectors.shape[0])
+        codebooks = np.zeros((self.num_subspaces, k, self.sub_dim), dtype=np.float32)
+        for m in range(self.num_subspaces):
+            codebooks[m] = _kmeans(np.ascontiguousarray(subvectors[:, m, :]), k, iterations, rng)
+        self.codebooks = codebooks
+        self.num_centroids = k
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.codebooks is None:
+            raise RuntimeError("Product quantizer has not been trained")
+        subvectors = self._split(vectors)
+        codes = np.empty((subvectors.shape[0], self.num_subspaces), dtype=np.uint8)
+        for m in range(self.num_subspaces):
+            codes[:, m] = _nearest_centroids(np.ascontiguousarray(subvectors[:, m, :]), self.codebooks[m])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        if self.codebooks is None:
+            raise RuntimeError("Product quantizer has not been trained")
+        codes = np.asarray(codes, dtype=np.int64)
+        parts = self.codebooks[np.arange(self.num_subspaces)[None, :], codes]
+        return parts.reshape(codes.shape[0], self.padded_dim)[:, : self.dim]
+
+    def similarity_table(self, query: np.ndarray) -> np.ndarray:
+        """Inner products between each query chunk and every centroid, shape (M, K)."""
+        if self.codebooks is None:
+            raise RuntimeError("Product quantizer has not been trained")
+        subquery = self._split(query)[0]
+        return np.einsum("mkd,md->mk", self.codebooks, subquery)
+
+
+class PQIndex:
+    """
+    Reference-image index storing PQ codes keyed by ``cat_reference_images.id``.
+
+    The index only keeps ids and codes; callers re-read the raw embedding blobs
+    of the shortlisted references when an exact rerank is wanted. ``add`` and
+    ``remove`` only change memory and mark the index dirty; ``save_if_dirty``
+    persists it once for any number of changes.
+    """
+
+    def __init__(self, quantizer: ProductQuantizer):
+        self.quantizer = quantizer
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes = np.empty((0, quantizer.num_subspaces), dtype=np.uint8)
+        self._lock = threading.RLock()
+        # Bumped on every change; equal to _saved_version when the file is current
+        self._version = 0
+        self._saved_version = 0
+
+    def __len__(self) -> int:
+        return int(self.ids.size)
+
+    @property
+    def dim(self) -> int:
+        return self.quantizer.dim
+
+    @property
+    def dirty(self) -> bool:
+        with self._lock:
+            return self._version != self._saved_version
+
+    @classmethod
+    def build(
+        cls,
+        training_vectors: np.ndarray,
+        *,
+        num_subspaces: int = 16,
+        num_centroids: int = 256,
+        iterations: int = 20,
+        seed: int = 0,
+    ) -> "PQIndex":
+        training_vectors = np.asarray(training_vectors, dtype=np.float32)
+        if training_vectors.ndim != 2 or training_vectors.shape[0] == 0:
+            raise ValueError("training_vectors must be a non-empty 2-D array")
+        quantizer = ProductQuantizer(training_vectors.shape[1], num_subspaces, num_centroids)
+        quantizer.train(training_vectors, iterations=iterations, seed=seed)
+        return cls(quantizer)
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray) -> None:
+        """Insert or replace the codes for the given reference ids."""
+        ids_array = np.asarray(list(ids), dtype=np.int64)
+        if ids_array.size == 0:
+            return
+        codes = self.quantizer.encode(vectors)
+        if codes.shape[0] != ids_array.size:
+            raise ValueError("ids and vectors must have the same length")
+        with self._lock:
+            keep = ~np.isin(self.ids, ids_array)
+            self.ids = np.concatenate([self.ids[keep], ids_array])
+            self.codes = np.concatenate([self.codes[keep], codes])
+            self._version += 1
+
+    def remove(self, ids: Iterable[int]) -> int:
+        ids_array = np.asarray(list(ids), dtype=np.int64)
+        if ids_array.size == 0:
+            return 0
+        with self._lock:
+            keep = ~np.isin(self.ids, ids_array)
+            removed = int(self.ids.size - keep.sum())
+            if removed:
+                self.ids = self.ids[keep]
+                self.codes = self.codes[keep]
+                self._version += 1
+        return removed
+
+    def search(self, query: np.ndarray, top_k: int = 100, batch_size: int = 65536) -> List[Tuple[int, float]]:
+        """Return ``(reference_id, approximate_similarity)`` pairs, best first."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        table = self.quantizer.similarity_table(query)
+        subspaces = np.arange(self.quantizer.num_subspaces)[None, :]
+
+        with self._lock:
+            ids = self.ids
+            codes = self.codes
+        if ids.size == 0 or top_k <= 0:
+            return []
+
+        scores = np.empty(ids.size, dtype=np.float32)
+        for start in range(0, ids.size, batch_size):
+            chunk = codes[start:start + batch_size]
+            scores[start:start + batch_size] = table[subspaces, chunk].sum(axis=1)
+
+        top_k = min(top_k, ids.size)
+        shortlist = np.argpartition(-scores, top_k - 1)[:top_k]
+        shortlist = shortlist[np.argsort(-scores[shortlist])]
+        return [(int(ids[i]), float(scores[i])) for i in shortlist]
+
+    def reconstruct(self, ids: Iterable[int]) -> Dict[int, np.ndarray]:
+        """Approximate embeddings decoded from the stored codes."""
+        wanted = np.asarray(list(ids), dtype=np.int64)
+        with self._lock:
+            mask = np.isin(self.ids, wanted)
+            found_ids = self.ids[mask]
+            found_codes = self.codes[mask]
+        if found_ids.size == 0:
+            return {}
+        vectors = self.quantizer.decode(found_codes)
+        return {int(ref_id): vectors[i] for i, ref_id in enumerate(found_ids)}
+
+    def save(self, path: str) -> None:
+        if self.quantizer.codebooks is None:
+            raise RuntimeError("Cannot save an untrained index")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            ids = self.ids.copy()
+            codes = self.codes.copy()
+            version = self._version
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as handle:
+            np.savez(
+                handle,
+                format_version=np.array(PQ_INDEX_FORMAT_VERSION),
+                dim=np.array(self.quantizer.dim),
+                codebooks=self.quantizer.codebooks,
+                ids=ids,
+                codes=codes,
+            )
+        os.replace(tmp_path, path)
+        with self._lock:
+            # Changes made while writing leave the index dirty
+            self._saved_version = max(self._saved_version, version)
+
+    def save_if_dirty(self, path: str) -> bool:
+        if not self.dirty:
+            return False
+        self.save(path)
+        return True
+
+    @classmethod
+    def load(cls, path: str) -> "PQIndex":
+        with np.load(path) as data:
+            version = int(data["format_version"])
+            if version != PQ_INDEX_FORMAT_VERSION:
+                raise ValueError(f"Unsupported PQ index format version {version}")
+            codebooks = data["codebooks"].astype(np.float32)
+            num_subspaces, num_centroids, _ = codebooks.shape
+            quantizer = ProductQuantizer(int(data["dim"]), num_subspaces, num_centroids)
+            quantizer.codebooks = codebooks
+            index = cls(quantizer)
+            index.ids = data["ids"].astype(np.int64)
+            index.codes = data["codes"].astype(np.uint8)
+        return index
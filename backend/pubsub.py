@@ -0,0 +1,235 @@
+"""
+In-process publish/subscribe and the server-sent events push channel.
+
+Handlers publish small JSON events to channels (``user:<id>``, ``admins``,
+``all``) on an :class:`EventBroker`. Every event gets an increasing id and is
+kept in a bounded replay buffer, so a client reconnecting with
+``Last-Event-ID`` receives what it missed; when the id has already left the
+buffer the client is told to ``resync`` (reload its data) instead.
+
+The HTTP server handles requests one at a time, so an ``/api/events`` request
+cannot hold its handler open. It writes the response headers and hands the
+socket to :class:`SSEHub`, whose single thread writes events and heartbeats to
+every open stream; the server is told not to close handed-over sockets (see
+``owns``). Handed-over sockets are non-blocking: each stream has its own
+output buffer, and the hub waits in a ``selectors`` loop for the streams that
+have data left, so one stalled client never delays the others. A stream that
+accepts nothing for ``write_timeout`` seconds, or whose buffer grows past
+``max_buffer_bytes``, is dropped. Streams are also closed after
+``max_age_seconds`` and on any write error, and the browser's ``EventSource``
+reconnects with the last id it saw.
+"""
+
+import collections
+import json
+import selectors
+import socket
+import threading
+import time
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+Event = Tuple[int, frozenset, str, Dict]
+
+
+class EventBroker:
+    def __init__(self, history: int = 2000):
+        self._events: Deque[Event] = collections.deque(maxlen=history)
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._listeners: List = []
+
+    def add_listener(self, callback) -> None:
+        """``callback()`` runs after every publish (used to wake the hub)."""
+        self._listeners.append(callback)
+
+    def publish(self, channels: Iterable[str], event: str, data: Dict) -> int:
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            self._events.append((event_id, frozenset(channels), event, data))
+        for callback in self._listeners:
+            callback()
+        return event_id
+
+    @property
+    def last_id(self) -> int:
+        with self._lock:
+            return self._next_id - 1
+
+    def events_after(self, last_id: int, channels: Iterable[str]) -> Tuple[List[Event], bool]:
+        """
+        Events newer than ``last_id`` on any of ``channels``, oldest first, and
+        whether that list is complete (False when older events were dropped).
+        """
+        wanted = set(channels)
+        with self._lock:
+            complete = not self._events or self._events[0][0] <= last_id + 1
+            events = [event for event in self._events if event[0] > last_id and event[1] & wanted]
+        return events, complete
+
+
+def format_event(event_id: Optional[int], event: str, data: Dict) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return ("\n".join(lines) + "\n\n").encode('utf-8')
+
+
+class _Stream:
+    def __init__(self, sock: socket.socket, channels: frozenset, last_id: int):
+        self.sock = sock
+        self.channels = channels
+        self.last_id = last_id
+        self.buffer = bytearray()
+        self.opened_at = time.monotonic()
+        self.last_write = self.opened_at
+        # When the buffer last became non-empty or last drained partly
+        self.blocked_since = self.opened_at
+        self.registered = False
+
+
+class SSEHub:
+    def __init__(
+        self,
+        broker: EventBroker,
+        heartbeat_seconds: float = 15.0,
+        max_age_seconds: float = 1800.0,
+        write_timeout: float = 5.0,
+        max_buffer_bytes: int = 256 * 1024,
+        retry_ms: int = 5000,
+    ):
+        self.broker = broker
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_age_seconds = max_age_seconds
+        self.write_timeout = write_timeout
+        self.max_buffer_bytes = max_buffer_bytes
+        self.retry_ms = retry_ms
+        self._streams: Dict[int, _Stream] = {}
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+        self._thread: Optional[threading.Thread] = None
+        broker.add_listener(self.wake)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="sse-hub", daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        try:
+            self._wake_writer.send(b'\0')
+        except OSError:
+            # Already full of wake-ups (or closed); the hub will run anyway
+            pass
+
+    def owns(self, sock) -> bool:
+        with self._lock:
+            return id(sock) in self._streams
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return len(self._streams)
+
+    def attach(self, sock: socket.socket, channels: Iterable[str], last_event_id: Optional[int]) -> None:
+        """
+        Take over a socket whose ``text/event-stream`` headers were already sent.
+        Without ``last_event_id`` the stream starts at the current event.
+        """
+        sock.setblocking(False)
+        channels = frozenset(channels)
+        preamble = f"retry: {self.retry_ms}\n\n".encode()
+        if last_event_id is None:
+            last_id = self.broker.last_id
+        else:
+            last_id = last_event_id
+            _, complete = self.broker.events_after(last_event_id, channels)
+            if not complete or last_event_id > self.broker.last_id:
+                # Missed events are gone (or the id is from before a restart)
+                last_id = self.broker.last_id
+                preamble += format_event(last_id, 'resync', {})
+        stream = _Stream(sock, channels, last_id)
+        stream.buffer += preamble
+        with self._lock:
+            self._streams[id(sock)] = stream
+        self.wake()
+
+    def _enqueue(self, stream: _Stream, payload: bytes, now: float) -> None:
+        if not stream.buffer:
+            stream.blocked_since = now
+        stream.buffer += payload
+
+    def _flush(self, stream: _Stream, now: float) -> bool:
+        """Send what the socket accepts without blocking; False if the stream was closed."""
+        while stream.buffer:
+            try:
+                sent = stream.sock.send(stream.buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self._close(stream)
+                return False
+            del stream.buffer[:sent]
+            stream.last_write = stream.blocked_since = now
+        if stream.buffer and (
+            now - stream.blocked_since > self.write_timeout or len(stream.buffer) > self.max_buffer_bytes
+        ):
+            # A client that stopped reading; it reconnects with Last-Event-ID
+            self._close(stream)
+            return False
+        if stream.buffer and not stream.registered:
+            self._selector.register(stream.sock, selectors.EVENT_WRITE, stream)
+            stream.registered = True
+        elif not stream.buffer and stream.registered:
+            self._selector.unregister(stream.sock)
+            stream.registered = False
+        return True
+
+    def _close(self, stream: _Stream) -> None:
+        with self._lock:
+            self._streams.pop(id(stream.sock), None)
+        if stream.registered:
+            self._selector.unregister(stream.sock)
+            stream.registered = False
+        try:
+            stream.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        stream.sock.close()
+
+    def _drain_wakeups(self) -> None:
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _loop(self) -> None:
+        while True:
+            for key, _ in self._selector.select(min(self.heartbeat_seconds / 3, self.write_timeout)):
+                if key.fileobj is self._wake_reader:
+                    self._drain_wakeups()
+            with self._lock:
+                streams = list(self._streams.values())
+            now = time.monotonic()
+            for stream in streams:
+                if now - stream.opened_at > self.max_age_seconds:
+                    self._close(stream)
+                    continue
+                latest = self.broker.last_id
+                events, _ = self.broker.events_after(stream.last_id, stream.channels)
+                if events:
+                    payload = b''.join(format_event(event_id, name, data) for event_id, _, name, data in events)
+                    self._enqueue(stream, payload, now)
+                    stream.last_id = max(latest, events[-1][0])
+                else:
+                    # Skip past other channels' events so the next scan starts later
+                    stream.last_id = max(stream.last_id, latest)
+                    if not stream.buffer and now - stream.last_write >= self.heartbeat_seconds:
+                        self._enqueue(stream, b': heartbeat\n\n', now)
+                self._flush(stream, now)
@@ -0,0 +1,330 @@
+"""
+SQLite query instrumentation for ``DatabaseManager``.
+
+``QueryProfiler.connect`` returns a ``sqlite3.Connection`` whose cursors time
+every statement, including the time spent fetching its rows, and attribute
+it to the calling ``DatabaseManager`` method.  The profiler keeps:
+
+* aggregated per-method statistics (statements, rows, total/max time, slow count);
+* a bounded log of statements slower than ``slow_threshold_ms`` together with
+  their ``EXPLAIN QUERY PLAN``;
+* candidate indexes derived from full-table ``SCAN`` steps in those plans,
+  counted by how often real traffic hit them.
+"""
+
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+_FROM_JOIN = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_][\w]*)(?:\s+(?:AS\s+)?([A-Za-z_][\w]*))?", re.IGNORECASE)
+_PREDICATE = re.compile(
+    r"(?:\b([A-Za-z_]\w*)\.)?\b([A-Za-z_]\w*)\s*(=|>=|<=|>|<|\bIN\b|\bIS\b|\bLIKE\b)",
+    re.IGNORECASE,
+)
+_RANGE_OPERATORS = {">", "<", ">=", "<="}
+_SQL_KEYWORDS = {
+    "where", "on", "join", "left", "right", "inner", "outer", "cross", "order", "group",
+    "limit", "set", "values", "using", "natural", "union", "having", "as",
+}
+_SCAN = re.compile(r"^SCAN (\w+)(?: AS (\w+))?(?! USING (?:COVERING )?INDEX)")
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = {"SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE", "WITH"}
+MAX_CACHED_PLANS = 500
+
+
+def _normalise_sql(sql: str) -> str:
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def _predicate_sql(sql: str) -> str:
+    """The part of a statement that can filter rows: join conditions and WHERE."""
+    match = re.search(r"\b(?:ON|WHERE)\b", sql, re.IGNORECASE)
+    if not match:
+        return ""
+    tail = sql[match.start():]
+    tail = re.split(r"\b(?:ORDER\s+BY|GROUP\s+BY|LIMIT)\b", tail, flags=re.IGNORECASE)[0]
+    return tail
+
+
+def suggest_indexes(sql: str, plan: Sequence[str], table_columns) -> List[str]:
+    """
+    Turn ``SCAN <table>`` plan steps into ``CREATE INDEX`` candidates on the
+    columns the statement filters that table by. ``table_columns`` maps a
+    table name to its column names.
+    """
+    aliases: Dict[str, str] = {}
+    for table, alias in _FROM_JOIN.findall(sql):
+        aliases[table.lower()] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias.lower()] = table
+
+    predicates = _PREDICATE.findall(_predicate_sql(sql))
+    suggestions = []
+    for step in plan:
+        match = _SCAN.match(step)
+        if not match:
+            continue
+        name = (match.group(2) or match.group(1)).lower()
+        table = aliases.get(name, match.group(1))
+        columns = {column.lower() for column in table_columns(table)}
+        equality: List[str] = []
+        ranges: List[str] = []
+        for qualifier, column, operator in predicates:
+            if qualifier and aliases.get(qualifier.lower(), qualifier).lower() != table.lower():
+                continue
+            if column.lower() not in columns or column.lower() == "id":
+                continue
+            target = ranges if operator in _RANGE_OPERATORS else equality
+            if column not in equality and column not in ranges:
+                target.append(column)
+        index_columns = equality + ranges[:1]
+        if index_columns:
+            suggestions.append(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(index_columns)} "
+                f"ON {table}({', '.join(index_columns)})"
+            )
+    return suggestions
+
+
+class _PendingStatement:
+    __slots__ = ("method", "sql", "params", "started", "elapsed", "rows")
+
+    def __init__(self, method: str, sql: str, params):
+        self.method = method
+        self.sql = sql
+        self.params = params
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.rows = 0
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that times ``execute`` plus the fetches that follow it."""
+
+    _profiler: "QueryProfiler"
+    _pending: Optional[_PendingStatement] = None
+
+    def _caller(self) -> str:
+        frame = sys._getframe(2)
+        while frame is not None and frame.f_code.co_filename == __file__:
+            frame = frame.f_back
+        if frame is None:
+            return "<unknown>"
+        owner = frame.f_locals.get("self")
+        name = frame.f_code.co_name
+        return f"{type(owner).__name__}.{name}" if owner is not None else name
+
+    def _finish_pending(self) -> None:
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            self._profiler.record(self.connection, pending)
+
+    def execute(self, sql, parameters=()):
+        self._finish_pending()
+        pending = _PendingStatement(self._caller(), sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            pending.elapsed = time.perf_counter() - started
+            pending.rows = max(self.rowcount, 0)
+            self._pending = pending
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish_pending()
+        pending = _PendingStatement(self._caller(), sql, None)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            pending.elapsed = time.perf_counter() - started
+            pending.rows = max(self.rowcount, 0)
+            self._pending = pending
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = fetch(*args)
+        if self._pending is not None:
+            self._pending.elapsed += time.perf_counter() - started
+            if isinstance(result, list):
+                self._pending.rows += len(result)
+            elif result is not None:
+                self._pending.rows += 1
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed_fetch(super().fetchmany)
+        return self._timed_fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def close(self):
+        self._finish_pending()
+        super().close()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    _profiler: "QueryProfiler"
+
+    def cursor(self, factory=ProfiledCursor):
+        cursor = super().cursor(factory)
+        if isinstance(cursor, ProfiledCursor):
+            cursor._profiler = self._profiler
+            self._cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        # Statements still pending on open cursors are recorded while the
+        # connection can still run EXPLAIN QUERY PLAN for them.
+        for cursor in self._cursors:
+            cursor._finish_pending()
+        self._cursors = []
+        super().close()
+
+
+class QueryProfiler:
+    """Collects per-method query statistics and a slow-query log."""
+
+    def __init__(self, slow_threshold_ms: float = 100.0, max_slow_entries: int = 200, enabled: bool = True):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._methods: Dict[str, Dict] = {}
+        self._slow = deque(maxlen=max_slow_entries)
+        self._index_candidates: Dict[str, Dict] = {}
+        self._plans: Dict[str, Tuple[List[str], List[str]]] = {}
+
+    def connect(self, db_path: str, **kwargs) -> sqlite3.Connection:
+        if not self.enabled:
+            return sqlite3.connect(db_path, **kwargs)
+        conn = sqlite3.connect(db_path, factory=ProfiledConnection, **kwargs)
+        conn._profiler = self
+        conn._cursors = []
+        return conn
+
+    def _explain(self, conn: sqlite3.Connection, sql: str, params) -> List[str]:
+        words = sql.split(None, 1)
+        if params is None or not words or words[0].upper() not in _EXPLAINABLE:
+            return []
+        try:
+            cursor = sqlite3.Cursor(conn)
+            rows = cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            cursor.close()
+        except sqlite3.Error:
+            return []
+        return [row[3] if not isinstance(row, sqlite3.Row) else row["detail"] for row in rows]
+
+    def _table_columns(self, conn: sqlite3.Connection):
+        def lookup(table: str) -> List[str]:
+            try:
+                cursor = sqlite3.Cursor(conn)
+                rows = cursor.execute(f"PRAGMA table_info({table})").fetchall()
+                cursor.close()
+            except sqlite3.Error:
+                return []
+            return [row[1] for row in rows]
+
+        return lookup
+
+    def record(self, conn: sqlite3.Connection, pending: _PendingStatement) -> None:
+        duration_ms = pending.elapsed * 1000.0
+        slow = duration_ms >= self.slow_threshold_ms
+        with self._lock:
+            stats = self._methods.get(pending.method)
+            if stats is None:
+                stats = self._methods[pending.method] = {
+                    "statements": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "rows": 0,
+                    "slow": 0,
+                    "slowest_sql": None,
+                }
+            stats["statements"] += 1
+            stats["total_ms"] += duration_ms
+            stats["rows"] += pending.rows
+            if duration_ms > stats["max_ms"]:
+                stats["max_ms"] = duration_ms
+                stats["slowest_sql"] = _normalise_sql(pending.sql)
+            if slow:
+                stats["slow"] += 1
+        if not slow:
+            return
+
+        sql = _normalise_sql(pending.sql)
+        cached = self._plans.get(sql)
+        if cached is None:
+            plan = self._explain(conn, pending.sql, pending.params)
+            suggestions = suggest_indexes(sql, plan, self._table_columns(conn)) if plan else []
+            cached = (plan, suggestions)
+            with self._lock:
+                if len(self._plans) < MAX_CACHED_PLANS:
+                    self._plans[sql] = cached
+        plan, suggestions = cached
+
+        entry = {
+            "at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(pending.started)),
+            "method": pending.method,
+            "sql": sql,
+            "duration_ms": round(duration_ms, 3),
+            "rows": pending.rows,
+            "plan": plan,
+            "suggestions": suggestions,
+        }
+        with self._lock:
+            self._slow.append(entry)
+            for suggestion in suggestions:
+                candidate = self._index_candidates.setdefault(
+                    suggestion, {"statement": suggestion, "hits": 0, "total_ms": 0.0, "methods": []}
+                )
+                candidate["hits"] += 1
+                candidate["total_ms"] += duration_ms
+                if pending.method not in candidate["methods"]:
+                    candidate["methods"].append(pending.method)
+        print(f"[DB] Slow query in {pending.method}: {duration_ms:.1f} ms, {pending.rows} rows: {sql[:200]}")
+        for step in plan:
+            print(f"[DB]   plan: {step}")
+
+    def snapshot(self, slow_limit: int = 50) -> Dict:
+        with self._lock:
+            methods = [
+                {
+                    "method": method,
+                    "statements": stats["statements"],
+                    "total_ms": round(stats["total_ms"], 3),
+                    "avg_ms": round(stats["total_ms"] / stats["statements"], 3) if stats["statements"] else 0.0,
+                    "max_ms": round(stats["max_ms"], 3),
+                    "rows": stats["rows"],
+                    "slow": stats["slow"],
+                    "slowest_sql": stats["slowest_sql"],
+                }
+                for method, stats in self._methods.items()
+            ]
+            slow = list(self._slow)[-slow_limit:][::-1] if slow_limit > 0 else []
+            candidates = [dict(candidate, total_ms=round(candidate["total_ms"], 3)) for candidate in self._index_candidates.values()]
+        methods.sort(key=lambda item: item["total_ms"], reverse=True)
+        candidates.sort(key=lambda item: item["total_ms"], reverse=True)
+        return {
+            "enabled": self.enabled,
+            "slow_threshold_ms": self.slow_threshold_ms,
+            "methods": methods,
+            "slow_queries": slow,
+            "index_candidates": candidates,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._methods.clear()
+            self._slow.clear()
+            self._index_candidates.clear()
+            self._plans.clear()
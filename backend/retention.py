@@ -0,0 +1,295 @@
+"""
+Retention for recognition events and the query photos they reference.
+
+Every recognize call writes a ``cat_recognition_events`` row and usually a
+photo under ``uploads/cat_queries``. The policy decides how long rows stay in
+the live table:
+
+* matched events are kept for ``matched_days``;
+* unmatched events are kept in full for ``unmatched_days``; after that only
+  every ``unmatched_keep_every``-th one (by id) stays, until ``matched_days``;
+* events a location-history row points at are never removed.
+
+Expired rows are appended to gzip-compressed JSON-lines archives, one file per
+month of ``created_at`` (``<archive_dir>/cat_recognition_events/2024-05.jsonl.gz``),
+and fsynced before they are deleted, so an interrupted run at worst archives a
+row twice (the ``id`` is kept for de-duplication). Hourly and daily figures
+survive in the rollup tables.
+
+Photos no longer referenced by any event or location row are deleted by
+:class:`QueryImageCollector` once they are older than ``image_grace_hours``
+(an in-flight recognize call writes the file before its event row).
+
+Both jobs are :class:`~backend.migrations.Backfill` steps on their own runner;
+:class:`QuietHoursScheduler` starts that runner once a day inside the
+configured quiet hours, and admins can start it on demand.
+"""
+
+import datetime
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+DEFAULT_POLICY = {
+    "matched_days": 365,
+    "unmatched_days": 30,
+    "unmatched_keep_every": 10,
+    "image_grace_hours": 24,
+    "quiet_hours": "2-5",
+}
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_quiet_hours(spec: str) -> Tuple[int, int]:
+    """``"2-5"`` -> ``(2, 5)``: from 02:00 up to 05:00 server local time; ``"22-4"`` wraps midnight."""
+    try:
+        start, end = (int(part) for part in spec.split('-'))
+    except (AttributeError, ValueError) as exc:
+        raise ValueError("quiet_hours must look like 2-5") from exc
+    if not (0 <= start <= 23 and 0 <= end <= 24) or start == end:
+        raise ValueError("quiet_hours must be two different hours between 0 and 24")
+    return start, end
+
+
+def in_quiet_hours(spec: str, now: Optional[datetime.datetime] = None) -> bool:
+    start, end = parse_quiet_hours(spec)
+    hour = (now or datetime.datetime.now()).hour
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class RetentionPolicy:
+    def __init__(
+        self,
+        matched_days: int,
+        unmatched_days: int,
+        unmatched_keep_every: int,
+        image_grace_hours: int,
+        quiet_hours: str,
+    ):
+        self.matched_days = matched_days
+        self.unmatched_days = unmatched_days
+        self.unmatched_keep_every = unmatched_keep_every
+        self.image_grace_hours = image_grace_hours
+        self.quiet_hours = quiet_hours
+
+    @classmethod
+    def from_values(cls, values: Dict) -> "RetentionPolicy":
+        """Build and validate a policy; missing keys take ``DEFAULT_POLICY``. Raises ``ValueError``."""
+        merged = dict(DEFAULT_POLICY)
+        merged.update({key: value for key, value in values.items() if value not in (None, '')})
+        try:
+            policy = cls(
+                matched_days=int(merged["matched_days"]),
+                unmatched_days=int(merged["unmatched_days"]),
+                unmatched_keep_every=int(merged["unmatched_keep_every"]),
+                image_grace_hours=int(merged["image_grace_hours"]),
+                quiet_hours=str(merged["quiet_hours"]),
+            )
+        except (TypeError, ValueError) as exc:
+            raise ValueError("retention days, keep_every and grace hours must be integers") from exc
+        if policy.matched_days < 1 or policy.unmatched_days < 1:
+            raise ValueError("retention periods must be at least one day")
+        if policy.unmatched_days > policy.matched_days:
+            raise ValueError("unmatched_days must not exceed matched_days")
+        if policy.unmatched_keep_every < 1:
+            raise ValueError("unmatched_keep_every must be at least 1")
+        if policy.image_grace_hours < 1:
+            raise ValueError("image_grace_hours must be at least 1")
+        parse_quiet_hours(policy.quiet_hours)
+        return policy
+
+    def cutoffs(self, now: Optional[datetime.datetime] = None) -> Tuple[str, str]:
+        """``(matched_cutoff, unmatched_cutoff)`` in the stored UTC timestamp format."""
+        now = now or datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        matched = now - datetime.timedelta(days=self.matched_days)
+        unmatched = now - datetime.timedelta(days=self.unmatched_days)
+        return matched.strftime(_TIMESTAMP_FORMAT), unmatched.strftime(_TIMESTAMP_FORMAT)
+
+    def to_dict(self) -> Dict:
+        return {
+            "matched_days": self.matched_days,
+            "unmatched_days": self.unmatched_days,
+            "unmatched_keep_every": self.unmatched_keep_every,
+            "image_grace_hours": self.image_grace_hours,
+            "quiet_hours": self.quiet_hours,
+        }
+
+
+class ArchiveWriter:
+    """Appends rows to per-table, per-month gzip JSON-lines files."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def append(self, table: str, rows: List[Dict]) -> None:
+        by_month: Dict[str, List[Dict]] = {}
+        for row in rows:
+            by_month.setdefault(str(row.get('created_at') or 'undated')[:7], []).append(row)
+        table_dir = os.path.join(self.directory, table)
+        with self._lock:
+            os.makedirs(table_dir, exist_ok=True)
+            for month, month_rows in sorted(by_month.items()):
+                path = os.path.join(table_dir, f"{month}.jsonl.gz")
+                # Each append adds a gzip member; readers decompress the concatenation.
+                with open(path, 'ab') as raw:
+                    with gzip.GzipFile(fileobj=raw, mode='ab') as handle:
+                        for row in month_rows:
+                            handle.write((json.dumps(row, ensure_ascii=False) + '\n').encode('utf-8'))
+                    raw.flush()
+                    os.fsync(raw.fileno())
+
+    def list_files(self) -> List[Dict]:
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for table in sorted(os.listdir(self.directory)):
+            table_dir = os.path.join(self.directory, table)
+            if not os.path.isdir(table_dir):
+                continue
+            for name in sorted(os.listdir(table_dir)):
+                files.append({
+                    "table": table,
+                    "file": name,
+                    "bytes": os.path.getsize(os.path.join(table_dir, name)),
+                })
+        return files
+
+
+class EventArchiver:
+    """
+    Backfill step that archives expired events in ``(created_at, id)`` order.
+    The cursor skips rows the policy keeps, so a pass never rescans them.
+    """
+
+    def __init__(
+        self,
+        fetch_expired: Callable[..., List[Dict]],
+        delete_events: Callable[[List[int]], None],
+        writer: ArchiveWriter,
+        policy: Callable[[], RetentionPolicy],
+    ):
+        self._fetch_expired = fetch_expired
+        self._delete_events = delete_events
+        self._writer = writer
+        self._policy = policy
+        self._after: Optional[Tuple[str, int]] = None
+        self._cutoffs: Optional[Tuple[str, str]] = None
+        self.archived = 0
+
+    def _fetch(self, limit: int) -> List[Dict]:
+        if self._cutoffs is None:
+            self._cutoffs = self._policy().cutoffs()
+        matched_cutoff, unmatched_cutoff = self._cutoffs
+        return self._fetch_expired(
+            matched_cutoff=matched_cutoff,
+            unmatched_cutoff=unmatched_cutoff,
+            keep_every=self._policy().unmatched_keep_every,
+            after=self._after,
+            limit=limit,
+        )
+
+    def pending(self) -> bool:
+        self._after = None
+        self._cutoffs = None
+        return bool(self._fetch(1))
+
+    def run_batch(self, batch_size: int) -> int:
+        rows = self._fetch(batch_size)
+        if not rows:
+            return 0
+        self._writer.append('cat_recognition_events', rows)
+        self._delete_events([row['id'] for row in rows])
+        self._after = (rows[-1]['created_at'], rows[-1]['id'])
+        self.archived += len(rows)
+        return len(rows)
+
+    def finish(self) -> None:
+        self._after = None
+        self._cutoffs = None
+
+
+class QueryImageCollector:
+    """Backfill step that deletes query photos no event or location row references."""
+
+    def __init__(
+        self,
+        directory: str,
+        find_referenced: Callable[[List[str]], Set[str]],
+        policy: Callable[[], RetentionPolicy],
+    ):
+        self.directory = directory
+        self._find_referenced = find_referenced
+        self._policy = policy
+        self._queue: Optional[List[str]] = None
+        self.removed = 0
+        self.removed_bytes = 0
+
+    def pending(self) -> bool:
+        if not self._queue:
+            try:
+                self._queue = sorted(os.listdir(self.directory), reverse=True)
+            except FileNotFoundError:
+                self._queue = []
+        return bool(self._queue)
+
+    def run_batch(self, batch_size: int) -> int:
+        if not self._queue:
+            return 0
+        batch = [self._queue.pop() for _ in range(min(batch_size, len(self._queue)))]
+        cutoff = time.time() - self._policy().image_grace_hours * 3600
+        candidates = []
+        for name in batch:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if os.path.isfile(path) and stat.st_mtime < cutoff:
+                candidates.append((path, stat.st_size))
+        referenced = self._find_referenced([path for path, _ in candidates]) if candidates else set()
+        for path, size in candidates:
+            if path in referenced:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self.removed += 1
+            self.removed_bytes += size
+        return len(batch)
+
+    def finish(self) -> None:
+        self._queue = None
+
+
+class QuietHoursScheduler:
+    """Starts ``runner`` at most once a day while inside the configured quiet hours."""
+
+    def __init__(self, start: Callable[[], None], quiet_hours: Callable[[], str], interval_seconds: float = 600.0):
+        self._start = start
+        self._quiet_hours = quiet_hours
+        self.interval_seconds = interval_seconds
+        self._last_run: Optional[datetime.date] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="retention-scheduler", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            now = datetime.datetime.now()
+            try:
+                if self._last_run != now.date() and in_quiet_hours(self._quiet_hours(), now):
+                    self._last_run = now.date()
+                    self._start()
+            except Exception as exc:
+                print(f"[DB] Retention scheduler failed: {exc}")
+            time.sleep(self.interval_seconds)
@@ -0,0 +1,69 @@
+"""
+Hourly and daily rollups for the admin analytics.
+
+Recognition requests and sightings are counted into small aggregate tables
+(``recognition_rollups``, ``sighting_rollups``) in the same transaction that
+writes the event, so the stats API reads a few hundred bucket rows instead of
+scanning ``cat_recognition_events`` or ``cat_location_history``. Buckets are
+keyed by their start in the stored UTC ``YYYY-MM-DD HH:MM:SS`` clock: an hour
+bucket is ``YYYY-MM-DD HH:00:00`` and a day bucket ``YYYY-MM-DD``. Sightings are
+additionally keyed by cat and by region, a ``REGION_PRECISION``-character
+geohash (cells of roughly 39 x 20 km).
+
+Rows that predate the rollup tables are counted by a backfill that walks each
+source table by id up to the high-water mark recorded when the tables were
+created; everything above that mark is counted on write.
+"""
+
+import datetime
+from typing import List, Optional, Tuple
+
+GRANULARITIES = ('hour', 'day')
+REGION_PRECISION = 4
+# Window returned when the request gives no start, per granularity.
+DEFAULT_WINDOWS = {
+    'hour': datetime.timedelta(hours=48),
+    'day': datetime.timedelta(days=30),
+}
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def bucket_keys(created_at: str) -> List[Tuple[str, str]]:
+    """``(granularity, bucket)`` pairs a row created at ``created_at`` is counted in."""
+    return [('hour', created_at[:13] + ':00:00'), ('day', created_at[:10])]
+
+
+def _floor(moment: datetime.datetime, granularity: str) -> datetime.datetime:
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _bucket_key(moment: datetime.datetime, granularity: str) -> str:
+    return moment.strftime('%Y-%m-%d %H:00:00' if granularity == 'hour' else '%Y-%m-%d')
+
+
+def bucket_range(granularity: str, start_time: Optional[str], end_time: Optional[str]) -> Tuple[str, str]:
+    """
+    Bucket keys ``[first, stop)`` covering the half-open time range
+    ``[start_time, end_time)``. ``end_time`` defaults to now and ``start_time``
+    to ``DEFAULT_WINDOWS[granularity]`` before it.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    step = datetime.timedelta(hours=1) if granularity == 'hour' else datetime.timedelta(days=1)
+    if end_time is not None:
+        end = datetime.datetime.strptime(end_time, _TIMESTAMP_FORMAT)
+    else:
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+        end = now + datetime.timedelta(seconds=1)
+    stop = _floor(end, granularity)
+    if stop < end:
+        stop += step
+    if start_time is not None:
+        first = _floor(datetime.datetime.strptime(start_time, _TIMESTAMP_FORMAT), granularity)
+    else:
+        first = stop - DEFAULT_WINDOWS[granularity]
+    if first >= stop:
+        raise ValueError("start must be before end")
+    return _bucket_key(first, granularity), _bucket_key(stop, granularity)
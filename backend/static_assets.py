@@ -0,0 +1,229 @@
+"""
+HTTP caching for the static files (pages, ``css/`` and ``js/``).
+
+Every static response carries a strong ``ETag`` (a SHA-256 prefix of the file
+contents) and ``Last-Modified``; :func:`not_modified` evaluates
+``If-None-Match`` / ``If-Modified-Since`` so unchanged files are answered with
+304. Digests are cached per path and recomputed only when the file's mtime or
+size changes.
+
+Stylesheets and scripts can also be requested under a fingerprinted name,
+``js/auth.<8 hex digits>.js``. When the digits match the current contents the
+response is cacheable for a year (``immutable``); a stale fingerprint still
+gets the current file, but with ``no-cache``, so an HTML page that was not
+rebuilt is merely slower, never wrong. Plain names and pages are sent with
+``no-cache`` (use the cached copy after a 304 revalidation).
+
+The build step rewrites the references in the HTML pages to fingerprinted
+names, in place, and writes ``.gz`` / ``.br`` variants of the pages, css and
+js (see :func:`backend.compression.write_precompressed`). A variant is served
+when the client accepts its encoding and it is not older than the file
+itself, with its own ETag (``"<digest>-gzip"``). The build can be re-run at
+any time::
+
+    python -m backend.static_assets
+"""
+
+import argparse
+import email.utils
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from backend.compression import FILE_SUFFIXES, negotiate, write_precompressed
+
+FINGERPRINT_LENGTH = 8
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+ASSET_DIRS = ('css', 'js')
+PRECOMPRESSED_EXTENSIONS = ('.html', '.css', '.js')
+
+_FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{%d})(?P<ext>\.(?:css|js))$' % FINGERPRINT_LENGTH)
+_HTML_REFERENCE = re.compile(
+    r'(?P<attr>\b(?:src|href)=["\'])(?P<slash>/?)(?P<path>(?:%s)/[^"\'?#]+?\.(?:css|js))(?=["\'?#])'
+    % '|'.join(ASSET_DIRS)
+)
+
+
+class StaticFile:
+    def __init__(self, digest: str, mtime: float, size: int):
+        self.digest = digest
+        self.mtime = mtime
+        self.size = size
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest[:16]}"'
+
+    @property
+    def fingerprint(self) -> str:
+        return self.digest[:FINGERPRINT_LENGTH]
+
+    @property
+    def last_modified(self) -> str:
+        return email.utils.formatdate(int(self.mtime), usegmt=True)
+
+
+class StaticFileIndex:
+    """Content digests of served files, cached on ``(mtime_ns, size)``."""
+
+    def __init__(self):
+        self._files: Dict[str, Tuple[int, int, StaticFile]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> StaticFile:
+        """Validators for ``path``; raises ``OSError`` if it cannot be read."""
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._files.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(65536), b''):
+                digest.update(chunk)
+        info = StaticFile(digest.hexdigest(), stat.st_mtime, stat.st_size)
+        with self._lock:
+            self._files[path] = (stat.st_mtime_ns, stat.st_size, info)
+        return info
+
+
+def split_fingerprint(url_path: str) -> Tuple[str, Optional[str]]:
+    """``/js/auth.1a2b3c4d.js`` -> ``("/js/auth.js", "1a2b3c4d")``; other paths -> ``(path, None)``."""
+    match = _FINGERPRINTED.match(url_path)
+    if not match:
+        return url_path, None
+    return match.group('stem') + match.group('ext'), match.group('fingerprint')
+
+
+def variant_etag(info: StaticFile, encoding: Optional[str]) -> str:
+    """Each content-coding is a separate representation and needs its own strong ETag."""
+    if encoding is None:
+        return info.etag
+    return f'{info.etag[:-1]}-{encoding}"'
+
+
+def precompressed_variant(path: str, accept_encoding: Optional[str]) -> Optional[Tuple[str, str]]:
+    """``(encoding, variant_path)`` of the best up-to-date build-time variant the client accepts."""
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    fresh = {}
+    for encoding, suffix in FILE_SUFFIXES.items():
+        try:
+            if os.stat(path + suffix).st_mtime_ns >= source_mtime:
+                fresh[encoding] = path + suffix
+        except OSError:
+            continue
+    if not fresh:
+        return None
+    encoding = negotiate(accept_encoding, list(fresh))
+    return (encoding, fresh[encoding]) if encoding else None
+
+
+def not_modified(headers, info: StaticFile, etag: Optional[str] = None) -> bool:
+    """True when the request's validators show the client already has ``info`` (as ``etag``, if given)."""
+    etag = etag or info.etag
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        # If-None-Match takes precedence; weak comparison as GET requires
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or any((tag[2:] if tag.startswith('W/') else tag) == etag for tag in tags)
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        if since is None:
+            return False
+        return int(info.mtime) <= since.timestamp()
+    return False
+
+
+def fingerprinted_name(relative_path: str, info: StaticFile) -> str:
+    stem, ext = os.path.splitext(relative_path)
+    return f"{stem}.{info.fingerprint}{ext}"
+
+
+def rewrite_references(html: str, root: str, index: StaticFileIndex) -> Tuple[str, List[str]]:
+    """
+    Point ``src``/``href`` references to local css/js files at their current
+    fingerprinted names. Already fingerprinted references are updated, and
+    files that do not exist are left alone. Returns the new HTML and the
+    rewritten asset paths.
+    """
+    rewritten = []
+
+    def replace(match) -> str:
+        plain, _ = split_fingerprint(match.group('path'))
+        try:
+            info = index.get(os.path.join(root, plain))
+        except OSError:
+            return match.group(0)
+        name = fingerprinted_name(plain, info)
+        if name != match.group('path'):
+            rewritten.append(plain)
+        return match.group('attr') + match.group('slash') + name
+
+    return _HTML_REFERENCE.sub(replace, html), rewritten
+
+
+def build(root: str) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """
+    Rewrite every ``*.html`` page directly under ``root``, then precompress the
+    pages, css and js. Returns ``({page: [assets]}, {file: [encodings]})`` for
+    the pages and variants that changed.
+    """
+    index = StaticFileIndex()
+    rewritten = {}
+    for name in sorted(os.listdir(root)):
+        if not name.endswith('.html'):
+            continue
+        path = os.path.join(root, name)
+        with open(path, encoding='utf-8') as handle:
+            html = handle.read()
+        updated, assets = rewrite_references(html, root, index)
+        if updated != html:
+            with open(path, 'w', encoding='utf-8') as handle:
+                handle.write(updated)
+            rewritten[name] = assets
+
+    compressed = {}
+    candidates = sorted(os.listdir(root))
+    for directory in ASSET_DIRS:
+        if os.path.isdir(os.path.join(root, directory)):
+            candidates += [f"{directory}/{name}" for name in sorted(os.listdir(os.path.join(root, directory)))]
+    for relative_path in candidates:
+        path = os.path.join(root, relative_path)
+        if relative_path.endswith(PRECOMPRESSED_EXTENSIONS) and os.path.isfile(path):
+            encodings = write_precompressed(path)
+            if encodings:
+                compressed[relative_path] = encodings
+    return rewritten, compressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rewrite css/js references in the HTML pages to fingerprinted names and precompress them."
+    )
+    parser.add_argument(
+        "root",
+        nargs="?",
+        default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        help="directory holding the pages and the css/ and js/ folders (default: project root)",
+    )
+    args = parser.parse_args()
+    rewritten, compressed = build(args.root)
+    for page, assets in rewritten.items():
+        print(f"{page}: {', '.join(sorted(set(assets)))}")
+    for relative_path, encodings in compressed.items():
+        print(f"{relative_path}: {', '.join(encodings)}")
+    print(f"{len(rewritten)} page(s) updated, {len(compressed)} file(s) precompressed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Lightweight request tracing with nested, monotonic-clock spans.
+
+A trace is bound to the current thread, so code deep inside a request (for
+example ``CatFaceRecognizer``) can open spans with the module-level
+:func:`span` without the trace being passed around.  When no trace is active,
+or the request was not sampled, :func:`span` is a no-op context manager.
+
+    trace = start_trace(sampled=True)
+    try:
+        with span("decode"):
+            ...
+    finally:
+        finish_trace()
+    trace.to_dict()  # {"trace_id": ..., "total_ms": ..., "spans": [...]}
+"""
+
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+_local = threading.local()
+
+
+class Trace:
+    """Spans recorded for one request, with offsets relative to the trace start."""
+
+    def __init__(self, trace_id: Optional[str] = None, sampled: bool = True):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.spans: List[Dict] = []
+        self._stack: List[Dict] = []
+
+    @contextmanager
+    def span(self, name: str):
+        if not self.sampled:
+            yield
+            return
+        record = {
+            "name": name,
+            "parent": self._stack[-1]["name"] if self._stack else None,
+            "start_ms": round((time.perf_counter() - self.started) * 1000.0, 3),
+            "duration_ms": None,
+        }
+        self.spans.append(record)
+        self._stack.append(record)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["duration_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+            self._stack.pop()
+
+    def finish(self) -> None:
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    @property
+    def total_ms(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return round((end - self.started) * 1000.0, 3)
+
+    def to_dict(self) -> Dict:
+        return {"trace_id": self.trace_id, "total_ms": self.total_ms, "spans": list(self.spans)}
+
+    def server_timing(self) -> str:
+        """Top-level spans formatted for a ``Server-Timing`` response header."""
+        entries = [
+            f"{record['name']};dur={record['duration_ms']}"
+            for record in self.spans
+            if record["parent"] is None and record["duration_ms"] is not None
+        ]
+        entries.append(f"total;dur={self.total_ms}")
+        return ", ".join(entries)
+
+
+def should_sample(rate: float) -> bool:
+    if rate >= 1.0:
+        return True
+    if rate <= 0.0:
+        return False
+    return random.random() < rate
+
+
+def start_trace(sampled: bool = True, trace_id: Optional[str] = None) -> Trace:
+    trace = Trace(trace_id=trace_id, sampled=sampled)
+    _local.trace = trace
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, "trace", None)
+
+
+def finish_trace() -> Optional[Trace]:
+    trace = current_trace()
+    if trace is not None:
+        trace.finish()
+    _local.trace = None
+    return trace
+
+
+@contextmanager
+def span(name: str):
+    """Time a stage of the current thread's trace, if there is one."""
+    trace = current_trace()
+    if trace is None or not trace.sampled:
+        yield
+        return
+    with trace.span(name):
+        yield
@@ -0,0 +1,411 @@
+"""
+Before/after benchmark for the secondary indexes in ``server.SECONDARY_INDEXES``
+and ``server.LOCATION_HISTORY_INDEXES``.
+
+Fills a synthetic ``cats.db`` with about a million rows spread over the tables
+the hot lookups touch (reference images, messages, recognition events,
+location history, tokens, ...), then times the real ``DatabaseManager``
+methods twice: once with only the primary keys and UNIQUE constraints, and
+once after the index migrations (``_create_secondary_indexes`` and
+``_create_location_history_indexes``) have run. The report records, per
+lookup, the latency distribution and the ``EXPLAIN QUERY PLAN`` of each
+statement in both states, plus how long building the indexes took.
+
+Example:
+    python benchmarks/index_benchmark.py --rows 1000000 --repeat 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Share of ``--rows`` that goes into each table.
+TABLE_SHARES = {
+    "users": 0.02,
+    "cats": 0.03,
+    "cat_reference_images": 0.35,
+    "messages": 0.25,
+    "cat_recognition_events": 0.18,
+    "cat_location_history": 0.10,
+    "adoption_requests": 0.02,
+    "password_reset_tokens": 0.03,
+    "admin_login_tokens": 0.02,
+}
+BATCH_SIZE = 20000
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseManager lookups with and without secondary indexes.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Total synthetic rows across all tables.")
+    parser.add_argument("--repeat", type=int, default=30, help="Timed calls per lookup and state.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--cache-dir",
+        default=os.path.join(tempfile.gettempdir(), "catalist-benchmark"),
+        help="Where the synthetic database is generated and reused.",
+    )
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate the cached database.")
+    parser.add_argument("--output", default=None, help="JSON report path (default: benchmarks/results/<timestamp>.json).")
+    return parser.parse_args()
+
+
+def _timestamps(rng: np.random.Generator, count: int, days: int = 730) -> List[str]:
+    now = datetime.datetime(2026, 1, 1)
+    offsets = rng.integers(0, days * 86400, size=count)
+    return [(now - datetime.timedelta(seconds=int(offset))).strftime("%Y-%m-%d %H:%M:%S") for offset in offsets]
+
+
+def _insert_batched(cursor, sql: str, count: int, make_rows: Callable[[int, int], List[Tuple]]) -> None:
+    for start in range(0, count, BATCH_SIZE):
+        cursor.executemany(sql, make_rows(start, min(start + BATCH_SIZE, count)))
+
+
+def build_database(server, path: str, total_rows: int, seed: int) -> None:
+    """Create the real schema through ``DatabaseManager`` and bulk-load synthetic rows."""
+    if os.path.exists(path):
+        os.remove(path)
+    server.DatabaseManager(path)
+    rng = np.random.default_rng(seed)
+    counts = {table: max(1, int(total_rows * share)) for table, share in TABLE_SHARES.items()}
+    num_users = counts["users"]
+    num_cats = counts["cats"]
+
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    drop_secondary_indexes(cursor)
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM users")
+    first_user = cursor.fetchone()[0] + 1
+
+    def users(start, stop):
+        created = _timestamps(rng, stop - start)
+        return [
+            (f"User {index}", f"bench{index}@example.com", "x", f"verify-{index}" if index % 3 == 0 else None, created[i])
+            for i, index in enumerate(range(start, stop))
+        ]
+
+    _insert_batched(
+        cursor,
+        "INSERT INTO users (name, email, password_hash, verification_token, created_at) VALUES (?, ?, ?, ?, ?)",
+        num_users,
+        users,
+    )
+
+    def user_ids(size: int) -> np.ndarray:
+        return rng.integers(first_user, first_user + num_users, size=size)
+
+    def cat_ids(size: int) -> np.ndarray:
+        return rng.integers(1, num_cats + 1, size=size)
+
+    def cats(start, stop):
+        created = _timestamps(rng, stop - start)
+        owners = user_ids(stop - start)
+        approved = rng.random(stop - start) < 0.8
+        return [
+            (f"Bench cat {index}", int(owners[i]), int(approved[i]), created[i])
+            for i, index in enumerate(range(start, stop))
+        ]
+
+    _insert_batched(
+        cursor,
+        "INSERT INTO cats (name, owner_id, is_approved, created_at) VALUES (?, ?, ?, ?)",
+        num_cats,
+        cats,
+    )
+
+    def references(start, stop):
+        created = _timestamps(rng, stop - start)
+        owners = cat_ids(stop - start)
+        return [
+            (int(owners[i]), f"uploads/cat_references/bench_{index}.jpg", "0" * 32, 128, index % 10, created[i])
+            for i, index in enumerate(range(start, stop))
+        ]
+
+    _insert_batched(
+        cursor,
+        "INSERT INTO cat_reference_images (cat_id, image_path, hash_hex, hash_length, order_index, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        counts["cat_reference_images"],
+        references,
+    )
+
+    def messages(start, stop):
+        created = _timestamps(rng, stop - start)
+        senders = user_ids(stop - start)
+        receivers = user_ids(stop - start)
+        return [
+            (int(senders[i]), int(receivers[i]), "Hello", "Benchmark message", int(i % 2), created[i])
+            for i in range(stop - start)
+        ]
+
+    _insert_batched(
+        cursor,
+        "INSERT INTO messages (sender_id, receiver_id, subject, content, is_read, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        counts["messages"],
+        messages,
+    )
+
+    def events(start, stop):
+        created = _timestamps(rng, stop - start)
+        matched = cat_ids(stop - start)
+        return [(int(matched[i]), 1, 0.9, 4, "{}", created[i]) for i in range(stop - start)]
+
+    _insert_batched(
+        cursor,
+        "INSERT INTO cat_recognition_events (cat_id, matched, match_score, hash_distance, request_metadata, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        counts["cat_recognition_events"],
+        events,
+    )
+
+    def locations(start, stop):
+        created = _timestamps(rng, stop - start)
+        owners = cat_ids(stop - start)
+        reporters = user_ids(stop - start)
+        latitudes = 31.2 + rng.random(stop - start) * 0.2
+        longitudes = 121.4 + rng.random(stop - start) * 0.2
+        return [
+            (int(owners[i]), int(reporters[i]), float(latitudes[i]), float(longitudes[i]), "seen", created[i])
+            for i in range(stop - start)
+        ]
+
+    _insert_batched(
+        cursor,
+        "INSERT INTO cat_location_history (cat_id, user_id, latitude, longitude, visit_status, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        counts["cat_location_history"],
+        locations,
+    )
+
+    def adoption_requests(start, stop):
+        created = _timestamps(rng, stop - start)
+        requested = cat_ids(stop - start)
+        requesters = user_ids(stop - start)
+        return [(int(requested[i]), int(requesters[i]), "pending", created[i]) for i in range(stop - start)]
+
+    _insert_batched(
+        cursor,
+        "INSERT INTO adoption_requests (cat_id, user_id, status, created_at) VALUES (?, ?, ?, ?)",
+        counts["adoption_requests"],
+        adoption_requests,
+    )
+
+    def reset_tokens(start, stop):
+        created = _timestamps(rng, stop - start)
+        owners = user_ids(stop - start)
+        return [
+            (int(owners[i]), f"reset-{index}", f"{index % 1000000:06d}", created[i], created[i])
+            for i, index in enumerate(range(start, stop))
+        ]
+
+    _insert_batched(
+        cursor,
+        "INSERT INTO password_reset_tokens (user_id, token, code, expires_at, created_at) VALUES (?, ?, ?, ?, ?)",
+        counts["password_reset_tokens"],
+        reset_tokens,
+    )
+
+    def admin_tokens(start, stop):
+        created = _timestamps(rng, stop - start)
+        return [(f"admin-{index}", 1, created[i], created[i]) for i, index in enumerate(range(start, stop))]
+
+    _insert_batched(
+        cursor,
+        "INSERT INTO admin_login_tokens (token, created_by, expires_at, created_at) VALUES (?, ?, ?, ?)",
+        counts["admin_login_tokens"],
+        admin_tokens,
+    )
+
+    cursor.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def drop_secondary_indexes(cursor) -> None:
+    """Leave only the primary keys and UNIQUE constraints; ``schema_version`` stays current."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+    for (name,) in cursor.fetchall():
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def lookup_cases(database, path: str, seed: int) -> Dict[str, Callable[[], object]]:
+    """The hot ``DatabaseManager`` reads, each called with randomly drawn keys."""
+    from backend.geo import BoundingBox
+
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM users")
+    min_user, max_user = cursor.fetchone()
+    cursor.execute("SELECT MAX(id) FROM cats")
+    max_cat = cursor.fetchone()[0]
+    cursor.execute("SELECT verification_token FROM users WHERE verification_token IS NOT NULL LIMIT 1000")
+    tokens = [row[0] for row in cursor.fetchall()] or ["missing"]
+    conn.close()
+    rng = random.Random(seed)
+
+    return {
+        "get_cat_reference_images": lambda: database.get_cat_reference_images(rng.randint(1, max_cat)),
+        "count_reference_images": lambda: database.count_reference_images(rng.randint(1, max_cat)),
+        "get_user_messages": lambda: database.get_user_messages(rng.randint(min_user, max_user)),
+        "get_user_sent_messages": lambda: database.get_user_sent_messages(rng.randint(min_user, max_user)),
+        "get_all_cats": database.get_all_cats,
+        "list_recognition_events": lambda: database.list_recognition_events(limit=50),
+        "get_location_history": lambda: database.get_location_history(cat_id=rng.randint(1, max_cat)),
+        "get_location_history_month": lambda: database.get_location_history(
+            start_time=f"2025-{rng.randint(1, 12):02d}-01 00:00:00", limit=500
+        ),
+        "get_location_history_viewport": lambda: database.get_location_history(
+            start_year=2025, end_year=2025, bbox=BoundingBox(31.25, 121.45, 31.27, 121.47), limit=500
+        ),
+        "get_user_password_reset_tokens": lambda: database.get_user_password_reset_tokens(
+            rng.randint(min_user, max_user)
+        ),
+        "get_admin_login_tokens": lambda: database.get_admin_login_tokens(limit=50),
+        "get_user_by_verification_token": lambda: database.get_user_by_verification_token(rng.choice(tokens)),
+    }
+
+
+def summarise(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "min_ms": round(float(values.min()), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def measure(server, path: str, repeat: int, seed: int) -> Dict[str, Dict]:
+    """Time every lookup and capture the query plans of the statements it runs."""
+    timed = server.DatabaseManager(path)
+    # A zero threshold puts every statement in the profiler's slow log together
+    # with its EXPLAIN QUERY PLAN; the untimed call below only collects plans.
+    profiler = server.QueryProfiler(slow_threshold_ms=0.0)
+    planned = server.DatabaseManager(path, profiler=profiler)
+
+    results = {}
+    timed_cases = lookup_cases(timed, path, seed)
+    planned_cases = lookup_cases(planned, path, seed)
+    for name, call in timed_cases.items():
+        profiler.reset()
+        with contextlib.redirect_stdout(io.StringIO()):
+            planned_cases[name]()
+        plans = [{"sql": entry["sql"], "plan": entry["plan"]} for entry in profiler.snapshot()["slow_queries"]]
+
+        call()  # warm the page cache
+        samples = []
+        rows = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = call()
+            samples.append(time.perf_counter() - started)
+            rows = len(result) if isinstance(result, list) else int(result is not None)
+        results[name] = dict(summarise(samples), rows=rows, plans=plans)
+        print(f"  {name:32s} p50 {results[name]['p50_ms']:9.3f} ms")
+    return results
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict:
+    cache_dir = os.path.abspath(args.cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    # server.py opens data/cats.db relative to the working directory on import.
+    os.chdir(cache_dir)
+    import server
+
+    path = os.path.join(cache_dir, f"indexes-{args.rows}-s{args.seed}.db")
+    if args.rebuild or not os.path.exists(path):
+        print(f"Generating {args.rows} rows in {path}")
+        started = time.perf_counter()
+        # Build under a temporary name so an interrupted run is not reused as a cache.
+        build_database(server, path + ".partial", args.rows, args.seed)
+        os.replace(path + ".partial", path)
+        print(f"Generated in {time.perf_counter() - started:.1f}s")
+    else:
+        conn = sqlite3.connect(path)
+        drop_secondary_indexes(conn.cursor())
+        conn.commit()
+        conn.close()
+
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    table_rows = {}
+    for table in TABLE_SHARES:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        table_rows[table] = cursor.fetchone()[0]
+    conn.close()
+
+    print("Without secondary indexes:")
+    before = measure(server, path, args.repeat, args.seed)
+
+    database = server.DatabaseManager(path)
+    conn = sqlite3.connect(path)
+    started = time.perf_counter()
+    database._create_secondary_indexes(conn.cursor())
+    database._create_location_history_indexes(conn.cursor())
+    conn.commit()
+    build_seconds = time.perf_counter() - started
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+    index_count = cursor.fetchone()[0]
+    conn.close()
+
+    print("With SECONDARY_INDEXES applied:")
+    after = measure(server, path, args.repeat, args.seed)
+
+    lookups = {}
+    for name in before:
+        speedup = before[name]["p50_ms"] / after[name]["p50_ms"] if after[name]["p50_ms"] else None
+        lookups[name] = {"before": before[name], "after": after[name], "p50_speedup": round(speedup, 2) if speedup else None}
+
+    return {
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "platform": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "machine": platform.machine()},
+        "rows": table_rows,
+        "indexes": index_count,
+        "index_build_seconds": round(build_seconds, 3),
+        "database_bytes": os.path.getsize(path),
+        "lookups": lookups,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    output = args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"indexes-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output = os.path.abspath(output)
+    report = run_benchmark(args)
+
+    print(f"\nIndexes built in {report['index_build_seconds']:.2f}s")
+    print(f"{'lookup':32s} {'before p50':>12s} {'after p50':>12s} {'speedup':>9s}")
+    for name, entry in report["lookups"].items():
+        speedup = f"{entry['p50_speedup']:.1f}x" if entry["p50_speedup"] else "-"
+        print(f"{name:32s} {entry['before']['p50_ms']:10.3f}ms {entry['after']['p50_ms']:10.3f}ms {speedup:>9s}")
+
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
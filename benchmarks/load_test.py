@@ -0,0 +1,393 @@
+"""
+HTTP load generator for a running ``server.py`` instance.
+
+Virtual users loop over a weighted mix of realistic requests (static pages,
+``/api/cats``, ``/api/current_user``, multipart ``/api/cats/recognize``
+uploads, message polling and admin listings) with a randomised think time
+between requests. At the end it reports throughput, latency percentiles,
+status codes and error rates per route, plus a coarse timeline, and appends a
+one-line summary to a JSONL history file so runs can be compared over time
+when sizing hardware for adoption events.
+
+Only the standard library (plus Pillow for synthetic images) is used, so it
+can run from any machine that can reach the server.
+
+Example:
+    python benchmarks/load_test.py --base-url http://127.0.0.1:40277 \
+        --users 20 --duration 120 \
+        --user-email volunteer@example.com --user-password secret \
+        --admin-cookie "user_email=admin@example.com; user_token=..."
+
+Custom mix (weights are relative):
+    python benchmarks/load_test.py --mix static=50 cats=30 recognize=20
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import glob
+import http.client
+import io
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATIC_PATHS = ("/", "/index.html", "/about.html", "/css/style.css", "/js/main.js", "/js/auth.js")
+
+# route name -> (relative weight, auth level: None / "user" / "admin")
+DEFAULT_MIX: Dict[str, Tuple[float, Optional[str]]] = {
+    "static": (30, None),
+    "cats": (20, None),
+    "current_user": (15, None),
+    "messages": (15, "user"),
+    "recognize": (8, "user"),
+    "admin_cats": (4, "admin"),
+    "admin_references": (4, "admin"),
+    "admin_recognition_events": (4, "admin"),
+}
+
+
+class Request:
+    __slots__ = ("method", "path", "body", "headers")
+
+    def __init__(self, method: str, path: str, body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.headers = headers or {}
+
+
+def multipart_body(fields: Dict[str, str], file_field: str, filename: str, content: bytes) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode()
+        )
+    parts.append(
+        (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{file_field}\"; filename=\"{filename}\"\r\n"
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode()
+        + content
+        + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def load_sample_images(image_dir: Optional[str], count: int = 8) -> List[bytes]:
+    """Sample photos from ``image_dir`` (default: stored reference images), or synthetic JPEGs."""
+    directory = image_dir or os.path.join(REPO_ROOT, "uploads", "cat_references")
+    paths = []
+    for pattern in ("*.jpg", "*.jpeg", "*.png"):
+        paths.extend(glob.glob(os.path.join(directory, "**", pattern), recursive=True))
+    if paths:
+        random.shuffle(paths)
+        images = []
+        for path in paths[:count]:
+            with open(path, "rb") as handle:
+                images.append(handle.read())
+        return images
+
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        low_res = rng.integers(0, 256, size=(12, 16, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(low_res).resize((800, 600), Image.BICUBIC).save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def build_request(route: str, images: List[bytes], rng: random.Random) -> Request:
+    if route == "static":
+        return Request("GET", rng.choice(STATIC_PATHS))
+    if route == "cats":
+        return Request("GET", "/api/cats")
+    if route == "current_user":
+        return Request("GET", "/api/current_user")
+    if route == "messages":
+        return Request("GET", "/api/messages")
+    if route == "recognize":
+        body, content_type = multipart_body({"save_query": "false"}, "image", "query.jpg", rng.choice(images))
+        return Request("POST", "/api/cats/recognize", body, {"Content-Type": content_type})
+    if route == "admin_cats":
+        return Request("GET", "/api/admin/cats")
+    if route == "admin_references":
+        return Request("GET", "/api/admin/cat-references?limit=50")
+    if route == "admin_recognition_events":
+        return Request("GET", "/api/admin/cat-recognition/events")
+    raise ValueError(f"Unknown route: {route}")
+
+
+def login(base_url: str, email: str, password: str) -> str:
+    """Log in through ``/api/login`` and return the cookie header to reuse."""
+    parsed = urllib.parse.urlparse(base_url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    payload = json.dumps({"email": email, "password": password}).encode()
+    connection.request("POST", "/api/login", payload, {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f"Login for {email} failed with HTTP {response.status}")
+    cookies = [header.split(";", 1)[0] for header in response.headers.get_all("Set-Cookie") or []]
+    connection.close()
+    return "; ".join(cookies)
+
+
+class VirtualUser(threading.Thread):
+    def __init__(
+        self,
+        base_url: str,
+        routes: List[str],
+        weights: List[float],
+        cookies: Dict[str, Optional[str]],
+        auth_levels: Dict[str, Optional[str]],
+        images: List[bytes],
+        stop_at: float,
+        think_time: float,
+        timeout: float,
+        seed: int,
+    ):
+        super().__init__(daemon=True)
+        parsed = urllib.parse.urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.routes = routes
+        self.weights = weights
+        self.cookies = cookies
+        self.auth_levels = auth_levels
+        self.images = images
+        self.stop_at = stop_at
+        self.think_time = think_time
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        # (route, started_at, latency_seconds, status, bytes_received); status 0 = connection error
+        self.samples: List[Tuple[str, float, float, int, int]] = []
+
+    def run(self) -> None:
+        while time.time() < self.stop_at:
+            route = self.random.choices(self.routes, weights=self.weights)[0]
+            request = build_request(route, self.images, self.random)
+            headers = dict(request.headers)
+            cookie = self.cookies.get(self.auth_levels[route] or "")
+            if cookie:
+                headers["Cookie"] = cookie
+
+            started = time.time()
+            status = 0
+            received = 0
+            try:
+                # server.py speaks HTTP/1.0 and closes each connection, so no keep-alive.
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                connection.request(request.method, request.path, request.body, headers)
+                response = connection.getresponse()
+                received = len(response.read())
+                status = response.status
+                connection.close()
+            except (OSError, http.client.HTTPException):
+                status = 0
+            self.samples.append((route, started, time.time() - started, status, received))
+
+            if self.think_time > 0:
+                time.sleep(self.random.expovariate(1.0 / self.think_time))
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    values = np.asarray(latencies, dtype=np.float64) * 1000.0
+    return {
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p90_ms": round(float(np.percentile(values, 90)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def summarise(samples: List[Tuple[str, float, float, int, int]], elapsed: float, window: float) -> Dict:
+    by_route: Dict[str, List[Tuple[str, float, float, int, int]]] = {}
+    for sample in samples:
+        by_route.setdefault(sample[0], []).append(sample)
+
+    def describe(rows) -> Dict:
+        statuses: Dict[str, int] = {}
+        for row in rows:
+            key = str(row[3]) if row[3] else "error"
+            statuses[key] = statuses.get(key, 0) + 1
+        errors = sum(1 for row in rows if row[3] == 0 or row[3] >= 500)
+        client_errors = sum(1 for row in rows if 400 <= row[3] < 500)
+        return {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "client_error_rate": round(client_errors / len(rows), 4) if rows else 0.0,
+            "status_codes": statuses,
+            "bytes_received": int(sum(row[4] for row in rows)),
+            "latency": latency_summary([row[2] for row in rows]),
+        }
+
+    timeline = []
+    if samples:
+        origin = min(sample[1] for sample in samples)
+        buckets: Dict[int, List[Tuple[str, float, float, int, int]]] = {}
+        for sample in samples:
+            buckets.setdefault(int((sample[1] - origin) // window), []).append(sample)
+        for index in sorted(buckets):
+            rows = buckets[index]
+            timeline.append({
+                "offset_seconds": round(index * window, 1),
+                "throughput_rps": round(len(rows) / window, 2),
+                "error_rate": round(sum(1 for row in rows if row[3] == 0 or row[3] >= 500) / len(rows), 4),
+                "p95_ms": latency_summary([row[2] for row in rows])["p95_ms"],
+            })
+
+    return {
+        "overall": describe(samples),
+        "routes": {route: describe(rows) for route, rows in sorted(by_route.items())},
+        "timeline": timeline,
+    }
+
+
+def parse_mix(overrides: Optional[List[str]]) -> Dict[str, Tuple[float, Optional[str]]]:
+    mix = dict(DEFAULT_MIX)
+    if not overrides:
+        return mix
+    selected = {}
+    for item in overrides:
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown route '{name}'. Choose from: {', '.join(DEFAULT_MIX)}")
+        try:
+            selected[name] = (float(weight), DEFAULT_MIX[name][1])
+        except ValueError:
+            raise SystemExit(f"Invalid weight in '{item}'")
+    return selected
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay a realistic request mix against a running server.py.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:40277")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users.")
+    parser.add_argument("--duration", type=float, default=60.0, help="Test length in seconds.")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Seconds over which users are started.")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean pause between a user's requests (s).")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout (s).")
+    parser.add_argument("--mix", nargs="+", default=None, metavar="ROUTE=WEIGHT", help="Override the request mix.")
+    parser.add_argument("--user-email", default=None, help="Regular account for authenticated routes.")
+    parser.add_argument("--user-password", default=None)
+    parser.add_argument("--admin-email", default=None, help="Admin account (not the super admin) for admin routes.")
+    parser.add_argument("--admin-password", default=None)
+    parser.add_argument("--admin-cookie", default=None, help="Raw Cookie header for an admin session instead of a login.")
+    parser.add_argument("--images", default=None, help="Directory of sample photos for recognition uploads.")
+    parser.add_argument("--window", type=float, default=5.0, help="Timeline bucket size (s).")
+    parser.add_argument("--label", default="", help="Free-form label stored with the results (e.g. hardware).")
+    parser.add_argument("--output", default=None, help="JSON report path (default: benchmarks/results/load-<timestamp>.json).")
+    parser.add_argument(
+        "--history",
+        default=os.path.join(REPO_ROOT, "benchmarks", "results", "load_history.jsonl"),
+        help="JSONL file that accumulates one summary line per run.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    mix = parse_mix(args.mix)
+
+    cookies: Dict[str, Optional[str]] = {"": None, "user": None, "admin": None}
+    if args.user_email and args.user_password:
+        cookies["user"] = login(args.base_url, args.user_email, args.user_password)
+    if args.admin_cookie:
+        cookies["admin"] = args.admin_cookie
+    elif args.admin_email and args.admin_password:
+        cookies["admin"] = login(args.base_url, args.admin_email, args.admin_password)
+    # Admin sessions can also do everything a regular user can.
+    cookies["user"] = cookies["user"] or cookies["admin"]
+
+    routes, weights, auth_levels = [], [], {}
+    for route, (weight, auth) in mix.items():
+        if auth and not cookies[auth]:
+            print(f"Skipping '{route}': no {auth} credentials given")
+            continue
+        if weight > 0:
+            routes.append(route)
+            weights.append(weight)
+            auth_levels[route] = auth
+    if not routes:
+        raise SystemExit("No routes left to exercise")
+
+    images = load_sample_images(args.images) if "recognize" in routes else []
+    print(f"Running {args.users} virtual users for {args.duration:.0f}s against {args.base_url}")
+    print("Mix: " + ", ".join(f"{route}={weight:g}" for route, weight in zip(routes, weights)))
+
+    started = time.time()
+    stop_at = started + args.duration
+    users = []
+    for index in range(args.users):
+        user = VirtualUser(
+            args.base_url, routes, weights, cookies, auth_levels, images,
+            stop_at, args.think_time, args.timeout, args.seed + index,
+        )
+        users.append(user)
+        user.start()
+        if args.ramp_up > 0 and args.users > 1:
+            time.sleep(args.ramp_up / args.users)
+    for user in users:
+        user.join()
+    elapsed = time.time() - started
+
+    samples = [sample for user in users for sample in user.samples]
+    summary = summarise(samples, elapsed, args.window)
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "label": args.label,
+        "base_url": args.base_url,
+        "users": args.users,
+        "duration_seconds": round(elapsed, 2),
+        "think_time": args.think_time,
+        "mix": dict(zip(routes, weights)),
+        **summary,
+    }
+
+    print(f"\n{'route':<28}{'req':>7}{'rps':>8}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for route, stats in list(report["routes"].items()) + [("TOTAL", report["overall"])]:
+        latency = stats["latency"] or {}
+        print(
+            f"{route:<28}{stats['requests']:>7}{stats['throughput_rps']:>8.1f}"
+            f"{stats['error_rate'] * 100:>7.1f}{latency.get('p50_ms', 0):>9.1f}"
+            f"{latency.get('p95_ms', 0):>9.1f}{latency.get('p99_ms', 0):>9.1f}"
+        )
+
+    output = args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"load-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    for path in (output, args.history):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    history_entry = {key: value for key, value in report.items() if key != "timeline"}
+    with open(args.history, "a", encoding="utf-8") as handle:
+        handle.write(json.dumps(history_entry) + "\n")
+    print(f"\nReport written to {output}; history appended to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
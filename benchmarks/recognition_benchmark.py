@@ -0,0 +1,438 @@
+"""
+Latency benchmark for the cat recognition pipeline behind ``/api/cats/recognize``.
+
+Builds synthetic ``cats.db`` catalogues (1k / 10k / 100k reference images by
+default) and replays synthetic query photos through the same code the request
+handler uses, timing every stage separately:
+
+  decode          PIL decode of the uploaded bytes
+  transform       resize / normalise into a tensor
+  forward         backbone forward pass and L2 normalisation
+  hash            reference hash of the embedding
+  reference_load  candidate selection and reference rows from SQLite
+  match           ``CatFaceRecognizer.match_against``
+  event_write     ``record_recognition_event``
+
+Each model x device x catalogue size x search mode combination produces one
+run in the JSON report. Catalogues are cached between invocations because the
+100k one takes a while to generate. Reference embeddings are random clusters,
+so the candidate counts of the approximate search modes are only indicative.
+
+Example:
+    python benchmarks/recognition_benchmark.py \
+        --sizes 1000 10000 --models imagenet models/cat_face/cat_somehappy.pth \
+        --devices cpu --output benchmarks/results/latest.json
+
+Regression check against a stored baseline (exit code 1 on slowdowns):
+    python benchmarks/recognition_benchmark.py --baseline benchmarks/baseline.json --tolerance 0.2
+
+Refresh the baseline:
+    python benchmarks/recognition_benchmark.py --save-baseline benchmarks/baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+STAGES = ("decode", "transform", "forward", "hash", "reference_load", "match", "event_write")
+DEFAULT_SIZES = (1000, 10000, 100000)
+IMAGENET_MODEL = "imagenet"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark cat recognition latency on synthetic catalogues.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Reference image counts.")
+    parser.add_argument("--refs-per-cat", type=int, default=10, help="Reference images per synthetic cat.")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=None,
+        help=f"Weight files, or '{IMAGENET_MODEL}' for the stock backbone (default: {IMAGENET_MODEL} + models/cat_face/*.pth).",
+    )
+    parser.add_argument("--devices", nargs="+", default=None, help="torch devices (default: every available one).")
+    parser.add_argument(
+        "--search-modes",
+        nargs="+",
+        default=["exhaustive"],
+        help="Values for cat_recognition.search_mode to benchmark.",
+    )
+    parser.add_argument("--queries", type=int, default=30, help="Timed queries per run.")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed queries per run.")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[800, 600], metavar=("W", "H"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--cache-dir",
+        default=os.path.join(tempfile.gettempdir(), "catalist-benchmark"),
+        help="Where synthetic catalogues are generated and reused.",
+    )
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate cached catalogues.")
+    parser.add_argument("--output", default=None, help="JSON report path (default: benchmarks/results/<timestamp>.json).")
+    parser.add_argument("--baseline", default=None, help="Compare against this report and fail on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p50 slowdown per stage.")
+    parser.add_argument(
+        "--min-delta-ms",
+        type=float,
+        default=0.5,
+        help="Ignore slowdowns smaller than this many milliseconds (noise floor for tiny stages).",
+    )
+    parser.add_argument("--save-baseline", default=None, help="Also write the report to this baseline path.")
+    return parser.parse_args()
+
+
+def available_devices() -> List[str]:
+    import torch
+
+    devices = ["cpu"]
+    if torch.cuda.is_available():
+        devices.append("cuda")
+    if torch.backends.mps.is_available():  # type: ignore[attr-defined]
+        devices.append("mps")
+    return devices
+
+
+def default_models() -> List[str]:
+    return [IMAGENET_MODEL] + sorted(glob.glob(os.path.join(REPO_ROOT, "models", "cat_face", "*.pth")))
+
+
+def synthetic_query_images(count: int, size: Tuple[int, int], seed: int) -> List[bytes]:
+    """Smooth random JPEGs, so decode cost resembles a camera photo rather than pure noise."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        low_res = rng.integers(0, 256, size=(12, 16, 3), dtype=np.uint8)
+        image = Image.fromarray(low_res).resize(size, Image.BICUBIC)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def build_catalogue(server, path: str, num_refs: int, dim: int, refs_per_cat: int, recognizer, seed: int) -> None:
+    """
+    Create a catalogue of ``num_refs`` approved references in clusters of
+    ``refs_per_cat``, with aggregates filled in the same shape the running
+    per-cat aggregates would have.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    database = server.DatabaseManager(path)
+    rng = np.random.default_rng(seed)
+    num_cats = -(-num_refs // refs_per_cat)
+    hash_version = recognizer.hash_version
+
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO cats (name, age, gender, is_approved, hash_version) VALUES (?, ?, ?, 1, ?)",
+        [(f"Bench cat {index}", "1", "unknown", hash_version) for index in range(num_cats)],
+    )
+    cursor.execute("SELECT id FROM cats ORDER BY id")
+    cat_ids = [row[0] for row in cursor.fetchall()]
+
+    centres = rng.standard_normal((num_cats, dim)).astype(np.float32)
+    embedding_sums = np.zeros((num_cats, dim), dtype=np.float64)
+    hash_votes: Optional[np.ndarray] = None
+    counts = np.zeros(num_cats, dtype=np.int64)
+
+    batch_size = 5000
+    for start in range(0, num_refs, batch_size):
+        stop = min(start + batch_size, num_refs)
+        owners = np.arange(start, stop) // refs_per_cat
+        vectors = centres[owners] + 0.35 * rng.standard_normal((stop - start, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        rows = []
+        for owner, vector in zip(owners, vectors):
+            hash_hex, bits = recognizer.hash_signature(vector)
+            if hash_votes is None:
+                hash_votes = np.zeros((num_cats, bits.size), dtype=np.int64)
+            hash_votes[owner] += bits
+            rows.append((
+                cat_ids[owner],
+                f"uploads/cat_references/bench_{owner}.jpg",
+                hash_hex,
+                int(bits.size),
+                sqlite3.Binary(server.embedding_to_blob(vector)),
+            ))
+        np.add.at(embedding_sums, owners, vectors)
+        np.add.at(counts, owners, 1)
+        cursor.executemany(
+            "INSERT INTO cat_reference_images (cat_id, image_path, hash_hex, hash_length, embedding_vector) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    for index, cat_id in enumerate(cat_ids):
+        database._write_cat_aggregate(
+            cursor,
+            cat_id,
+            embedding_sums[index],
+            int(counts[index]),
+            hash_votes[index] if hash_votes is not None else None,
+            int(counts[index]),
+        )
+    conn.commit()
+    conn.close()
+
+
+def catalogue_path(cache_dir: str, num_refs: int, dim: int, refs_per_cat: int, hash_version: str, seed: int) -> str:
+    return os.path.join(cache_dir, f"cats-{num_refs}-d{dim}-r{refs_per_cat}-{hash_version}-s{seed}.db")
+
+
+def time_query(server, recognizer, image_bytes: bytes, settings: Dict) -> Tuple[Dict[str, float], int]:
+    """Run one recognition the way ``handle_recognize_cat`` does and return per-stage seconds."""
+    import torch
+
+    timings: Dict[str, float] = {}
+
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    timings["decode"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    tensor = recognizer.transform(image).unsqueeze(0).to(recognizer.device)
+    timings["transform"] = time.perf_counter() - started
+
+    model = recognizer._load_model()
+    started = time.perf_counter()
+    with torch.no_grad():
+        embedding = model(tensor).cpu().numpy().flatten()
+    norm = np.linalg.norm(embedding)
+    if norm:
+        embedding = embedding / norm
+    embedding = embedding.astype(np.float32)
+    timings["forward"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    hash_hex, hash_bits = recognizer.hash_signature(embedding)
+    timings["hash"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    reference_records, search_mode = server.select_reference_records(embedding, settings, query_bits=hash_bits)
+    references = []
+    for record in reference_records:
+        if not record.get("is_approved") or record.get("is_rejected"):
+            continue
+        if not record.get("hash_hex") or not record.get("hash_length"):
+            continue
+        ref_bits = server.hex_to_bits(record["hash_hex"], record["hash_length"])
+        blob = record.get("embedding_vector")
+        ref_embedding = server.blob_to_embedding(blob) if blob else np.array([], dtype=np.float32)
+        references.append((record["cat_id"], record["reference_id"], ref_bits, ref_embedding))
+    timings["reference_load"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matches = recognizer.match_against(
+        query_hash=hash_bits,
+        query_embedding=embedding,
+        references=references,
+        max_results=settings["max_results"],
+        similarity_threshold=settings["threshold"],
+        max_hamming=settings["max_hamming"],
+    ) if references else []
+    timings["match"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    top_match = next((match for match in matches if match.matched), None)
+    server.db.record_recognition_event(
+        cat_id=top_match.cat_id if top_match else None,
+        matched=bool(top_match),
+        match_score=float(top_match.similarity) if top_match else 0.0,
+        hash_distance=int(top_match.hamming_distance) if top_match else None,
+        metadata={
+            "threshold": settings["threshold"],
+            "max_results": settings["max_results"],
+            "references_considered": len(references),
+            "matches_returned": len(matches),
+            "search_mode": search_mode,
+            "benchmark": True,
+        },
+        image_path=None,
+    )
+    timings["event_write"] = time.perf_counter() - started
+    return timings, len(references)
+
+
+def summarise(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "min_ms": round(float(values.min()), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def run_key(model: str, device: str, references: int, search_mode: str) -> str:
+    return f"model={model}|device={device}|references={references}|mode={search_mode}"
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict:
+    import torch
+
+    models = args.models or default_models()
+    models = [model if model == IMAGENET_MODEL else os.path.abspath(model) for model in models]
+    devices = args.devices or available_devices()
+    cache_dir = os.path.abspath(args.cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # server.py opens data/cats.db relative to the working directory on import;
+    # keep that scratch database (and the PQ index path) inside the cache dir.
+    os.chdir(cache_dir)
+    import server
+
+    images = synthetic_query_images(args.queries + args.warmup, tuple(args.image_size), args.seed)
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "torch": torch.__version__,
+            "numpy": np.__version__,
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "config": {
+            "sizes": args.sizes,
+            "refs_per_cat": args.refs_per_cat,
+            "queries": args.queries,
+            "warmup": args.warmup,
+            "image_size": args.image_size,
+            "search_modes": args.search_modes,
+            "seed": args.seed,
+        },
+        "runs": [],
+    }
+
+    for model in models:
+        model_name = model if model == IMAGENET_MODEL else os.path.splitext(os.path.basename(model))[0]
+        for device in devices:
+            recognizer = server.CatFaceRecognizer(device=device)
+            if model != IMAGENET_MODEL:
+                recognizer.set_model_weights(model)
+            dim = recognizer.embedding_dim()
+
+            for num_refs in args.sizes:
+                path = catalogue_path(cache_dir, num_refs, dim, args.refs_per_cat, recognizer.hash_version, args.seed)
+                if args.rebuild or not os.path.exists(path):
+                    print(f"Building catalogue with {num_refs} references (dim {dim}) at {path}")
+                    build_catalogue(server, path, num_refs, dim, args.refs_per_cat, recognizer, args.seed)
+                server.db = server.DatabaseManager(path)
+                server.rebuild_hamming_index()
+
+                for search_mode in args.search_modes:
+                    settings = server.get_recognition_settings()
+                    settings["search_mode"] = search_mode
+                    server.pq_index = None
+                    if search_mode == "pq":
+                        server.rebuild_pq_index()
+
+                    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+                    totals: List[float] = []
+                    considered: List[int] = []
+                    for index, image_bytes in enumerate(images):
+                        timings, reference_count = time_query(server, recognizer, image_bytes, settings)
+                        if index < args.warmup:
+                            continue
+                        for stage in STAGES:
+                            samples[stage].append(timings[stage])
+                        totals.append(sum(timings.values()))
+                        considered.append(reference_count)
+
+                    run = {
+                        "key": run_key(model_name, device, num_refs, search_mode),
+                        "model": model_name,
+                        "device": device,
+                        "references": num_refs,
+                        "search_mode": search_mode,
+                        "queries": len(totals),
+                        "references_considered_mean": round(float(np.mean(considered)), 1) if considered else 0.0,
+                        "stages": {stage: summarise(samples[stage]) for stage in STAGES},
+                        "total": summarise(totals),
+                    }
+                    report["runs"].append(run)
+                    print(
+                        f"{run['key']}: total p50 {run['total']['p50_ms']} ms, "
+                        + ", ".join(f"{stage} {run['stages'][stage]['p50_ms']}" for stage in STAGES)
+                    )
+    return report
+
+
+def compare_to_baseline(report: Dict, baseline: Dict, tolerance: float, min_delta_ms: float) -> List[str]:
+    """Return one message per stage whose p50 regressed beyond the tolerance."""
+    baseline_runs = {run["key"]: run for run in baseline.get("runs", [])}
+    regressions = []
+    for run in report["runs"]:
+        previous = baseline_runs.get(run["key"])
+        if previous is None:
+            print(f"No baseline for {run['key']}; skipping comparison")
+            continue
+        stages = dict(run["stages"], total=run["total"])
+        previous_stages = dict(previous["stages"], total=previous["total"])
+        for stage, stats in stages.items():
+            if stage not in previous_stages:
+                continue
+            current_ms = stats["p50_ms"]
+            baseline_ms = previous_stages[stage]["p50_ms"]
+            if current_ms > baseline_ms * (1 + tolerance) and current_ms - baseline_ms > min_delta_ms:
+                regressions.append(
+                    f"{run['key']} {stage}: p50 {baseline_ms:.3f} ms -> {current_ms:.3f} ms "
+                    f"(+{(current_ms / baseline_ms - 1) * 100 if baseline_ms else float('inf'):.1f}%)"
+                )
+    return regressions
+
+
+def write_report(report: Dict, path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Report written to {path}")
+
+
+def main() -> None:
+    args = parse_args()
+    output = args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"recognition-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output = os.path.abspath(output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    save_baseline = os.path.abspath(args.save_baseline) if args.save_baseline else None
+
+    report = run_benchmark(args)
+    write_report(report, output)
+    if save_baseline:
+        write_report(report, save_baseline)
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = compare_to_baseline(report, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("Performance regressions detected:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -308,6 +308,7 @@ if (uploadBtn) {
             window.location.href = '/messages';
         });
         uploadBtn.parentNode.insertBefore(messagesBtn, uploadBtn.nextSibling);
+        this.startUnreadPolling();
         
         // If admin, show admin button
         if (user.is_admin) {
@@ -337,6 +338,48 @@ if (uploadBtn) {
     }
 
     // 用户退出
+    // Unread badge on the messages button; updated by 'inbox' push events,
+    // or one cheap counter read per minute where EventSource is unavailable
+    startUnreadPolling() {
+        this.refreshUnreadBadge();
+        if (this.unreadTimer || this.unreadListener) return;
+        if (typeof CatEvents !== 'undefined' && CatEvents.supported()) {
+            this.unreadListener = state => {
+                if (typeof state.unread_count === 'number') {
+                    this.showUnreadCount(state.unread_count);
+                } else {
+                    this.refreshUnreadBadge();
+                }
+            };
+            CatEvents.on('inbox', this.unreadListener);
+            CatEvents.on('resync', () => this.refreshUnreadBadge());
+        } else {
+            this.unreadTimer = setInterval(() => this.refreshUnreadBadge(), 60000);
+        }
+    }
+
+    refreshUnreadBadge() {
+        const messagesBtn = document.getElementById('messagesBtn');
+        if (!messagesBtn) {
+            clearInterval(this.unreadTimer);
+            this.unreadTimer = null;
+            return;
+        }
+        fetch('/api/messages/unread-count')
+            .then(response => response.ok ? response.json() : null)
+            .then(state => {
+                if (state) this.showUnreadCount(state.unread_count);
+            })
+            .catch(error => console.error('Error loading unread count:', error));
+    }
+
+    showUnreadCount(count) {
+        const messagesBtn = document.getElementById('messagesBtn');
+        if (messagesBtn) {
+            messagesBtn.textContent = count > 0 ? `消息中心 (${count})` : '消息中心';
+        }
+    }
+
     logout() {
         fetch('/api/logout', {
             method: 'POST'
@@ -356,6 +399,8 @@ if (uploadBtn) {
             if (uploadBtn) uploadBtn.style.display = 'none';
             if (adminBtn) adminBtn.style.display = 'none';
             if (messagesBtn) messagesBtn.remove();
+            if (typeof CatEvents !== 'undefined') CatEvents.close();
+            this.unreadListener = null;
             
             // Remove user info
             const userInfo = document.querySelector('.user-info');
@@ -0,0 +1,56 @@
+// Server push channel (server-sent events from /api/events).
+// One EventSource per page, opened on first use. The browser reconnects on its
+// own and sends Last-Event-ID, so missed events are replayed; a 'resync' event
+// means they were not kept and listeners should reload their data.
+const CatEvents = {
+    source: null,
+    handlers: {},
+
+    supported() {
+        return typeof EventSource !== 'undefined';
+    },
+
+    on(type, handler) {
+        if (!this.supported()) return false;
+        if (!this.handlers[type]) {
+            this.handlers[type] = [];
+            if (this.source) {
+                this.listen(type);
+            }
+        }
+        this.handlers[type].push(handler);
+        this.connect();
+        return true;
+    },
+
+    off(type, handler) {
+        this.handlers[type] = (this.handlers[type] || []).filter(item => item !== handler);
+    },
+
+    // Drop the stream and all listeners (on logout the channels change)
+    close() {
+        if (this.source) {
+            this.source.close();
+            this.source = null;
+        }
+        this.handlers = {};
+    },
+
+    connect() {
+        if (this.source) return;
+        this.source = new EventSource('/api/events');
+        Object.keys(this.handlers).forEach(type => this.listen(type));
+    },
+
+    listen(type) {
+        this.source.addEventListener(type, event => {
+            let data = {};
+            try {
+                data = event.data ? JSON.parse(event.data) : {};
+            } catch (error) {
+                console.error('Invalid event data:', error);
+            }
+            (this.handlers[type] || []).forEach(handler => handler(data));
+        });
+    }
+};
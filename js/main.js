@@ -41,6 +41,9 @@ const DESKTOP_MODE_CLASS = 'desktop-ui-forced';
 let mobilePanelGestureCleanup = null;
 let allCats = [];
 let filteredCats = [];
+const CATS_PAGE_SIZE = 24;
+let catsNextCursor = null;
+let catsLoading = false;
 let currentUser = null;
 let pendingAdoptionCat = null;
 
@@ -306,15 +309,11 @@ const catData = [
     }
 ];
 
-// 加载猫咪信息
+// 加载猫咪信息（按页加载，第一页）
 function loadCatData() {
-    fetch('/api/cats')
-        .then(response => response.json())
-        .then(cats => {
-            allCats = Array.isArray(cats) ? cats : [];
-            filteredCats = [...allCats];
-            renderCatCards(filteredCats);
-        })
+    allCats = [];
+    catsNextCursor = null;
+    fetchCatPage()
         .catch(error => {
             console.error('Error loading cats:', error);
             // Fallback to hardcoded data if API fails
@@ -322,6 +321,41 @@ function loadCatData() {
         });
 }
 
+// 获取下一页猫咪（基于游标的分页），追加到已加载列表
+function fetchCatPage() {
+    const params = new URLSearchParams({ page_size: CATS_PAGE_SIZE });
+    if (catsNextCursor) {
+        params.set('cursor', catsNextCursor);
+    }
+    catsLoading = true;
+    updateLoadMoreButton();
+    return fetch(`/api/cats?${params.toString()}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(page => {
+            const items = Array.isArray(page.items) ? page.items : [];
+            allCats = allCats.concat(items);
+            catsNextCursor = page.next_cursor || null;
+            applyCatSearch();
+        })
+        .finally(() => {
+            catsLoading = false;
+            updateLoadMoreButton();
+        });
+}
+
+function updateLoadMoreButton() {
+    const button = document.getElementById('loadMoreCatsBtn');
+    if (!button) return;
+    button.style.display = catsNextCursor ? '' : 'none';
+    button.disabled = catsLoading;
+    button.textContent = catsLoading ? '加载中...' : '加载更多';
+}
+
 // Fallback to hardcoded data if API fails
 function fallbackToHardcodedData() {
     const catList = document.querySelector('.cat-list');
@@ -381,6 +415,8 @@ function fallbackToHardcodedData() {
     ];
     
     allCats = hardcodedCats;
+    catsNextCursor = null;
+    updateLoadMoreButton();
     filteredCats = [...allCats];
     renderCatCards(filteredCats);
 }
@@ -469,16 +505,25 @@ function handleAdoptClick(catId) {
 
 function setupCatSearch() {
     const searchInput = document.getElementById('catSearchInput');
-    if (!searchInput) return;
-    searchInput.addEventListener('input', (event) => {
-        const query = event.target.value.trim();
-        if (!query) {
-            filteredCats = [...allCats];
-        } else {
-            filteredCats = allCats.filter(cat => matchesQuery(cat, query));
-        }
-        renderCatCards(filteredCats);
-    });
+    if (searchInput) {
+        searchInput.addEventListener('input', applyCatSearch);
+    }
+    const loadMoreButton = document.getElementById('loadMoreCatsBtn');
+    if (loadMoreButton) {
+        loadMoreButton.addEventListener('click', loadMoreCats);
+    }
+}
+
+// 在已加载的猫咪中按搜索框内容过滤并重新渲染
+function applyCatSearch() {
+    const searchInput = document.getElementById('catSearchInput');
+    const query = searchInput ? searchInput.value.trim() : '';
+    if (!query) {
+        filteredCats = [...allCats];
+    } else {
+        filteredCats = allCats.filter(cat => matchesQuery(cat, query));
+    }
+    renderCatCards(filteredCats);
 }
 
 function normalizeSearchText(text) {
@@ -605,10 +650,12 @@ function submitAdoptionForm(event) {
     });
 }
 
-// 模拟加载更多功能
+// 加载更多：按游标请求下一页
 function loadMoreCats() {
-    console.log('加载更多猫咪信息...');
-    // 在实际应用中，这里会从服务器获取更多数据
+    if (!catsNextCursor || catsLoading) return;
+    fetchCatPage().catch(error => {
+        console.error('Error loading more cats:', error);
+    });
 }
 
 // ---------------- 移动指挥面板（移动端专属） ----------------
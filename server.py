@@ -7,15 +7,14 @@ import json
 import sqlite3
 import hashlib
 import time
+import datetime
 import urllib.parse
 from urllib.parse import unquote
 from http.cookies import SimpleCookie
 import cgi
 import secrets
-import urllib.request
-import urllib.error
 import uuid
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 import numpy as np
 
@@ -23,26 +22,176 @@ from backend.cat_recognition import (
     CatFaceRecognizer,
     aggregate_hashes,
     blob_to_embedding,
+    centroid_from_sum,
+    consensus_from_votes,
     embedding_to_blob,
     hex_to_bits,
+    rank_by_centroid,
     summarize_embeddings,
+    update_embedding_sum,
+    update_hash_votes,
 )
+from backend.lsh import (
+    HASH_METHODS,
+    LEGACY_HASH_VERSION,
+    ProjectionHasher,
+    hamming_candidate_recall,
+    legacy_hash,
+    random_hyperplane_hasher,
+    train_itq_hasher,
+)
+from backend.metrics import RequestMetrics
+from backend.compression import ResponseCompressor
+from backend.geo import (
+    MAX_CLUSTER_PRECISION,
+    POINTS_MIN_ZOOM,
+    BoundingBox,
+    cluster_precision,
+    covering_geohashes,
+    encode_geohash,
+    geohash_center,
+    parse_bbox,
+    prefix_range,
+)
+from backend.jobs import JobTracker
+from backend.migrations import Backfill, BackfillRunner, Migration, apply_migrations, current_schema_version
+from backend.mih import MultiIndexHash
+from backend.movement import TRAJECTORY_WINDOW, extend_hull, hull_area_m2, recent_trajectory, summarize_movement
+from backend.outbox import OutboxWorker, ResendTransport, StubTransport
+from backend.pagination import parse_page
+from backend.pq_index import PQIndex
+from backend.pubsub import EventBroker, SSEHub
+from backend.query_profiler import QueryProfiler
+from backend.retention import (
+    DEFAULT_POLICY,
+    ArchiveWriter,
+    EventArchiver,
+    QueryImageCollector,
+    QuietHoursScheduler,
+    RetentionPolicy,
+    in_quiet_hours,
+)
+from backend.rollups import REGION_PRECISION, bucket_keys, bucket_range
+from backend.static_assets import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    StaticFileIndex,
+    not_modified,
+    precompressed_variant,
+    split_fingerprint,
+    variant_etag,
+)
+from backend.tracing import current_trace, finish_trace, should_sample, span, start_trace
 
 PORT = 40277
 HOST = "0.0.0.0"
 DB_PATH = "data/cats.db"
+PQ_INDEX_PATH = "data/cat_pq_index.npz"
+# The PQ index also holds references of pending and rejected cats; the
+# shortlist is fetched this many times larger before they are dropped.
+PQ_SHORTLIST_OVERFETCH = 2
+HASHER_PATH = "data/cat_hasher.npz"
+ARCHIVE_DIR = "data/archive"
+# Most changed messages returned by one /api/messages/changes call
+MESSAGE_CHANGES_LIMIT = 200
+QUERY_IMAGE_DIR = "uploads/cat_queries"
+RECOGNITION_SEARCH_MODES = ('exhaustive', 'pq', 'hierarchical')
+LOCATION_MAP_MAX_POINTS = 2000
+
+# Each index leads with the equality column of a hot query and ends with its
+# sort column, so SQLite can seek and return rows in order without a temp B-tree.
+# Created by schema migration 3; later indexes go in a new migration step.
+SECONDARY_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_cat_reference_images_cat_order '
+    'ON cat_reference_images(cat_id, order_index, created_at DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_messages_receiver_created ON messages(receiver_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_messages_sender_created ON messages(sender_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_cats_approved_created ON cats(is_approved, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_cats_created ON cats(created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_cat_recognition_events_created ON cat_recognition_events(created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_cat_location_history_cat_created ON cat_location_history(cat_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_cat_location_history_created ON cat_location_history(created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_admin_login_tokens_created ON admin_login_tokens(created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_password_reset_tokens_user_created '
+    'ON password_reset_tokens(user_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_adoption_requests_cat_user ON adoption_requests(cat_id, user_id, status)',
+    'CREATE INDEX IF NOT EXISTS idx_users_verification_token ON users(verification_token)',
+]
+
+# Location history is filtered by a created_at range plus an optional map
+# viewport, so the indexes carry the coordinates: the range is a seek and the
+# bounding box is checked from the index entry before the row is read.
+LOCATION_HISTORY_INDEXES = [
+    'DROP INDEX IF EXISTS idx_cat_location_history_created',
+    'DROP INDEX IF EXISTS idx_cat_location_history_cat_created',
+    'CREATE INDEX IF NOT EXISTS idx_cat_location_history_created_position '
+    'ON cat_location_history(created_at, latitude, longitude)',
+    'CREATE INDEX IF NOT EXISTS idx_cat_location_history_cat_created_position '
+    'ON cat_location_history(cat_id, created_at, latitude, longitude)',
+]
+
+# Retention looks up whether an event or a query photo is still referenced;
+# partial indexes skip the many rows with no reference at all.
+RETENTION_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_cat_location_history_recognition_event '
+    'ON cat_location_history(recognition_event_id) WHERE recognition_event_id IS NOT NULL',
+    'CREATE INDEX IF NOT EXISTS idx_cat_location_history_image_path '
+    'ON cat_location_history(image_path) WHERE image_path IS NOT NULL',
+    'CREATE INDEX IF NOT EXISTS idx_cat_recognition_events_image_path '
+    'ON cat_recognition_events(image_path) WHERE image_path IS NOT NULL',
+]
+
+# Advances a user's inbox change sequence and adjusts the unread count by the
+# second parameter; parameters are (user_id, unread_delta).
+INBOX_BUMP_SQL = '''
+    INSERT INTO inbox_state (user_id, unread_count, seq) VALUES (?1, MAX(?2, 0), 1)
+    ON CONFLICT (user_id) DO UPDATE SET
+        unread_count = MAX(unread_count + ?2, 0),
+        seq = seq + 1
+'''
+# Run after INBOX_BUMP_SQL for the receiver; stamps the message with the new sequence.
+INBOX_INSERT_SQL = '''
+    INSERT INTO messages (sender_id, receiver_id, subject, content, inbox_seq)
+    VALUES (?, ?, ?, ?, (SELECT seq FROM inbox_state WHERE user_id = ?))
+'''
 
 class DatabaseManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path, profiler: Optional[QueryProfiler] = None):
         self.db_path = db_path
+        self.profiler = profiler
         self.init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, instrumented by the query profiler when one is attached."""
+        if self.profiler is not None:
+            return self.profiler.connect(self.db_path)
+        return sqlite3.connect(self.db_path)
     
     def init_db(self):
-        """Initialize the database schema and default records."""
+        """Bring the schema up to date; a database that is already current costs one query."""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        conn = self._connect()
+        apply_migrations(conn, self._schema_migrations())
+        conn.close()
+
+    def _schema_migrations(self) -> List[Migration]:
+        # Append new steps with the next version; never edit or renumber a shipped one.
+        # Row-by-row data rewrites belong in a Backfill, not here.
+        return [
+            Migration(1, 'base tables and legacy columns', self._create_base_schema),
+            Migration(2, 'default content, super admin and settings', self._initialize_default_records),
+            Migration(3, 'secondary indexes on hot lookups', self._create_secondary_indexes),
+            Migration(4, 'range indexes on location history', self._create_location_history_indexes),
+            Migration(5, 'geohash cells for the location map', self._create_location_cells),
+            Migration(6, 'per-cat movement summaries', self._create_movement_summaries),
+            Migration(7, 'hourly and daily analytics rollups', self._create_analytics_rollups),
+            Migration(8, 'reference indexes for retention', self._create_retention_indexes),
+            Migration(9, 'email outbox', self._create_email_outbox),
+            Migration(10, 'unread counters and inbox change sequence', self._create_inbox_state),
+        ]
 
+    def _create_base_schema(self, cursor) -> None:
+        """Tables as of the first versioned schema; the column checks upgrade older databases."""
         cursor.execute(
             '''
             CREATE TABLE IF NOT EXISTS cats (
@@ -66,6 +215,10 @@ class DatabaseManager:
                 reference_hash_length INTEGER,
                 embedding_vector BLOB,
                 hash_version TEXT DEFAULT 'v1',
+                embedding_sum BLOB,
+                embedding_count INTEGER,
+                hash_votes BLOB,
+                hash_vote_count INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
@@ -84,6 +237,11 @@ class DatabaseManager:
         self._ensure_column(cursor, 'cats', 'reference_hash_length', 'INTEGER')
         self._ensure_column(cursor, 'cats', 'embedding_vector', 'BLOB')
         self._ensure_column(cursor, 'cats', 'hash_version', "TEXT DEFAULT 'v1'")
+        # Running per-cat aggregates; NULL counts mean "not computed yet" and trigger a rebuild
+        self._ensure_column(cursor, 'cats', 'embedding_sum', 'BLOB')
+        self._ensure_column(cursor, 'cats', 'embedding_count', 'INTEGER')
+        self._ensure_column(cursor, 'cats', 'hash_votes', 'BLOB')
+        self._ensure_column(cursor, 'cats', 'hash_vote_count', 'INTEGER')
         self._ensure_column(cursor, 'cats', 'updated_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
 
         cursor.execute(
@@ -250,12 +408,204 @@ class DatabaseManager:
 
         self._ensure_column(cursor, 'users', 'updated_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
 
+    def _initialize_default_records(self, cursor) -> None:
         self._initialize_content_defaults(cursor)
         self._initialize_admin_user(cursor)
         self._initialize_default_settings(cursor)
 
-        conn.commit()
+    def _create_secondary_indexes(self, cursor) -> None:
+        for statement in SECONDARY_INDEXES:
+            cursor.execute(statement)
+        # Refresh planner statistics so the new indexes are actually chosen.
+        cursor.execute('ANALYZE')
+
+    def _create_location_history_indexes(self, cursor) -> None:
+        for statement in LOCATION_HISTORY_INDEXES:
+            cursor.execute(statement)
+        cursor.execute('ANALYZE cat_location_history')
+
+    def _create_location_cells(self, cursor) -> None:
+        # Existing rows get their geohash from the 'location_geohashes' backfill.
+        self._ensure_column(cursor, 'cat_location_history', 'geohash', 'TEXT')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_cat_location_history_geohash ON cat_location_history(geohash)'
+        )
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS location_cells (
+                precision INTEGER NOT NULL,
+                geohash TEXT NOT NULL,
+                point_count INTEGER NOT NULL DEFAULT 0,
+                latitude_sum REAL NOT NULL DEFAULT 0,
+                longitude_sum REAL NOT NULL DEFAULT 0,
+                last_seen_at TIMESTAMP,
+                PRIMARY KEY (precision, geohash)
+            )
+        '''
+        )
+
+    def _create_movement_summaries(self, cursor) -> None:
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS cat_movement_summaries (
+                cat_id INTEGER PRIMARY KEY,
+                sighting_count INTEGER NOT NULL DEFAULT 0,
+                first_seen_at TIMESTAMP,
+                last_seen_at TIMESTAMP,
+                last_latitude REAL,
+                last_longitude REAL,
+                centroid_latitude REAL,
+                centroid_longitude REAL,
+                home_range TEXT,
+                home_range_area_m2 REAL,
+                trajectory TEXT,
+                needs_refresh INTEGER NOT NULL DEFAULT 1,
+                revision INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (cat_id) REFERENCES cats(id) ON DELETE CASCADE
+            )
+        '''
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_cat_movement_summaries_refresh '
+            'ON cat_movement_summaries(needs_refresh)'
+        )
+        # Placeholder rows for cats that already have sightings; the
+        # 'movement_summaries' backfill fills them in.
+        cursor.execute(
+            '''
+            INSERT OR IGNORE INTO cat_movement_summaries (cat_id)
+            SELECT DISTINCT cat_id FROM cat_location_history
+        '''
+        )
+
+    def _create_analytics_rollups(self, cursor) -> None:
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS recognition_rollups (
+                granularity TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                recognitions INTEGER NOT NULL DEFAULT 0,
+                matched INTEGER NOT NULL DEFAULT 0,
+                score_sum REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularity, bucket)
+            )
+        '''
+        )
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS sighting_rollups (
+                granularity TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                cat_id INTEGER NOT NULL,
+                region TEXT NOT NULL,
+                sightings INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularity, bucket, cat_id, region)
+            )
+        '''
+        )
+        # Rows up to backfill_until existed before the rollups and are counted
+        # by the 'analytics_rollups' backfill; newer rows are counted on write.
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS rollup_progress (
+                source TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                backfill_until INTEGER NOT NULL DEFAULT 0
+            )
+        '''
+        )
+        for source in ('cat_recognition_events', 'cat_location_history'):
+            cursor.execute(
+                f'''
+                INSERT OR IGNORE INTO rollup_progress (source, backfill_until)
+                SELECT ?, COALESCE(MAX(id), 0) FROM {source}
+            ''',
+                (source,),
+            )
+
+    def _create_retention_indexes(self, cursor) -> None:
+        for statement in RETENTION_INDEXES:
+            cursor.execute(statement)
+
+    def _create_email_outbox(self, cursor) -> None:
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP
+            )
+        '''
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_email_outbox_status_next '
+            'ON email_outbox(status, next_attempt_at)'
+        )
+
+    def _create_inbox_state(self, cursor) -> None:
+        # seq increases whenever a message in the user's inbox is added or
+        # changed; the message carries the value as inbox_seq, so "what changed
+        # since N" is a range seek. A cursor below resync_seq must reload the
+        # inbox because messages were deleted.
+        cursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS inbox_state (
+                user_id INTEGER PRIMARY KEY,
+                unread_count INTEGER NOT NULL DEFAULT 0,
+                seq INTEGER NOT NULL DEFAULT 0,
+                resync_seq INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        '''
+        )
+        self._ensure_column(cursor, 'messages', 'inbox_seq', 'INTEGER NOT NULL DEFAULT 0')
+        # Existing messages are numbered by id, which is increasing per receiver too.
+        cursor.execute('UPDATE messages SET inbox_seq = id')
+        cursor.execute(
+            '''
+            INSERT OR REPLACE INTO inbox_state (user_id, unread_count, seq)
+            SELECT receiver_id, SUM(CASE WHEN is_read THEN 0 ELSE 1 END), MAX(id)
+            FROM messages
+            WHERE receiver_id IS NOT NULL
+            GROUP BY receiver_id
+        '''
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_messages_receiver_inbox_seq ON messages(receiver_id, inbox_seq)'
+        )
+
+    def get_schema_status(self) -> Dict:
+        """Applied schema migrations and the secondary indexes present on each table."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        version = current_schema_version(conn)
+        cursor.execute('SELECT version, description, applied_at FROM schema_version ORDER BY version')
+        migrations = [
+            {"version": row[0], "description": row[1], "applied_at": row[2]} for row in cursor.fetchall()
+        ]
+        cursor.execute(
+            '''
+            SELECT name, tbl_name, sql
+            FROM sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL
+            ORDER BY tbl_name, name
+        '''
+        )
+        indexes = [{"name": name, "table": table, "sql": sql} for name, table, sql in cursor.fetchall()]
         conn.close()
+        return {
+            "version": version,
+            "latest_version": max(migration.version for migration in self._schema_migrations()),
+            "migrations": migrations,
+            "indexes": indexes,
+        }
 
     def _ensure_column(self, cursor, table: str, column: str, definition: str) -> None:
         try:
@@ -336,6 +686,15 @@ class DatabaseManager:
             'cat_recognition.max_hamming': '120',
             'cat_recognition.model_path': '',
             'cat_recognition.hash_length_override': '',
+            'cat_recognition.search_mode': 'exhaustive',
+            'cat_recognition.pq_candidates': '200',
+            'cat_recognition.pq_rerank': 'true',
+            'cat_recognition.hierarchical_top_cats': '10',
+            'cat_recognition.hash_method': 'legacy',
+            'cat_recognition.hash_bits': '128',
+            'tracing.sample_rate': '1.0',
+            'tracing.response_header': 'false',
+            'db.slow_query_ms': '100',
         }
         for key, value in defaults.items():
             cursor.execute('SELECT 1 FROM settings WHERE key = ?', (key,))
@@ -348,19 +707,28 @@ class DatabaseManager:
                     (key, value),
                 )
     
-    def get_all_cats(self):
-        """Get all approved cats from database"""
-        conn = sqlite3.connect(self.db_path)
+    def get_all_cats(self, limit: Optional[int] = None, after: Optional[Tuple[str, int]] = None):
+        """Get approved cats, newest first; ``limit``/``after`` select one keyset page"""
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM cats WHERE is_approved = 1 ORDER BY created_at DESC")
+        query = "SELECT * FROM cats WHERE is_approved = 1"
+        params: List = []
+        if after is not None:
+            query += " AND (created_at, id) < (?, ?)"
+            params.extend(after)
+        query += " ORDER BY created_at DESC, id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        cursor.execute(query, params)
         cats = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return cats
     
     def add_cat(self, name, age, gender, description, image_path, owner_id):
         """Add a new cat to database"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO cats (name, age, gender, description, image_path, owner_id)
@@ -371,27 +739,41 @@ class DatabaseManager:
         conn.close()
         return cat_id
     
-    def get_all_cats_admin(self):
-        """Get all cats (including pending) for admin view with owner info"""
-        conn = sqlite3.connect(self.db_path)
+    def get_all_cats_admin(self, limit: Optional[int] = None, after: Optional[Tuple[str, int]] = None):
+        """Get all cats (including pending) for admin view with owner info and reference counts"""
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute('''
+        params: List = []
+        where_sql = ""
+        if after is not None:
+            where_sql = "WHERE (c.created_at, c.id) < (?, ?)"
+            params.extend(after)
+        limit_sql = ""
+        if limit:
+            limit_sql = "LIMIT ?"
+            params.append(limit)
+        # The correlated count is an index seek per returned cat, so a page
+        # does not pay for grouping the whole reference table.
+        cursor.execute(f'''
             SELECT 
                 c.*,
                 u.name AS owner_name,
-                u.email AS owner_email
+                u.email AS owner_email,
+                (SELECT COUNT(*) FROM cat_reference_images cri WHERE cri.cat_id = c.id) AS reference_count
             FROM cats c
             LEFT JOIN users u ON c.owner_id = u.id
-            ORDER BY c.created_at DESC
-        ''')
+            {where_sql}
+            ORDER BY c.created_at DESC, c.id DESC
+            {limit_sql}
+        ''', params)
         cats = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return cats
     
     def update_cat_approval(self, cat_id, is_approved, is_rejected=0):
         """Update cat approval/rejection status"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE cats 
@@ -403,7 +785,7 @@ class DatabaseManager:
     
     def get_user_by_email(self, email):
         """Get user by email"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
@@ -413,7 +795,7 @@ class DatabaseManager:
     
     def get_user_by_id(self, user_id):
         """Get user by ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
@@ -423,7 +805,7 @@ class DatabaseManager:
     
     def get_all_users(self):
         """Get all users (for admin)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute("SELECT id, name, email, is_admin, is_super_admin, is_verified, created_at FROM users ORDER BY created_at DESC")
@@ -433,7 +815,7 @@ class DatabaseManager:
     
     def get_admin_users(self):
         """Return all administrator accounts"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute("""
@@ -448,7 +830,7 @@ class DatabaseManager:
     
     def get_all_adoption_requests(self):
         """Get all adoption requests (for admin)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('''
@@ -473,7 +855,7 @@ class DatabaseManager:
         return requests
     
     def get_adoption_request_by_id(self, request_id: int) -> Optional[Dict]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('''
@@ -493,7 +875,7 @@ class DatabaseManager:
 
     def create_adoption_request(self, cat_id: int, user_id: int, message: Optional[str] = None, contact_info: Optional[str] = None) -> Optional[int]:
         """Create a new adoption request, avoid duplicates while pending."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT id FROM adoption_requests
@@ -515,7 +897,7 @@ class DatabaseManager:
 
     def update_adoption_request_status(self, request_id: int, status: str) -> bool:
         """Update adoption request status."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE adoption_requests
@@ -529,23 +911,80 @@ class DatabaseManager:
     
     def send_message(self, sender_id, receiver_id, subject, content):
         """Send a message from one user to another"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO messages (sender_id, receiver_id, subject, content)
-            VALUES (?, ?, ?, ?)
-        ''', (sender_id, receiver_id, subject, content))
+        cursor.execute(INBOX_BUMP_SQL, (receiver_id, 1))
+        cursor.execute(INBOX_INSERT_SQL, (sender_id, receiver_id, subject, content, receiver_id))
         message_id = cursor.lastrowid
         conn.commit()
         conn.close()
         return message_id
     
-    def get_user_messages(self, user_id):
+    def list_broadcast_recipient_ids(self, sender_id: int, include_admins: bool) -> List[int]:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT id FROM users
+            WHERE id != ? AND (? OR is_admin = 0)
+            ORDER BY id
+        ''',
+            (sender_id, 1 if include_admins else 0),
+        )
+        recipient_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return recipient_ids
+
+    def send_bulk_messages(
+        self,
+        sender_id: int,
+        receiver_ids: List[int],
+        subject: str,
+        content: str,
+        chunk_size: int = 1000,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """
+        Insert one message per receiver in a single transaction, ``chunk_size``
+        rows per ``executemany``; ``progress`` gets the running count per chunk.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        sent = 0
+        try:
+            for start in range(0, len(receiver_ids), chunk_size):
+                chunk = receiver_ids[start:start + chunk_size]
+                cursor.executemany(INBOX_BUMP_SQL, [(receiver_id, 1) for receiver_id in chunk])
+                cursor.executemany(
+                    INBOX_INSERT_SQL,
+                    [(sender_id, receiver_id, subject, content, receiver_id) for receiver_id in chunk],
+                )
+                sent += len(chunk)
+                if progress is not None:
+                    progress(sent)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return sent
+
+    def get_user_messages(self, user_id, limit: Optional[int] = None, after: Optional[Tuple[str, int]] = None):
         """Get all messages for a user (inbox)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute('''
+        params: List = [user_id]
+        keyset_sql = ''
+        if after is not None:
+            keyset_sql = 'AND (m.created_at, m.id) < (?, ?)'
+            params.extend(after)
+        limit_sql = ''
+        if limit:
+            limit_sql = 'LIMIT ?'
+            params.append(limit)
+        cursor.execute(f'''
             SELECT 
                 m.id,
                 m.subject,
@@ -557,19 +996,29 @@ class DatabaseManager:
                 u.email as sender_email
             FROM messages m
             JOIN users u ON m.sender_id = u.id
-            WHERE m.receiver_id = ?
-            ORDER BY m.created_at DESC
-        ''', (user_id,))
+            WHERE m.receiver_id = ? {keyset_sql}
+            ORDER BY m.created_at DESC, m.id DESC
+            {limit_sql}
+        ''', params)
         messages = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return messages
     
-    def get_user_sent_messages(self, user_id):
+    def get_user_sent_messages(self, user_id, limit: Optional[int] = None, after: Optional[Tuple[str, int]] = None):
         """Get all messages sent by a user (outbox)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute('''
+        params: List = [user_id]
+        keyset_sql = ''
+        if after is not None:
+            keyset_sql = 'AND (m.created_at, m.id) < (?, ?)'
+            params.extend(after)
+        limit_sql = ''
+        if limit:
+            limit_sql = 'LIMIT ?'
+            params.append(limit)
+        cursor.execute(f'''
             SELECT 
                 m.id,
                 m.subject,
@@ -580,42 +1029,89 @@ class DatabaseManager:
                 u.email as receiver_email
             FROM messages m
             JOIN users u ON m.receiver_id = u.id
-            WHERE m.sender_id = ?
-            ORDER BY m.created_at DESC
-        ''', (user_id,))
+            WHERE m.sender_id = ? {keyset_sql}
+            ORDER BY m.created_at DESC, m.id DESC
+            {limit_sql}
+        ''', params)
         messages = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return messages
     
     def mark_message_as_read(self, message_id):
         """Mark a message as read"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE messages 
-            SET is_read = 1
-            WHERE id = ?
-        ''', (message_id,))
+        cursor.execute('SELECT receiver_id FROM messages WHERE id = ? AND is_read = 0', (message_id,))
+        row = cursor.fetchone()
+        if row:
+            self._mark_read(cursor, message_id, row[0])
         conn.commit()
         conn.close()
     
     def mark_message_as_read_for_user(self, message_id, user_id) -> bool:
         """Mark a message as read only if it belongs to the user"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE messages
-            SET is_read = 1
-            WHERE id = ? AND receiver_id = ?
-        ''', (message_id, user_id))
-        updated = cursor.rowcount > 0
+        cursor.execute('SELECT is_read FROM messages WHERE id = ? AND receiver_id = ?', (message_id, user_id))
+        row = cursor.fetchone()
+        if row and not row[0]:
+            self._mark_read(cursor, message_id, user_id)
         conn.commit()
         conn.close()
-        return updated
+        return row is not None
+
+    def _mark_read(self, cursor, message_id: int, receiver_id: int) -> None:
+        cursor.execute(INBOX_BUMP_SQL, (receiver_id, -1))
+        cursor.execute(
+            '''
+            UPDATE messages
+            SET is_read = 1, inbox_seq = (SELECT seq FROM inbox_state WHERE user_id = ?)
+            WHERE id = ?
+        ''',
+            (receiver_id, message_id),
+        )
+
+    def get_inbox_state(self, user_id: int) -> Dict:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT unread_count, seq, resync_seq FROM inbox_state WHERE user_id = ?', (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+        unread_count, seq, resync_seq = row if row else (0, 0, 0)
+        return {"unread_count": unread_count, "seq": seq, "resync_seq": resync_seq}
+
+    def get_inbox_changes(self, user_id: int, since: int, limit: int) -> List[Dict]:
+        """Inbox messages added or changed after sequence ``since``, in sequence order."""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT
+                m.id,
+                m.subject,
+                m.content,
+                m.is_read,
+                m.created_at,
+                m.sender_id,
+                m.inbox_seq,
+                u.name as sender_name,
+                u.email as sender_email
+            FROM messages m
+            JOIN users u ON m.sender_id = u.id
+            WHERE m.receiver_id = ? AND m.inbox_seq > ?
+            ORDER BY m.inbox_seq
+            LIMIT ?
+        ''',
+            (user_id, since, limit),
+        )
+        messages = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return messages
     
     def get_content(self, content_id):
         """Get content by ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM content WHERE id = ?', (content_id,))
@@ -625,7 +1121,7 @@ class DatabaseManager:
     
     def get_all_content(self):
         """Get all content"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM content ORDER BY id')
@@ -635,7 +1131,7 @@ class DatabaseManager:
     
     def update_content(self, content_id, title, content_text):
         """Update content by ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT OR REPLACE INTO content (id, title, content, updated_at)
@@ -646,7 +1142,7 @@ class DatabaseManager:
     
     def get_setting(self, key):
         """Get a setting value by key"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
         result = cursor.fetchone()
@@ -655,7 +1151,7 @@ class DatabaseManager:
     
     def set_setting(self, key, value):
         """Set a setting value"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT OR REPLACE INTO settings (key, value, updated_at)
@@ -679,11 +1175,144 @@ class DatabaseManager:
     def get_notification_from_email(self) -> str:
         return self.get_setting('notification.from_email') or "alerts@resend.dev"
     
+    def enqueue_emails(self, kind: str, messages: List[Dict]) -> List[int]:
+        """Queue messages for the outbox worker; returns their ids."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        ids = []
+        for message in messages:
+            cursor.execute(
+                'INSERT INTO email_outbox (kind, message) VALUES (?, ?)',
+                (kind, json.dumps(message, ensure_ascii=False)),
+            )
+            ids.append(cursor.lastrowid)
+        conn.commit()
+        conn.close()
+        return ids
+
+    def claim_outbox_emails(self, limit: int) -> List[Dict]:
+        """Mark up to ``limit`` due messages as sending and return them, oldest first."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(
+            '''
+            SELECT id, message, attempts
+            FROM email_outbox
+            WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        ''',
+            (limit,),
+        )
+        rows = [
+            {"id": row[0], "message": json.loads(row[1]), "attempts": row[2]} for row in cursor.fetchall()
+        ]
+        cursor.executemany(
+            "UPDATE email_outbox SET status = 'sending' WHERE id = ?", [(row["id"],) for row in rows]
+        )
+        conn.commit()
+        conn.close()
+        return rows
+
+    def mark_outbox_sent(self, email_ids: List[int]) -> None:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.executemany(
+            '''
+            UPDATE email_outbox
+            SET status = 'sent', attempts = attempts + 1, sent_at = CURRENT_TIMESTAMP, last_error = NULL
+            WHERE id = ?
+        ''',
+            [(email_id,) for email_id in email_ids],
+        )
+        conn.commit()
+        conn.close()
+
+    def mark_outbox_failed(self, email_id: int, error: str, retry_in_seconds: Optional[float]) -> None:
+        """Reschedule a failed message ``retry_in_seconds`` from now, or give up on it when None."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        if retry_in_seconds is None:
+            cursor.execute(
+                '''
+                UPDATE email_outbox
+                SET status = 'failed', attempts = attempts + 1, last_error = ?
+                WHERE id = ?
+            ''',
+                (error, email_id),
+            )
+        else:
+            cursor.execute(
+                '''
+                UPDATE email_outbox
+                SET status = 'pending',
+                    attempts = attempts + 1,
+                    last_error = ?,
+                    next_attempt_at = datetime('now', ?)
+                WHERE id = ?
+            ''',
+                (error, f'+{int(retry_in_seconds)} seconds', email_id),
+            )
+        conn.commit()
+        conn.close()
+
+    def release_outbox_claims(self) -> int:
+        """Return messages left 'sending' by an interrupted worker to the queue."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE email_outbox SET status = 'pending' WHERE status = 'sending'")
+        released = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return released
+
+    def retry_failed_emails(self) -> int:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            UPDATE email_outbox
+            SET status = 'pending', attempts = 0, next_attempt_at = CURRENT_TIMESTAMP
+            WHERE status = 'failed'
+        '''
+        )
+        retried = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return retried
+
+    def get_outbox_status(self, failure_limit: int = 20) -> Dict:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT status, COUNT(*) FROM email_outbox GROUP BY status')
+        counts = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.execute(
+            '''
+            SELECT MIN(next_attempt_at) FROM email_outbox WHERE status = 'pending'
+        '''
+        )
+        next_attempt_at = cursor.fetchone()[0]
+        cursor.execute(
+            '''
+            SELECT id, kind, status, attempts, last_error, next_attempt_at, created_at
+            FROM email_outbox
+            WHERE last_error IS NOT NULL AND status IN ('pending', 'failed')
+            ORDER BY id DESC
+            LIMIT ?
+        ''',
+            (failure_limit,),
+        )
+        failures = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return {"counts": counts, "next_attempt_at": next_attempt_at, "failures": failures}
+
     def create_user(self, name, email, password):
         """Create a new user with verification token"""
         password_hash = hashlib.sha256(password.encode()).hexdigest()
         verification_token = secrets.token_urlsafe(32)
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         try:
             cursor.execute('''
@@ -700,7 +1329,7 @@ class DatabaseManager:
     
     def verify_user_email(self, token):
         """Verify user email by token"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE users 
@@ -714,7 +1343,7 @@ class DatabaseManager:
     
     def update_user_verification_status(self, user_id, is_verified):
         """Manually update user verification status (admin only)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE users 
@@ -728,7 +1357,7 @@ class DatabaseManager:
     
     def update_user_admin_status(self, user_id, is_admin):
         """Manually update user admin status (admin only)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE users 
@@ -743,7 +1372,7 @@ class DatabaseManager:
     def update_user_super_admin_status(self, user_id, is_super_admin):
         """Update user super admin status. Only used internally for preset super admin account.
         External calls to set super admin status are not allowed."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # If setting to super admin, first clear all existing super admins
@@ -773,7 +1402,7 @@ class DatabaseManager:
             user_id: ID of user to delete
             allow_delete_admin: If True, allows deleting admin users (but not super admins)
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         try:
             # Check if user is super admin - never allow deleting super admins
@@ -784,7 +1413,26 @@ class DatabaseManager:
                 return False
             
             # Delete messages where user is sender or receiver
+            cursor.execute(
+                'SELECT DISTINCT receiver_id FROM messages WHERE sender_id = ? AND receiver_id != ?',
+                (user_id, user_id),
+            )
+            affected_inboxes = [(row[0],) for row in cursor.fetchall()]
             cursor.execute('DELETE FROM messages WHERE sender_id = ? OR receiver_id = ?', (user_id, user_id))
+            cursor.execute('DELETE FROM inbox_state WHERE user_id = ?', (user_id,))
+            # Recount the receivers' unread messages and make their sync cursors reload
+            cursor.executemany(
+                '''
+                UPDATE inbox_state
+                SET unread_count = (
+                        SELECT COUNT(*) FROM messages WHERE receiver_id = inbox_state.user_id AND is_read = 0
+                    ),
+                    seq = seq + 1,
+                    resync_seq = seq + 1
+                WHERE user_id = ?
+            ''',
+                affected_inboxes,
+            )
             # Delete adoption requests by user
             cursor.execute('DELETE FROM adoption_requests WHERE user_id = ?', (user_id,))
             # Remove ownership of cats (keep cats but clear owner)
@@ -804,7 +1452,7 @@ class DatabaseManager:
     
     def get_user_by_verification_token(self, token):
         """Get user by verification token"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM users WHERE verification_token = ?", (token,))
@@ -819,7 +1467,7 @@ class DatabaseManager:
         token = secrets.token_urlsafe(32)
         expires_at = time.time() + (expires_in_hours * 3600)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         try:
             cursor.execute('''
@@ -843,7 +1491,7 @@ class DatabaseManager:
     
     def validate_and_use_admin_token(self, token):
         """Validate and mark an admin login token as used. Returns user_id if valid, None otherwise."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -877,7 +1525,7 @@ class DatabaseManager:
     
     def get_admin_login_tokens(self, limit=50):
         """Get recent admin login tokens (admin only)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('''
@@ -903,7 +1551,7 @@ class DatabaseManager:
     
     def update_user_password(self, user_id, new_password_hash):
         """Update user password by hash"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE users 
@@ -933,7 +1581,7 @@ class DatabaseManager:
         updates.append("updated_at = CURRENT_TIMESTAMP")
         values.append(user_id)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         try:
             cursor.execute(f'''
@@ -959,7 +1607,7 @@ class DatabaseManager:
         code = ''.join([str(secrets.randbelow(10)) for _ in range(6)])
         expires_at = time.time() + (expires_in_hours * 3600)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         try:
             cursor.execute('''
@@ -984,7 +1632,7 @@ class DatabaseManager:
     
     def validate_password_reset_code(self, email, code):
         """Validate password reset code. Returns (user_id, token) if valid, (None, None) otherwise."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1015,7 +1663,7 @@ class DatabaseManager:
     
     def use_password_reset_token(self, token):
         """Mark a password reset token as used"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE password_reset_tokens 
@@ -1029,7 +1677,7 @@ class DatabaseManager:
     
     def get_user_password_reset_tokens(self, user_id):
         """Get all password reset tokens for a user (for admin/debugging)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('''
@@ -1046,7 +1694,7 @@ class DatabaseManager:
     # --- Cat recognition helpers -------------------------------------------------
 
     def get_cat_by_id(self, cat_id: int) -> Optional[Dict]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM cats WHERE id = ?", (cat_id,))
@@ -1064,7 +1712,7 @@ class DatabaseManager:
             values.append(value)
         values.append(cat_id)
 
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             f"""
@@ -1087,8 +1735,10 @@ class DatabaseManager:
         hash_length: int,
         embedding_bytes: bytes,
         is_primary: bool = False,
+        hash_version: Optional[str] = None,
+        rehash_reference: Optional[Callable[[int, np.ndarray], Tuple[str, np.ndarray]]] = None,
     ) -> int:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         # Get max order_index for this cat to append at the end
         cursor.execute('SELECT COALESCE(MAX(order_index), -1) FROM cat_reference_images WHERE cat_id = ?', (cat_id,))
@@ -1119,25 +1769,30 @@ class DatabaseManager:
             ),
         )
         reference_id = cursor.lastrowid
+        self._apply_reference_to_aggregate(cursor, cat_id, embedding_bytes, hash_hex, hash_length, 1)
+        if hash_version:
+            self._adopt_hash_version(cursor, cat_id, hash_version, rehash_reference)
         conn.commit()
         conn.close()
         return reference_id
 
+    REFERENCE_IMAGE_COLUMNS = (
+        "id",
+        "cat_id",
+        "image_path",
+        "hash_hex",
+        "hash_length",
+        "is_primary",
+        "order_index",
+        "created_at",
+    )
+
     def get_cat_reference_images(self, cat_id: int, include_embedding: bool = False, reference_ids: Optional[List[int]] = None) -> List[Dict]:
-        columns = [
-            "id",
-            "cat_id",
-            "image_path",
-            "hash_hex",
-            "hash_length",
-            "is_primary",
-            "order_index",
-            "created_at",
-        ]
+        columns = list(self.REFERENCE_IMAGE_COLUMNS)
         if include_embedding:
             columns.append("embedding_vector")
 
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         params = [cat_id]
@@ -1166,10 +1821,17 @@ class DatabaseManager:
         hash_hex: str,
         hash_length: int,
         embedding_bytes: bytes,
+        hash_version: Optional[str] = None,
+        rehash_reference: Optional[Callable[[int, np.ndarray], Tuple[str, np.ndarray]]] = None,
     ) -> bool:
         """Update the embedding and hash for a reference image"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.execute(
+            'SELECT cat_id, embedding_vector, hash_hex, hash_length FROM cat_reference_images WHERE id = ?',
+            (reference_id,),
+        )
+        previous = cursor.fetchone()
         cursor.execute(
             '''
             UPDATE cat_reference_images
@@ -1186,12 +1848,18 @@ class DatabaseManager:
             ),
         )
         updated = cursor.rowcount > 0
+        if updated and previous:
+            cat_id, old_embedding, old_hash_hex, old_hash_length = previous
+            if self._apply_reference_to_aggregate(cursor, cat_id, old_embedding, old_hash_hex, old_hash_length, -1):
+                self._apply_reference_to_aggregate(cursor, cat_id, embedding_bytes, hash_hex, hash_length, 1)
+            if hash_version:
+                self._adopt_hash_version(cursor, cat_id, hash_version, rehash_reference)
         conn.commit()
         conn.close()
         return updated
 
     def refresh_cat_signature(self, cat_id: int, aggregated_hash_hex: Optional[str], hash_length: Optional[int], embedding_bytes: Optional[bytes]) -> None:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             '''
@@ -1212,33 +1880,302 @@ class DatabaseManager:
         conn.commit()
         conn.close()
 
+    def get_reference_images_by_cat(self) -> Dict[int, List[Dict]]:
+        """Reference images of every cat in one ordered index scan, grouped by cat id."""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            f'''
+            SELECT {', '.join(self.REFERENCE_IMAGE_COLUMNS)}
+            FROM cat_reference_images
+            ORDER BY cat_id, order_index ASC, created_at DESC
+        '''
+        )
+        grouped: Dict[int, List[Dict]] = {}
+        for row in cursor.fetchall():
+            grouped.setdefault(row['cat_id'], []).append(dict(row))
+        conn.close()
+        return grouped
+
     def count_reference_images(self, cat_id: int) -> int:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('SELECT COUNT(*) FROM cat_reference_images WHERE cat_id = ?', (cat_id,))
         count = cursor.fetchone()[0]
         conn.close()
         return count
 
-    def delete_reference_image(self, reference_id: int) -> bool:
-        """Delete a reference image by ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        # Get the image path for file deletion
-        cursor.execute('SELECT image_path, cat_id FROM cat_reference_images WHERE id = ?', (reference_id,))
-        result = cursor.fetchone()
-        if not result:
-            conn.close()
-            return False
-        
-        image_path, cat_id = result
-        
-        # Delete from database
-        cursor.execute('DELETE FROM cat_reference_images WHERE id = ?', (reference_id,))
-        deleted = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
-        
+    def _write_cat_aggregate(
+        self,
+        cursor,
+        cat_id: int,
+        embedding_sum: Optional[np.ndarray],
+        embedding_count: int,
+        hash_votes: Optional[np.ndarray],
+        hash_vote_count: int,
+    ) -> None:
+        centroid = centroid_from_sum(embedding_sum, embedding_count)
+        consensus_hex = consensus_from_votes(hash_votes, hash_vote_count)
+        cursor.execute(
+            '''
+            UPDATE cats
+            SET embedding_sum = ?,
+                embedding_count = ?,
+                hash_votes = ?,
+                hash_vote_count = ?,
+                embedding_vector = ?,
+                reference_hash_hex = ?,
+                reference_hash_length = ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''',
+            (
+                sqlite3.Binary(embedding_sum.astype(np.float64).tobytes()) if embedding_sum is not None and embedding_count > 0 else None,
+                embedding_count,
+                sqlite3.Binary(hash_votes.astype(np.int32).tobytes()) if hash_votes is not None and hash_vote_count > 0 else None,
+                hash_vote_count,
+                sqlite3.Binary(embedding_to_blob(centroid)) if centroid is not None else None,
+                consensus_hex,
+                int(hash_votes.size) if consensus_hex else None,
+                cat_id,
+            ),
+        )
+
+    def _rebuild_cat_aggregate(self, cursor, cat_id: int) -> None:
+        """Recompute a cat's running aggregates from all of its reference rows."""
+        cursor.execute(
+            'SELECT embedding_vector, hash_hex, hash_length FROM cat_reference_images WHERE cat_id = ?',
+            (cat_id,),
+        )
+        embedding_sum = None
+        embedding_count = 0
+        hash_votes = None
+        hash_vote_count = 0
+        for embedding_blob, hash_hex, hash_length in cursor.fetchall():
+            embedding = blob_to_embedding(embedding_blob) if embedding_blob else None
+            if embedding is not None and embedding.size and (embedding_sum is None or embedding.size == embedding_sum.size):
+                embedding_sum = update_embedding_sum(embedding_sum, embedding)
+                embedding_count += 1
+            if hash_hex:
+                hash_votes = update_hash_votes(hash_votes, hex_to_bits(hash_hex, hash_length))
+                hash_vote_count += 1
+        self._write_cat_aggregate(cursor, cat_id, embedding_sum, embedding_count, hash_votes, hash_vote_count)
+
+    def _adopt_hash_version(
+        self,
+        cursor,
+        cat_id: int,
+        hash_version: str,
+        rehash_reference: Optional[Callable[[int, np.ndarray], Tuple[str, np.ndarray]]],
+    ) -> None:
+        """
+        Called after one reference of ``cat_id`` was stored with a
+        ``hash_version`` hash. A cat still on another version has all of its
+        references rehashed from their stored embeddings with
+        ``rehash_reference`` and its aggregates rebuilt before it is stamped,
+        as in ``apply_rehashed_references``; without ``rehash_reference`` it is
+        left stale for the ``reference_hashes`` backfill.
+        """
+        cursor.execute("SELECT COALESCE(hash_version, 'v1') FROM cats WHERE id = ?", (cat_id,))
+        row = cursor.fetchone()
+        if row is None or row[0] == hash_version or rehash_reference is None:
+            return
+        cursor.execute(
+            'SELECT id, embedding_vector FROM cat_reference_images WHERE cat_id = ? AND embedding_vector IS NOT NULL',
+            (cat_id,),
+        )
+        rows = []
+        for reference_id, blob in cursor.fetchall():
+            embedding = blob_to_embedding(blob)
+            if not embedding.size:
+                continue
+            hash_hex, bits = rehash_reference(reference_id, embedding)
+            rows.append((hash_hex, int(bits.size), reference_id))
+        cursor.executemany('UPDATE cat_reference_images SET hash_hex = ?, hash_length = ? WHERE id = ?', rows)
+        self._rebuild_cat_aggregate(cursor, cat_id)
+        cursor.execute('UPDATE cats SET hash_version = ? WHERE id = ?', (hash_version, cat_id))
+
+    def _apply_reference_to_aggregate(
+        self,
+        cursor,
+        cat_id: int,
+        embedding_blob: Optional[bytes],
+        hash_hex: Optional[str],
+        hash_length: Optional[int],
+        sign: int,
+    ) -> bool:
+        """
+        Add (``sign=1``) or remove (``sign=-1``) one reference from the cat's running
+        aggregates in O(D). Must run after the reference row itself has been changed
+        in the same transaction: cats without aggregates yet are rebuilt from their
+        current rows instead. Returns False when a rebuild was done.
+        """
+        cursor.execute(
+            'SELECT embedding_sum, embedding_count, hash_votes, hash_vote_count FROM cats WHERE id = ?',
+            (cat_id,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return False
+        sum_blob, embedding_count, votes_blob, hash_vote_count = row
+        if embedding_count is None or hash_vote_count is None:
+            self._rebuild_cat_aggregate(cursor, cat_id)
+            return False
+
+        embedding_sum = np.frombuffer(sum_blob, dtype=np.float64) if sum_blob else None
+        hash_votes = np.frombuffer(votes_blob, dtype=np.int32) if votes_blob else None
+        try:
+            embedding = blob_to_embedding(embedding_blob) if embedding_blob else None
+            if embedding is not None and embedding.size:
+                embedding_sum = update_embedding_sum(embedding_sum, embedding, sign)
+                embedding_count += sign
+            if hash_hex:
+                hash_votes = update_hash_votes(hash_votes, hex_to_bits(hash_hex, hash_length), sign)
+                hash_vote_count += sign
+        except ValueError:
+            # Mixed embedding dimensions (e.g. mid model change): fall back to a rebuild
+            self._rebuild_cat_aggregate(cursor, cat_id)
+            return False
+
+        if embedding_count <= 0:
+            embedding_sum, embedding_count = None, 0
+        if hash_vote_count <= 0:
+            hash_votes, hash_vote_count = None, 0
+        self._write_cat_aggregate(cursor, cat_id, embedding_sum, embedding_count, hash_votes, hash_vote_count)
+        return True
+
+    def rebuild_cat_aggregate(self, cat_id: int) -> None:
+        conn = self._connect()
+        cursor = conn.cursor()
+        self._rebuild_cat_aggregate(cursor, cat_id)
+        conn.commit()
+        conn.close()
+
+    def list_stale_hash_cats(self, hash_version: str, limit: int) -> List[int]:
+        """Ids of up to ``limit`` cats with reference images hashed by another hash version."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT c.id
+            FROM cats c
+            WHERE COALESCE(c.hash_version, 'v1') != ?
+              AND EXISTS (SELECT 1 FROM cat_reference_images cri WHERE cri.cat_id = c.id)
+            ORDER BY c.id
+            LIMIT ?
+        ''',
+            (hash_version, limit),
+        )
+        cat_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return cat_ids
+
+    def list_reference_embeddings_for_cats(self, cat_ids: List[int]) -> List:
+        """``(reference_id, embedding_blob)`` rows of the given cats that have an embedding."""
+        if not cat_ids:
+            return []
+        conn = self._connect()
+        cursor = conn.cursor()
+        placeholders = ','.join('?' for _ in cat_ids)
+        cursor.execute(
+            f'''
+            SELECT id, embedding_vector
+            FROM cat_reference_images
+            WHERE cat_id IN ({placeholders}) AND embedding_vector IS NOT NULL
+        ''',
+            tuple(cat_ids),
+        )
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def apply_rehashed_references(self, rows: List, cat_ids: List[int], hash_version: str) -> None:
+        """
+        Store ``(hash_hex, hash_length, reference_id)`` rows, rebuild the consensus
+        hashes of ``cat_ids`` and stamp them with ``hash_version``, in one transaction.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.executemany(
+            'UPDATE cat_reference_images SET hash_hex = ?, hash_length = ? WHERE id = ?',
+            rows,
+        )
+        for cat_id in cat_ids:
+            self._rebuild_cat_aggregate(cursor, cat_id)
+        placeholders = ','.join('?' for _ in cat_ids)
+        cursor.execute(f'UPDATE cats SET hash_version = ? WHERE id IN ({placeholders})', (hash_version, *cat_ids))
+        conn.commit()
+        conn.close()
+
+    def count_stale_hash_cats(self, hash_version: str) -> int:
+        """Count cats with reference images whose hashes were built by another hash version."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT COUNT(*)
+            FROM cats c
+            WHERE COALESCE(c.hash_version, 'v1') != ?
+              AND EXISTS (SELECT 1 FROM cat_reference_images cri WHERE cri.cat_id = c.id)
+        ''',
+            (hash_version,),
+        )
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+
+    def list_cats_missing_aggregates(self, limit: int) -> List[int]:
+        """Cats with reference images whose running aggregates were never computed."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT c.id
+            FROM cats c
+            WHERE c.embedding_count IS NULL
+              AND EXISTS (SELECT 1 FROM cat_reference_images cri WHERE cri.cat_id = c.id)
+            ORDER BY c.id
+            LIMIT ?
+        ''',
+            (limit,),
+        )
+        cat_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return cat_ids
+
+    def rebuild_cat_aggregates(self, cat_ids: List[int]) -> None:
+        conn = self._connect()
+        cursor = conn.cursor()
+        for cat_id in cat_ids:
+            self._rebuild_cat_aggregate(cursor, cat_id)
+        conn.commit()
+        conn.close()
+
+    def delete_reference_image(self, reference_id: int) -> bool:
+        """Delete a reference image by ID"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        # Get the image path for file deletion
+        cursor.execute(
+            'SELECT image_path, cat_id, embedding_vector, hash_hex, hash_length FROM cat_reference_images WHERE id = ?',
+            (reference_id,),
+        )
+        result = cursor.fetchone()
+        if not result:
+            conn.close()
+            return False
+        
+        image_path, cat_id, embedding_blob, hash_hex, hash_length = result
+        
+        # Delete from database
+        cursor.execute('DELETE FROM cat_reference_images WHERE id = ?', (reference_id,))
+        deleted = cursor.rowcount > 0
+        if deleted:
+            self._apply_reference_to_aggregate(cursor, cat_id, embedding_blob, hash_hex, hash_length, -1)
+        conn.commit()
+        conn.close()
+        
         # Delete file if it exists
         if deleted and image_path:
             try:
@@ -1252,7 +2189,7 @@ class DatabaseManager:
 
     def update_reference_image_order(self, cat_id: int, reference_orders: List[Dict]) -> bool:
         """Update order_index for multiple reference images. reference_orders is a list of {id: order_index}"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         try:
             for ref_order in reference_orders:
@@ -1274,9 +2211,15 @@ class DatabaseManager:
 
     def move_reference_image(self, reference_id: int, new_cat_id: int) -> bool:
         """Move a reference image from one cat to another"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         try:
+            cursor.execute(
+                'SELECT cat_id, embedding_vector, hash_hex, hash_length FROM cat_reference_images WHERE id = ?',
+                (reference_id,),
+            )
+            previous = cursor.fetchone()
+
             # Get max order_index for the new cat
             cursor.execute('SELECT COALESCE(MAX(order_index), -1) FROM cat_reference_images WHERE cat_id = ?', (new_cat_id,))
             max_order = cursor.fetchone()[0] or -1
@@ -1288,6 +2231,10 @@ class DatabaseManager:
                 (new_cat_id, new_order, reference_id)
             )
             moved = cursor.rowcount > 0
+            if moved and previous and previous[0] != new_cat_id:
+                old_cat_id, embedding_blob, hash_hex, hash_length = previous
+                self._apply_reference_to_aggregate(cursor, old_cat_id, embedding_blob, hash_hex, hash_length, -1)
+                self._apply_reference_to_aggregate(cursor, new_cat_id, embedding_blob, hash_hex, hash_length, 1)
             conn.commit()
             return moved
         except Exception as e:
@@ -1299,7 +2246,7 @@ class DatabaseManager:
 
     def set_primary_reference_image(self, cat_id: int, reference_id: int) -> bool:
         """Set a reference image as primary (and unset others for the same cat)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         try:
             # Unset all primary images for this cat
@@ -1320,7 +2267,7 @@ class DatabaseManager:
             conn.close()
 
     def set_cat_adoption_state(self, cat_id: int, is_adopted: bool) -> None:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             '''
@@ -1333,32 +2280,148 @@ class DatabaseManager:
         conn.commit()
         conn.close()
 
-    def list_reference_vectors(self) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
+    def list_reference_vectors(
+        self,
+        reference_ids: Optional[List[int]] = None,
+        include_embedding: bool = True,
+        cat_ids: Optional[List[int]] = None,
+    ) -> List[Dict]:
+        embedding_column = "cri.embedding_vector," if include_embedding else ""
+        params: List = []
+        filters = []
+        for column, values in (("cri.id", reference_ids), ("cri.cat_id", cat_ids)):
+            if values is None:
+                continue
+            if not values:
+                return []
+            placeholders = ','.join('?' for _ in values)
+            filters.append(f"{column} IN ({placeholders})")
+            params.extend(values)
+        filter_sql = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute(
-            '''
+            f'''
             SELECT
                 cri.id AS reference_id,
                 cri.cat_id,
                 cri.hash_hex,
                 cri.hash_length,
-                cri.embedding_vector,
+                {embedding_column}
                 cri.is_primary,
                 c.name AS cat_name,
                 c.is_approved,
                 c.is_rejected
             FROM cat_reference_images cri
             JOIN cats c ON c.id = cri.cat_id
+            {filter_sql}
+        ''',
+            tuple(params),
+        )
+        results = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return results
+
+    def filter_eligible_reference_ids(self, reference_ids: List[int]) -> Set[int]:
+        """The subset of ``reference_ids`` that belong to approved, non-rejected cats."""
+        if not reference_ids:
+            return set()
+        conn = self._connect()
+        cursor = conn.cursor()
+        placeholders = ','.join('?' for _ in reference_ids)
+        cursor.execute(
+            f'''
+            SELECT cri.id
+            FROM cat_reference_images cri
+            JOIN cats c ON c.id = cri.cat_id
+            WHERE cri.id IN ({placeholders})
+              AND c.is_approved = 1
+              AND (c.is_rejected IS NULL OR c.is_rejected = 0)
+        ''',
+            tuple(reference_ids),
+        )
+        ids = {row[0] for row in cursor.fetchall()}
+        conn.close()
+        return ids
+
+    def list_cat_centroids(self) -> List[Dict]:
+        """Return aggregated cat embeddings for approved, non-rejected cats."""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT id AS cat_id, embedding_vector, reference_hash_hex, reference_hash_length
+            FROM cats
+            WHERE is_approved = 1
+              AND (is_rejected IS NULL OR is_rejected = 0)
+              AND embedding_vector IS NOT NULL
         '''
         )
         results = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return results
 
+    def sample_reference_embeddings(self, limit: int) -> List[bytes]:
+        """
+        Return up to ``limit`` randomly chosen reference embedding blobs. Only
+        the ids are shuffled, so the blobs that are not picked are never read.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT embedding_vector
+            FROM cat_reference_images
+            WHERE id IN (
+                SELECT id
+                FROM cat_reference_images
+                WHERE embedding_vector IS NOT NULL
+                ORDER BY RANDOM()
+                LIMIT ?
+            )
+        ''',
+            (limit,),
+        )
+        blobs = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return blobs
+
+    def count_reference_embeddings(self) -> int:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM cat_reference_images WHERE embedding_vector IS NOT NULL')
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+
+    def iter_reference_embeddings(self, batch_size: int = 5000):
+        """Yield ``(reference_ids, embedding_blobs)`` batches ordered by id."""
+        last_id = 0
+        while True:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(
+                '''
+                SELECT id, embedding_vector
+                FROM cat_reference_images
+                WHERE id > ? AND embedding_vector IS NOT NULL
+                ORDER BY id
+                LIMIT ?
+            ''',
+                (last_id, batch_size),
+            )
+            rows = cursor.fetchall()
+            conn.close()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [row[0] for row in rows], [row[1] for row in rows]
+
     def list_reference_images(self, limit: Optional[int] = None) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         query = '''
@@ -1385,11 +2448,30 @@ class DatabaseManager:
         conn.close()
         return results
 
-    def list_recognition_events(self, limit: Optional[int] = None) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
+    def list_recognition_events(
+        self,
+        limit: Optional[int] = None,
+        min_total_ms: Optional[float] = None,
+        trace_id: Optional[str] = None,
+        after: Optional[Tuple[str, int]] = None,
+    ) -> List[Dict]:
+        """List recognition events, optionally only traced ones slower than ``min_total_ms``."""
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        query = '''
+        filters = []
+        params: List = []
+        if min_total_ms is not None:
+            filters.append("json_extract(cre.request_metadata, '$.trace.total_ms') >= ?")
+            params.append(min_total_ms)
+        if trace_id:
+            filters.append("json_extract(cre.request_metadata, '$.trace.trace_id') = ?")
+            params.append(trace_id)
+        if after is not None:
+            filters.append("(cre.created_at, cre.id) < (?, ?)")
+            params.extend(after)
+        where_sql = f"WHERE {' AND '.join(filters)}" if filters else ""
+        query = f'''
             SELECT
                 cre.id,
                 cre.cat_id,
@@ -1402,12 +2484,13 @@ class DatabaseManager:
                 cre.created_at
             FROM cat_recognition_events cre
             LEFT JOIN cats c ON c.id = cre.cat_id
-            ORDER BY cre.created_at DESC
+            {where_sql}
+            ORDER BY cre.created_at DESC, cre.id DESC
         '''
         if limit:
-            cursor.execute(f"{query} LIMIT ?", (limit,))
+            cursor.execute(f"{query} LIMIT ?", (*params, limit))
         else:
-            cursor.execute(query)
+            cursor.execute(query, tuple(params))
         events = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return events
@@ -1422,7 +2505,7 @@ class DatabaseManager:
         metadata: Dict,
         image_path: Optional[str],
     ) -> int:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             '''
@@ -1446,10 +2529,89 @@ class DatabaseManager:
             ),
         )
         event_id = cursor.lastrowid
+        cursor.execute('SELECT created_at FROM cat_recognition_events WHERE id = ?', (event_id,))
+        self._add_to_rollups(cursor, recognitions=[(cursor.fetchone()[0], matched, match_score)])
         conn.commit()
         conn.close()
         return event_id
 
+    def list_expired_recognition_events(
+        self,
+        matched_cutoff: str,
+        unmatched_cutoff: str,
+        keep_every: int,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 500,
+    ) -> List[Dict]:
+        """
+        Events the retention policy no longer keeps, oldest first: anything older
+        than ``matched_cutoff``, and unmatched events older than
+        ``unmatched_cutoff`` except every ``keep_every``-th id. Events a
+        location-history row points at are always kept.
+        """
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        filters = [
+            'cre.created_at < ?',
+            '(cre.created_at < ? OR (cre.matched = 0 AND cre.id % ? != 0))',
+            'NOT EXISTS (SELECT 1 FROM cat_location_history clh WHERE clh.recognition_event_id = cre.id)',
+        ]
+        params: List = [max(matched_cutoff, unmatched_cutoff), matched_cutoff, keep_every]
+        if after is not None:
+            filters.append('(cre.created_at, cre.id) > (?, ?)')
+            params.extend(after)
+        cursor.execute(
+            f'''
+            SELECT
+                cre.id,
+                cre.cat_id,
+                cre.matched,
+                cre.match_score,
+                cre.hash_distance,
+                cre.request_metadata,
+                cre.image_path,
+                cre.created_at
+            FROM cat_recognition_events cre
+            WHERE {' AND '.join(filters)}
+            ORDER BY cre.created_at, cre.id
+            LIMIT ?
+        ''',
+            (*params, limit),
+        )
+        events = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return events
+
+    def delete_recognition_events(self, event_ids: List[int]) -> None:
+        if not event_ids:
+            return
+        conn = self._connect()
+        cursor = conn.cursor()
+        placeholders = ','.join('?' for _ in event_ids)
+        cursor.execute(f'DELETE FROM cat_recognition_events WHERE id IN ({placeholders})', tuple(event_ids))
+        conn.commit()
+        conn.close()
+
+    def referenced_query_images(self, image_paths: List[str]) -> Set[str]:
+        """The subset of ``image_paths`` still stored on a recognition event or location row."""
+        if not image_paths:
+            return set()
+        conn = self._connect()
+        cursor = conn.cursor()
+        placeholders = ','.join('?' for _ in image_paths)
+        cursor.execute(
+            f'''
+            SELECT image_path FROM cat_recognition_events WHERE image_path IN ({placeholders})
+            UNION
+            SELECT image_path FROM cat_location_history WHERE image_path IN ({placeholders})
+        ''',
+            (*image_paths, *image_paths),
+        )
+        referenced = {row[0] for row in cursor.fetchall()}
+        conn.close()
+        return referenced
+
     def add_location_history(
         self,
         cat_id: int,
@@ -1462,7 +2624,8 @@ class DatabaseManager:
         image_path: Optional[str] = None,
     ) -> int:
         """Add a location history record for a cat"""
-        conn = sqlite3.connect(self.db_path)
+        geohash = encode_geohash(latitude, longitude)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             '''
@@ -1474,9 +2637,10 @@ class DatabaseManager:
                 visit_status,
                 visit_notes,
                 recognition_event_id,
-                image_path
+                image_path,
+                geohash
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''',
             (
                 cat_id,
@@ -1487,9 +2651,14 @@ class DatabaseManager:
                 visit_notes,
                 recognition_event_id,
                 image_path,
+                geohash,
             ),
         )
         location_id = cursor.lastrowid
+        self._add_to_location_cells(cursor, [(geohash, latitude, longitude, None)])
+        self._add_to_movement_summary(cursor, cat_id, latitude, longitude)
+        cursor.execute('SELECT created_at FROM cat_location_history WHERE id = ?', (location_id,))
+        self._add_to_rollups(cursor, sightings=[(cursor.fetchone()[0], cat_id, geohash[:REGION_PRECISION])])
         conn.commit()
         conn.close()
         return location_id
@@ -1499,9 +2668,27 @@ class DatabaseManager:
         start_year: Optional[int] = None,
         end_year: Optional[int] = None,
         cat_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[str, int]] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        bbox: Optional[BoundingBox] = None,
     ) -> List[Dict]:
-        """Get location history records (admin only)"""
-        conn = sqlite3.connect(self.db_path)
+        """
+        Get location history records (admin only), newest first.
+
+        ``start_time`` is inclusive and ``end_time`` exclusive, both in the stored
+        ``YYYY-MM-DD HH:MM:SS`` form; whole years are turned into the same range so
+        every filter is a seek on the created_at indexes.
+        """
+        if start_year is not None:
+            year_start = f'{start_year:04d}-01-01 00:00:00'
+            start_time = max(start_time, year_start) if start_time else year_start
+        if end_year is not None:
+            year_end = f'{end_year + 1:04d}-01-01 00:00:00'
+            end_time = min(end_time, year_end) if end_time else year_end
+
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1530,65 +2717,693 @@ class DatabaseManager:
             query += ' AND clh.cat_id = ?'
             params.append(cat_id)
         
-        if start_year is not None:
-            query += ' AND strftime("%Y", clh.created_at) >= ?'
-            params.append(str(start_year))
+        if start_time is not None:
+            query += ' AND clh.created_at >= ?'
+            params.append(start_time)
         
-        if end_year is not None:
-            query += ' AND strftime("%Y", clh.created_at) <= ?'
-            params.append(str(end_year))
+        if end_time is not None:
+            query += ' AND clh.created_at < ?'
+            params.append(end_time)
+        
+        if bbox is not None:
+            clause, bbox_params = bbox.sql_filter('clh.latitude', 'clh.longitude')
+            query += f' AND {clause}'
+            params.extend(bbox_params)
+        
+        if after is not None:
+            query += ' AND (clh.created_at, clh.id) < (?, ?)'
+            params.extend(after)
         
-        query += ' ORDER BY clh.created_at DESC'
+        query += ' ORDER BY clh.created_at DESC, clh.id DESC'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
         
         cursor.execute(query, params)
         results = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return results
 
-    def get_location_by_id(self, location_id: int) -> Optional[Dict]:
-        """Get a single location history record by ID"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute(
+    def _add_to_location_cells(self, cursor, points: List[Tuple[str, float, float, Optional[str]]]) -> None:
+        """Count ``(geohash, latitude, longitude, created_at)`` points into every cluster level."""
+        cursor.executemany(
             '''
-            SELECT
-                clh.id,
-                clh.cat_id,
-                c.name AS cat_name,
-                c.age,
-                c.gender,
-                c.description,
-                c.sterilized,
-                c.microchipped,
-                c.special_notes,
-                c.unique_markings,
-                c.identification_code,
-                c.image_path AS cat_image_path,
-                clh.user_id,
-                u.name AS user_name,
-                u.email AS user_email,
-                clh.latitude,
-                clh.longitude,
-                clh.visit_status,
-                clh.visit_notes,
-                clh.recognition_event_id,
-                clh.image_path,
-                clh.created_at
-            FROM cat_location_history clh
-            JOIN cats c ON c.id = clh.cat_id
-            JOIN users u ON u.id = clh.user_id
-            WHERE clh.id = ?
+            INSERT INTO location_cells (precision, geohash, point_count, latitude_sum, longitude_sum, last_seen_at)
+            VALUES (?, ?, 1, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ON CONFLICT (precision, geohash) DO UPDATE SET
+                point_count = point_count + 1,
+                latitude_sum = latitude_sum + excluded.latitude_sum,
+                longitude_sum = longitude_sum + excluded.longitude_sum,
+                last_seen_at = MAX(COALESCE(last_seen_at, ''), excluded.last_seen_at)
         ''',
-            (location_id,),
+            [
+                (precision, geohash[:precision], latitude, longitude, created_at)
+                for geohash, latitude, longitude, created_at in points
+                for precision in range(1, MAX_CLUSTER_PRECISION + 1)
+            ],
         )
-        row = cursor.fetchone()
-        conn.close()
+
+    def _add_to_movement_summary(self, cursor, cat_id: int, latitude: float, longitude: float) -> None:
+        """
+        Fold one sighting into the cat's summary: count, last-seen, centroid and
+        hull are exact; the trajectory is left to the background refresh.
+        """
+        cursor.execute(
+            'SELECT sighting_count, centroid_latitude, centroid_longitude, home_range '
+            'FROM cat_movement_summaries WHERE cat_id = ?',
+            (cat_id,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(
+                '''
+                INSERT INTO cat_movement_summaries (
+                    cat_id, sighting_count, first_seen_at, last_seen_at, last_latitude, last_longitude,
+                    centroid_latitude, centroid_longitude, home_range, home_range_area_m2, trajectory
+                )
+                VALUES (?, 1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, ?, ?, ?, ?, ?, 0, '[]')
+            ''',
+                (cat_id, latitude, longitude, latitude, longitude, json.dumps([[latitude, longitude]])),
+            )
+            return
+        count, centroid_latitude, centroid_longitude, home_range = row
+        count = count or 0
+        hull = extend_hull([tuple(point) for point in json.loads(home_range or '[]')], (latitude, longitude))
+        cursor.execute(
+            '''
+            UPDATE cat_movement_summaries
+            SET sighting_count = ?,
+                last_seen_at = CURRENT_TIMESTAMP,
+                last_latitude = ?,
+                last_longitude = ?,
+                centroid_latitude = ?,
+                centroid_longitude = ?,
+                home_range = ?,
+                home_range_area_m2 = ?,
+                needs_refresh = 1,
+                revision = revision + 1
+            WHERE cat_id = ?
+        ''',
+            (
+                count + 1,
+                latitude,
+                longitude,
+                ((centroid_latitude or 0.0) * count + latitude) / (count + 1),
+                ((centroid_longitude or 0.0) * count + longitude) / (count + 1),
+                json.dumps([list(point) for point in hull]),
+                round(hull_area_m2(hull), 1),
+                cat_id,
+            ),
+        )
+
+    def _add_to_rollups(
+        self,
+        cursor,
+        recognitions: List[Tuple[str, bool, Optional[float]]] = (),
+        sightings: List[Tuple[str, int, str]] = (),
+    ) -> None:
+        """
+        Count ``(created_at, matched, match_score)`` recognitions and
+        ``(created_at, cat_id, region)`` sightings into their hour and day buckets.
+        """
+        recognition_totals: Dict[Tuple[str, str], List] = {}
+        for created_at, matched, score in recognitions:
+            for key in bucket_keys(created_at):
+                totals = recognition_totals.setdefault(key, [0, 0, 0.0])
+                totals[0] += 1
+                totals[1] += 1 if matched else 0
+                totals[2] += score or 0.0
+        sighting_totals: Dict[Tuple[str, str, int, str], int] = {}
+        for created_at, cat_id, region in sightings:
+            for granularity, bucket in bucket_keys(created_at):
+                key = (granularity, bucket, cat_id, region)
+                sighting_totals[key] = sighting_totals.get(key, 0) + 1
+
+        if recognition_totals:
+            cursor.executemany(
+                '''
+                INSERT INTO recognition_rollups (granularity, bucket, recognitions, matched, score_sum)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (granularity, bucket) DO UPDATE SET
+                    recognitions = recognitions + excluded.recognitions,
+                    matched = matched + excluded.matched,
+                    score_sum = score_sum + excluded.score_sum
+            ''',
+                [(*key, *totals) for key, totals in recognition_totals.items()],
+            )
+        if sighting_totals:
+            cursor.executemany(
+                '''
+                INSERT INTO sighting_rollups (granularity, bucket, cat_id, region, sightings)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (granularity, bucket, cat_id, region) DO UPDATE SET
+                    sightings = sightings + excluded.sightings
+            ''',
+                [(*key, count) for key, count in sighting_totals.items()],
+            )
+
+    def has_pending_rollup_backfill(self) -> bool:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM rollup_progress WHERE last_id < backfill_until LIMIT 1')
+        pending = cursor.fetchone() is not None
+        conn.close()
+        return pending
+
+    def backfill_rollups(self, limit: int) -> int:
+        """One backfill batch: count up to ``limit`` pre-existing rows of each source into the rollups."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT source, last_id, backfill_until FROM rollup_progress WHERE last_id < backfill_until')
+        processed = 0
+        for source, last_id, backfill_until in cursor.fetchall():
+            if source == 'cat_recognition_events':
+                cursor.execute(
+                    '''
+                    SELECT id, created_at, matched, match_score
+                    FROM cat_recognition_events
+                    WHERE id > ? AND id <= ?
+                    ORDER BY id
+                    LIMIT ?
+                ''',
+                    (last_id, backfill_until, limit),
+                )
+                rows = cursor.fetchall()
+                self._add_to_rollups(cursor, recognitions=[row[1:] for row in rows])
+            else:
+                cursor.execute(
+                    '''
+                    SELECT id, created_at, cat_id, latitude, longitude
+                    FROM cat_location_history
+                    WHERE id > ? AND id <= ?
+                    ORDER BY id
+                    LIMIT ?
+                ''',
+                    (last_id, backfill_until, limit),
+                )
+                rows = cursor.fetchall()
+                self._add_to_rollups(
+                    cursor,
+                    sightings=[
+                        (created_at, cat_id, encode_geohash(latitude, longitude, REGION_PRECISION))
+                        for _, created_at, cat_id, latitude, longitude in rows
+                    ],
+                )
+            # A short batch means everything up to the mark has been counted.
+            last_id = rows[-1][0] if len(rows) == limit else backfill_until
+            cursor.execute('UPDATE rollup_progress SET last_id = ? WHERE source = ?', (last_id, source))
+            processed += len(rows)
+        conn.commit()
+        conn.close()
+        return processed
+
+    def get_rollup_stats(self, granularity: str, first_bucket: str, stop_bucket: str, cat_id: Optional[int] = None) -> Dict:
+        """Recognition and sighting series for buckets in ``[first_bucket, stop_bucket)``, plus top cats and regions."""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT bucket, recognitions, matched, score_sum
+            FROM recognition_rollups
+            WHERE granularity = ? AND bucket >= ? AND bucket < ?
+            ORDER BY bucket
+        ''',
+            (granularity, first_bucket, stop_bucket),
+        )
+        recognition_rows = [dict(row) for row in cursor.fetchall()]
+
+        sighting_filter = 'granularity = ? AND bucket >= ? AND bucket < ?'
+        params: List = [granularity, first_bucket, stop_bucket]
+        if cat_id is not None:
+            sighting_filter += ' AND cat_id = ?'
+            params.append(cat_id)
+        cursor.execute(
+            f'''
+            SELECT bucket, SUM(sightings) AS sightings
+            FROM sighting_rollups
+            WHERE {sighting_filter}
+            GROUP BY bucket
+            ORDER BY bucket
+        ''',
+            params,
+        )
+        sighting_series = [dict(row) for row in cursor.fetchall()]
+        cursor.execute(
+            f'''
+            SELECT top.cat_id, COALESCE(c.name, '未知猫咪') AS cat_name, top.sightings
+            FROM (
+                SELECT cat_id, SUM(sightings) AS sightings
+                FROM sighting_rollups
+                WHERE {sighting_filter}
+                GROUP BY cat_id
+                ORDER BY sightings DESC
+                LIMIT 10
+            ) top
+            LEFT JOIN cats c ON c.id = top.cat_id
+            ORDER BY top.sightings DESC
+        ''',
+            params,
+        )
+        top_cats = [dict(row) for row in cursor.fetchall()]
+        cursor.execute(
+            f'''
+            SELECT region, SUM(sightings) AS sightings
+            FROM sighting_rollups
+            WHERE {sighting_filter}
+            GROUP BY region
+            ORDER BY sightings DESC
+            LIMIT 10
+        ''',
+            params,
+        )
+        top_regions = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        def rates(row: Dict) -> Dict:
+            count = row['recognitions']
+            return {
+                "recognitions": count,
+                "matched": row['matched'],
+                "match_rate": row['matched'] / count if count else None,
+                "mean_score": row['score_sum'] / count if count else None,
+            }
+
+        totals = {
+            "recognitions": sum(row['recognitions'] for row in recognition_rows),
+            "matched": sum(row['matched'] for row in recognition_rows),
+            "score_sum": sum(row['score_sum'] for row in recognition_rows),
+        }
+        for region in top_regions:
+            region['latitude'], region['longitude'] = geohash_center(region['region'])
+        return {
+            "recognition": {
+                "series": [dict(rates(row), bucket=row['bucket']) for row in recognition_rows],
+                "totals": rates(totals),
+            },
+            "sightings": {
+                "series": sighting_series,
+                "total": sum(row['sightings'] for row in sighting_series),
+                "top_cats": top_cats,
+                "top_regions": top_regions,
+            },
+        }
+
+    def has_stale_movement_summaries(self) -> bool:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM cat_movement_summaries WHERE needs_refresh = 1 LIMIT 1')
+        stale = cursor.fetchone() is not None
+        conn.close()
+        return stale
+
+    def refresh_movement_summaries(self, limit: int) -> int:
+        """
+        One backfill batch: bring up to ``limit`` stale summaries up to date.
+        Counts, hull and centroid are kept exact as sightings arrive, so only
+        the trajectory is recomputed, from the last ``TRAJECTORY_WINDOW``
+        sightings. Placeholder rows seeded by the migration (no
+        ``first_seen_at`` yet) are rebuilt from the full history. A summary
+        that received a new sighting meanwhile (its revision moved on) stays
+        stale and is picked up again.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT cat_id, revision, first_seen_at FROM cat_movement_summaries WHERE needs_refresh = 1 LIMIT ?',
+            (limit,),
+        )
+        stale = cursor.fetchall()
+        rebuilt = []
+        trajectories = []
+        removed = []
+        for cat_id, revision, first_seen_at in stale:
+            if first_seen_at is not None:
+                cursor.execute(
+                    '''
+                    SELECT latitude, longitude, created_at
+                    FROM cat_location_history
+                    WHERE cat_id = ?
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''',
+                    (cat_id, TRAJECTORY_WINDOW),
+                )
+                recent = cursor.fetchall()[::-1]
+                if not recent:
+                    removed.append((cat_id, revision))
+                    continue
+                trajectories.append((json.dumps(recent_trajectory(recent), ensure_ascii=False), cat_id, revision))
+                continue
+
+            cursor.execute(
+                '''
+                SELECT latitude, longitude, created_at
+                FROM cat_location_history
+                WHERE cat_id = ?
+                ORDER BY created_at, id
+            ''',
+                (cat_id,),
+            )
+            summary = summarize_movement(cursor.fetchall())
+            if summary is None:
+                removed.append((cat_id, revision))
+                continue
+            rebuilt.append((
+                summary['sighting_count'],
+                summary['first_seen_at'],
+                summary['last_seen_at'],
+                summary['last_latitude'],
+                summary['last_longitude'],
+                summary['centroid_latitude'],
+                summary['centroid_longitude'],
+                json.dumps(summary['home_range']),
+                summary['home_range_area_m2'],
+                json.dumps(summary['trajectory'], ensure_ascii=False),
+                cat_id,
+                revision,
+            ))
+        cursor.executemany(
+            '''
+            UPDATE cat_movement_summaries
+            SET sighting_count = ?,
+                first_seen_at = ?,
+                last_seen_at = ?,
+                last_latitude = ?,
+                last_longitude = ?,
+                centroid_latitude = ?,
+                centroid_longitude = ?,
+                home_range = ?,
+                home_range_area_m2 = ?,
+                trajectory = ?,
+                needs_refresh = 0,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE cat_id = ? AND revision = ?
+        ''',
+            rebuilt,
+        )
+        cursor.executemany(
+            '''
+            UPDATE cat_movement_summaries
+            SET trajectory = ?,
+                needs_refresh = 0,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE cat_id = ? AND revision = ?
+        ''',
+            trajectories,
+        )
+        cursor.executemany('DELETE FROM cat_movement_summaries WHERE cat_id = ? AND revision = ?', removed)
+        conn.commit()
+        conn.close()
+        return len(stale)
+
+    def get_cat_movement_summary(self, cat_id: int) -> Optional[Dict]:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT
+                cat_id,
+                sighting_count,
+                first_seen_at,
+                last_seen_at,
+                last_latitude,
+                last_longitude,
+                centroid_latitude,
+                centroid_longitude,
+                home_range,
+                home_range_area_m2,
+                trajectory,
+                needs_refresh,
+                updated_at
+            FROM cat_movement_summaries
+            WHERE cat_id = ?
+        ''',
+            (cat_id,),
+        )
+        row = cursor.fetchone()
+        conn.close()
+        if row is None:
+            return None
+        summary = dict(row)
+        summary['home_range'] = json.loads(summary['home_range'] or '[]')
+        summary['trajectory'] = json.loads(summary['trajectory'] or '[]')
+        summary['stale'] = bool(summary.pop('needs_refresh'))
+        return summary
+
+    def has_locations_missing_geohash(self) -> bool:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM cat_location_history WHERE geohash IS NULL LIMIT 1')
+        missing = cursor.fetchone() is not None
+        conn.close()
+        return missing
+
+    def assign_location_geohashes(self, limit: int) -> int:
+        """One backfill batch: geohash up to ``limit`` rows and count them into ``location_cells``."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT id, latitude, longitude, created_at FROM cat_location_history WHERE geohash IS NULL LIMIT ?',
+            (limit,),
+        )
+        points = [
+            (row_id, encode_geohash(latitude, longitude), latitude, longitude, created_at)
+            for row_id, latitude, longitude, created_at in cursor.fetchall()
+        ]
+        if points:
+            cursor.executemany(
+                'UPDATE cat_location_history SET geohash = ? WHERE id = ? AND geohash IS NULL',
+                [(geohash, row_id) for row_id, geohash, _, _, _ in points],
+            )
+            self._add_to_location_cells(cursor, [point[1:] for point in points])
+            conn.commit()
+        conn.close()
+        return len(points)
+
+    def _location_map_filters(
+        self,
+        prefixes: List[str],
+        cat_id: Optional[int],
+        start_time: Optional[str],
+        end_time: Optional[str],
+    ) -> Tuple[str, List]:
+        """``WHERE`` body selecting rows in the given geohash cells, plus cat and time filters."""
+        ranges = []
+        params: List = []
+        for prefix in prefixes:
+            ranges.append('(clh.geohash >= ? AND clh.geohash < ?)')
+            params.extend(prefix_range(prefix))
+        clauses = ['(' + ' OR '.join(ranges) + ')']
+        if cat_id is not None:
+            clauses.append('clh.cat_id = ?')
+            params.append(cat_id)
+        if start_time is not None:
+            clauses.append('clh.created_at >= ?')
+            params.append(start_time)
+        if end_time is not None:
+            clauses.append('clh.created_at < ?')
+            params.append(end_time)
+        return ' AND '.join(clauses), params
+
+    def get_location_clusters(
+        self,
+        precision: int,
+        prefixes: List[str],
+        cat_id: Optional[int] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Point counts per geohash cell of ``precision`` characters inside ``prefixes``.
+        Unfiltered maps read the maintained ``location_cells`` aggregates; cat or
+        time filters group the matching rows on the fly.
+        """
+        if not prefixes:
+            return []
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        if cat_id is None and start_time is None and end_time is None:
+            ranges = []
+            params: List = []
+            for prefix in prefixes:
+                ranges.append('(precision = ? AND geohash >= ? AND geohash < ?)')
+                params.extend((precision, *prefix_range(prefix)))
+            cursor.execute(
+                f'''
+                SELECT
+                    geohash,
+                    point_count,
+                    latitude_sum / point_count AS latitude,
+                    longitude_sum / point_count AS longitude,
+                    last_seen_at
+                FROM location_cells
+                WHERE {' OR '.join(ranges)}
+            ''',
+                params,
+            )
+        else:
+            where, params = self._location_map_filters(prefixes, cat_id, start_time, end_time)
+            cursor.execute(
+                f'''
+                SELECT
+                    substr(clh.geohash, 1, ?) AS geohash,
+                    COUNT(*) AS point_count,
+                    AVG(clh.latitude) AS latitude,
+                    AVG(clh.longitude) AS longitude,
+                    MAX(clh.created_at) AS last_seen_at
+                FROM cat_location_history clh
+                WHERE {where}
+                GROUP BY substr(clh.geohash, 1, ?)
+            ''',
+                [precision, *params, precision],
+            )
+        clusters = [dict(row) for row in cursor.fetchall() if row['point_count'] > 0]
+        conn.close()
+        return clusters
+
+    def get_location_points(
+        self,
+        prefixes: List[str],
+        bbox: BoundingBox,
+        cat_id: Optional[int] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """Individual sightings inside ``bbox``, newest first, found through the geohash index."""
+        if not prefixes:
+            return []
+        # The unary + keeps the planner from walking the created_at index for the
+        # ORDER BY; a zoomed-in viewport matches few rows, so seeking the geohash
+        # ranges and sorting them is far cheaper.
+        where, params = self._location_map_filters(prefixes, cat_id, start_time, end_time)
+        clause, bbox_params = bbox.sql_filter('clh.latitude', 'clh.longitude')
+        query = f'''
+            SELECT
+                clh.id,
+                clh.cat_id,
+                COALESCE(c.name, '未知猫咪') AS cat_name,
+                clh.latitude,
+                clh.longitude,
+                clh.created_at
+            FROM cat_location_history clh
+            LEFT JOIN cats c ON c.id = clh.cat_id
+            WHERE {where} AND {clause}
+            ORDER BY +clh.created_at DESC, clh.id DESC
+        '''
+        params.extend(bbox_params)
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        points = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return points
+
+    def get_location_by_id(self, location_id: int) -> Optional[Dict]:
+        """Get a single location history record by ID"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT
+                clh.id,
+                clh.cat_id,
+                c.name AS cat_name,
+                c.age,
+                c.gender,
+                c.description,
+                c.sterilized,
+                c.microchipped,
+                c.special_notes,
+                c.unique_markings,
+                c.identification_code,
+                c.image_path AS cat_image_path,
+                clh.user_id,
+                u.name AS user_name,
+                u.email AS user_email,
+                clh.latitude,
+                clh.longitude,
+                clh.visit_status,
+                clh.visit_notes,
+                clh.recognition_event_id,
+                clh.image_path,
+                clh.created_at
+            FROM cat_location_history clh
+            JOIN cats c ON c.id = clh.cat_id
+            JOIN users u ON u.id = clh.user_id
+            WHERE clh.id = ?
+        ''',
+            (location_id,),
+        )
+        row = cursor.fetchone()
+        conn.close()
         return dict(row) if row else None
 
 
-# Initialize database
-db = DatabaseManager(DB_PATH)
+# Initialize database; every statement is timed by the query profiler
+query_profiler = QueryProfiler()
+db = DatabaseManager(DB_PATH, profiler=query_profiler)
+try:
+    query_profiler.slow_threshold_ms = float(db.get_setting('db.slow_query_ms') or 100)
+except ValueError:
+    pass
+
+def build_hamming_index() -> Optional[MultiIndexHash]:
+    """
+    Build the in-memory multi-index over reference hashes. The index is sized
+    for the most common hash length; references with another length are kept
+    aside by the index and still checked exactly.
+    """
+    records = [
+        record for record in db.list_reference_vectors(include_embedding=False)
+        if record.get('hash_hex') and record.get('hash_length')
+    ]
+    if not records:
+        return None
+    lengths: Dict[int, int] = {}
+    for record in records:
+        lengths[record['hash_length']] = lengths.get(record['hash_length'], 0) + 1
+    index = MultiIndexHash(max(lengths, key=lengths.get))
+    index.add_many(
+        (record['reference_id'], hex_to_bits(record['hash_hex'], record['hash_length']))
+        for record in records
+    )
+    return index
+
+hamming_index = build_hamming_index()
+
+def rebuild_hamming_index() -> None:
+    global hamming_index
+    try:
+        hamming_index = build_hamming_index()
+    except Exception as exc:
+        print(f"[CatRecognition] Failed to build Hamming index: {exc}")
+        hamming_index = None
+
+def rehash_reference(reference_id: int, embedding: np.ndarray) -> Tuple[str, np.ndarray]:
+    """Hash a stored embedding with the active family and keep the Hamming index in step."""
+    hash_hex, hash_bits = cat_recognizer.hash_signature(embedding)
+    index_reference_hash(reference_id, hash_bits)
+    return hash_hex, hash_bits
+
+def index_reference_hash(reference_id: int, hash_bits: np.ndarray) -> None:
+    """Add or replace a reference hash in the Hamming index."""
+    global hamming_index
+    if hamming_index is None:
+        hamming_index = MultiIndexHash(int(hash_bits.size))
+    hamming_index.add(reference_id, hash_bits)
+
+def remove_from_hamming_index(reference_id: int) -> None:
+    if hamming_index is not None:
+        hamming_index.remove(reference_id)
 
 def create_cat_recognizer_from_settings() -> CatFaceRecognizer:
     hash_override_setting = db.get_setting('cat_recognition.hash_length_override')
@@ -1599,7 +3414,17 @@ def create_cat_recognizer_from_settings() -> CatFaceRecognizer:
         except ValueError:
             hash_override = None
 
-    recognizer = CatFaceRecognizer(hash_length=hash_override)
+    hasher = None
+    hash_method = db.get_setting('cat_recognition.hash_method') or 'legacy'
+    if hash_method != 'legacy':
+        try:
+            hasher = ProjectionHasher.load(HASHER_PATH)
+        except FileNotFoundError:
+            print(f"[CatRecognition] Hasher not found at {HASHER_PATH}. Using the legacy hash.")
+        except Exception as exc:
+            print(f"[CatRecognition] Failed to load hasher: {exc}. Using the legacy hash.")
+
+    recognizer = CatFaceRecognizer(hash_length=hash_override, hasher=hasher)
 
     model_path_setting = db.get_setting('cat_recognition.model_path')
     if model_path_setting:
@@ -1613,6 +3438,142 @@ def create_cat_recognizer_from_settings() -> CatFaceRecognizer:
 
 cat_recognizer = create_cat_recognizer_from_settings()
 
+def rehash_stale_cats(batch_size: int) -> int:
+    """
+    One batch of the ``cats.hash_version`` migration: recompute the reference
+    hashes of up to ``batch_size`` stale cats from their stored embeddings with
+    the active hash family and rebuild their consensus hashes. No images are
+    re-read; returns the number of cats migrated.
+    """
+    recognizer = cat_recognizer
+    version = recognizer.hash_version
+    cat_ids = db.list_stale_hash_cats(version, batch_size)
+    if not cat_ids:
+        return 0
+    rows = []
+    for reference_id, blob in db.list_reference_embeddings_for_cats(cat_ids):
+        embedding = blob_to_embedding(blob)
+        if not embedding.size:
+            continue
+        hash_hex, bits = recognizer.hash_signature(embedding)
+        rows.append((hash_hex, int(bits.size), reference_id))
+    db.apply_rehashed_references(rows, cat_ids, version)
+    return len(cat_ids)
+
+def finish_reference_hash_migration() -> None:
+    rebuild_hamming_index()
+    print(f"[CatRecognition] Reference hashes migrated to hash version {cat_recognizer.hash_version}")
+
+def rebuild_missing_cat_aggregates(batch_size: int) -> int:
+    cat_ids = db.list_cats_missing_aggregates(batch_size)
+    db.rebuild_cat_aggregates(cat_ids)
+    return len(cat_ids)
+
+backfill_runner = BackfillRunner()
+backfill_runner.register(Backfill(
+    'reference_hashes',
+    pending=lambda: db.count_stale_hash_cats(cat_recognizer.hash_version) > 0,
+    run_batch=rehash_stale_cats,
+    finish=finish_reference_hash_migration,
+))
+backfill_runner.register(Backfill(
+    'cat_aggregates',
+    pending=lambda: bool(db.list_cats_missing_aggregates(1)),
+    run_batch=rebuild_missing_cat_aggregates,
+))
+backfill_runner.register(Backfill(
+    'location_geohashes',
+    pending=db.has_locations_missing_geohash,
+    run_batch=db.assign_location_geohashes,
+))
+backfill_runner.register(Backfill(
+    'movement_summaries',
+    pending=db.has_stale_movement_summaries,
+    run_batch=db.refresh_movement_summaries,
+))
+backfill_runner.register(Backfill(
+    'analytics_rollups',
+    pending=db.has_pending_rollup_backfill,
+    run_batch=db.backfill_rollups,
+))
+# Uploads, deletes and reprocessing only change the PQ index in memory
+backfill_runner.register(Backfill(
+    'pq_index',
+    pending=lambda: pq_index is not None and pq_index.dirty,
+    run_batch=save_pq_index,
+))
+
+def get_retention_policy() -> RetentionPolicy:
+    values = {key: db.get_setting(f'retention.{key}') for key in DEFAULT_POLICY}
+    try:
+        return RetentionPolicy.from_values(values)
+    except ValueError:
+        return RetentionPolicy.from_values({})
+
+archive_writer = ArchiveWriter(ARCHIVE_DIR)
+event_archiver = EventArchiver(
+    fetch_expired=db.list_expired_recognition_events,
+    delete_events=db.delete_recognition_events,
+    writer=archive_writer,
+    policy=get_retention_policy,
+)
+query_image_collector = QueryImageCollector(
+    QUERY_IMAGE_DIR,
+    find_referenced=db.referenced_query_images,
+    policy=get_retention_policy,
+)
+# Separate from backfill_runner so a long archive pass never delays a schema
+# backfill; the batch size keeps the image lookups under SQLite's 999 variables.
+maintenance_runner = BackfillRunner(batch_size=200, pause_seconds=0.2)
+maintenance_runner.register(Backfill(
+    'event_retention',
+    pending=event_archiver.pending,
+    run_batch=event_archiver.run_batch,
+    finish=event_archiver.finish,
+))
+maintenance_runner.register(Backfill(
+    'query_image_gc',
+    pending=query_image_collector.pending,
+    run_batch=query_image_collector.run_batch,
+    finish=query_image_collector.finish,
+))
+retention_scheduler = QuietHoursScheduler(
+    maintenance_runner.start,
+    quiet_hours=lambda: get_retention_policy().quiet_hours,
+)
+
+def build_hasher(hash_method: str, num_bits: int, train_size: int = 20000) -> Optional[ProjectionHasher]:
+    """Create a hasher of the requested family from the stored reference embeddings."""
+    if hash_method == 'legacy':
+        return None
+    sample = [blob_to_embedding(blob) for blob in db.sample_reference_embeddings(train_size)]
+    sample = [vec for vec in sample if vec.size]
+    if not sample:
+        raise ValueError("No reference embeddings available to fit the hasher")
+    dim = sample[0].size
+    matrix = np.stack([vec for vec in sample if vec.size == dim])
+    if hash_method == 'random':
+        return random_hyperplane_hasher(dim, num_bits, mean=matrix.mean(axis=0))
+    if hash_method == 'itq':
+        return train_itq_hasher(matrix, num_bits)
+    raise ValueError(f"hash_method must be one of: {', '.join(HASH_METHODS)}")
+
+def apply_hash_configuration(hash_method: str, num_bits: int, hasher: Optional[ProjectionHasher]) -> Dict:
+    """
+    Persist a hasher from :func:`build_hasher` (fit it first: that is the step
+    that can fail) and switch the recognizer to it. References are
+    rehashed by the ``reference_hashes`` backfill in the background (``max_hamming``
+    is ignored until it finishes); returns that backfill's status.
+    """
+    global cat_recognizer
+    if hasher is not None:
+        hasher.save(HASHER_PATH)
+    db.set_setting('cat_recognition.hash_method', hash_method)
+    db.set_setting('cat_recognition.hash_bits', str(num_bits))
+    cat_recognizer = create_cat_recognizer_from_settings()
+    backfill_runner.start('reference_hashes')
+    return backfill_runner.status()['reference_hashes']
+
 def reprocess_reference_images(cat_id: int, reference_ids: Optional[List[int]] = None) -> int:
     """
     Reprocess reference images through the current model and update their embeddings.
@@ -1627,6 +3588,7 @@ def reprocess_reference_images(cat_id: int, reference_ids: Optional[List[int]] =
         return 0
     
     reprocessed_count = 0
+    reindexed = []
     for reference in references:
         reference_id = reference.get('id')
         image_path = reference.get('image_path')
@@ -1653,17 +3615,32 @@ def reprocess_reference_images(cat_id: int, reference_ids: Optional[List[int]] =
                 hash_hex=hash_hex,
                 hash_length=hash_length,
                 embedding_bytes=embedding_to_blob(embedding),
+                hash_version=cat_recognizer.hash_version,
+                rehash_reference=rehash_reference,
             )
             
             if success:
                 reprocessed_count += 1
+                reindexed.append((reference_id, embedding))
+                index_reference_hash(reference_id, hash_bits)
         except Exception as exc:
             print(f"[Reprocess] Failed to reprocess reference {reference_id}: {exc}")
             continue
     
+    # One PQ update for the whole pass instead of one per image
+    index_reference_embeddings(reindexed)
     return reprocessed_count
 
 def recompute_cat_signature(cat_id: int, reference_ids: Optional[List[int]] = None) -> None:
+    """
+    Rebuild a cat's centroid and consensus hash from scratch. Uploads, deletes and
+    moves keep these current incrementally, so a full rebuild is only needed
+    after reference embeddings change (e.g. a model switch).
+    """
+    if not reference_ids:
+        db.rebuild_cat_aggregate(cat_id)
+        return
+
     references = db.get_cat_reference_images(cat_id, include_embedding=True, reference_ids=reference_ids)
     if not references:
         db.refresh_cat_signature(cat_id, None, None, None)
@@ -1691,29 +3668,414 @@ def recompute_cat_signature(cat_id: int, reference_ids: Optional[List[int]] = No
     db.refresh_cat_signature(cat_id, aggregated_hash_hex, aggregated_hash_length, embedding_bytes)
 
 
-def get_recognition_settings() -> Dict:
+def load_pq_index() -> Optional[PQIndex]:
+    if not os.path.exists(PQ_INDEX_PATH):
+        return None
     try:
-        threshold = float(db.get_setting('cat_recognition.threshold') or 0.78)
-    except ValueError:
-        threshold = 0.78
+        index = PQIndex.load(PQ_INDEX_PATH)
+        print(f"[CatRecognition] Loaded PQ index with {len(index)} references from {PQ_INDEX_PATH}")
+        return index
+    except Exception as exc:
+        print(f"[CatRecognition] Failed to load PQ index: {exc}")
+        return None
 
-    try:
-        max_results = int(db.get_setting('cat_recognition.max_results') or 3)
-    except ValueError:
-        max_results = 3
+pq_index = load_pq_index()
 
-    max_hamming_setting = db.get_setting('cat_recognition.max_hamming')
-    try:
-        max_hamming = int(max_hamming_setting) if max_hamming_setting else None
-    except ValueError:
+def rebuild_pq_index(
+    num_subspaces: int = 16,
+    num_centroids: int = 256,
+    train_size: int = 50000,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict:
+    """
+    Train fresh codebooks on a random sample of reference embeddings and encode
+    every stored reference in batches, so the full float32 matrix is never held
+    in memory. Runs as a background job; ``progress`` receives the number of
+    references encoded so far. The old index keeps serving searches until the
+    new one replaces it.
+    """
+    global pq_index
+    started = time.time()
+    training = [blob_to_embedding(blob) for blob in db.sample_reference_embeddings(train_size)]
+    training = [vec for vec in training if vec.size]
+    if not training:
+        raise ValueError("No reference embeddings available to train the PQ index")
+    dim = training[0].size
+    training_matrix = np.stack([vec for vec in training if vec.size == dim])
+
+    index = PQIndex.build(training_matrix, num_subspaces=num_subspaces, num_centroids=num_centroids)
+    encoded = 0
+    for reference_ids, blobs in db.iter_reference_embeddings():
+        vectors = [blob_to_embedding(blob) for blob in blobs]
+        pairs = [(ref_id, vec) for ref_id, vec in zip(reference_ids, vectors) if vec.size == dim]
+        if pairs:
+            index.add([ref_id for ref_id, _ in pairs], np.stack([vec for _, vec in pairs]))
+        encoded += len(reference_ids)
+        if progress is not None:
+            progress(encoded)
+
+    index.save(PQ_INDEX_PATH)
+    pq_index = index
+    return {
+        "reference_count": len(index),
+        "dim": index.dim,
+        "num_subspaces": index.quantizer.num_subspaces,
+        "num_centroids": index.quantizer.num_centroids,
+        "elapsed_seconds": round(time.time() - started, 3),
+    }
+
+def index_reference_embeddings(entries: List) -> None:
+    """
+    Add or replace ``(reference_id, embedding)`` pairs in the PQ index, if one
+    exists. The file is written later by the ``pq_index`` backfill (and on
+    shutdown), so a burst of uploads costs one save instead of one per image.
+    """
+    if pq_index is None or not entries:
+        return
+    usable = [(ref_id, vec) for ref_id, vec in entries if vec is not None and vec.size == pq_index.dim]
+    if len(usable) != len(entries):
+        print("[CatRecognition] Embedding dimension differs from the PQ index; rebuild the index after changing models.")
+    if not usable:
+        return
+    try:
+        pq_index.add([ref_id for ref_id, _ in usable], np.stack([vec for _, vec in usable]))
+    except Exception as exc:
+        print(f"[CatRecognition] Failed to update PQ index: {exc}")
+        return
+    backfill_runner.start()
+
+def remove_from_pq_index(reference_ids: List[int]) -> None:
+    if pq_index is None or not reference_ids:
+        return
+    try:
+        removed = pq_index.remove(reference_ids)
+    except Exception as exc:
+        print(f"[CatRecognition] Failed to update PQ index: {exc}")
+        return
+    if removed:
+        backfill_runner.start()
+
+def save_pq_index(_batch_size: int = 0) -> int:
+    """Write the PQ index if it changed since the last save; returns 1 if it was written."""
+    index = pq_index
+    if index is None:
+        return 0
+    try:
+        return int(index.save_if_dirty(PQ_INDEX_PATH))
+    except Exception as exc:
+        print(f"[CatRecognition] Failed to save PQ index: {exc}")
+        return 0
+
+
+def get_tracing_settings() -> Dict:
+    """Tracing knobs; kept out of ``get_recognition_settings``, which is echoed to every user."""
+    try:
+        sample_rate = float(db.get_setting('tracing.sample_rate') or 1.0)
+    except ValueError:
+        sample_rate = 1.0
+    return {
+        "sample_rate": min(max(sample_rate, 0.0), 1.0),
+        "response_header": (db.get_setting('tracing.response_header') or 'false') == 'true',
+    }
+
+def get_recognition_settings() -> Dict:
+    try:
+        threshold = float(db.get_setting('cat_recognition.threshold') or 0.78)
+    except ValueError:
+        threshold = 0.78
+
+    try:
+        max_results = int(db.get_setting('cat_recognition.max_results') or 3)
+    except ValueError:
+        max_results = 3
+
+    max_hamming_setting = db.get_setting('cat_recognition.max_hamming')
+    try:
+        max_hamming = int(max_hamming_setting) if max_hamming_setting else None
+    except ValueError:
+        max_hamming = None
+    if backfill_runner.is_active('reference_hashes'):
+        # Hashes of cats not yet migrated are not comparable with the query hash
         max_hamming = None
 
+    search_mode = db.get_setting('cat_recognition.search_mode') or 'exhaustive'
+    if search_mode not in RECOGNITION_SEARCH_MODES:
+        search_mode = 'exhaustive'
+
+    try:
+        pq_candidates = int(db.get_setting('cat_recognition.pq_candidates') or 200)
+    except ValueError:
+        pq_candidates = 200
+
+    try:
+        hierarchical_top_cats = int(db.get_setting('cat_recognition.hierarchical_top_cats') or 10)
+    except ValueError:
+        hierarchical_top_cats = 10
+
     return {
         "threshold": threshold,
         "max_results": max_results,
         "max_hamming": max_hamming,
         "model_path": db.get_setting('cat_recognition.model_path') or "",
         "hash_length_override": db.get_setting('cat_recognition.hash_length_override') or "",
+        "search_mode": search_mode,
+        "pq_candidates": pq_candidates,
+        "pq_rerank": (db.get_setting('cat_recognition.pq_rerank') or 'true').lower() != 'false',
+        "hierarchical_top_cats": hierarchical_top_cats,
+        "hash_method": db.get_setting('cat_recognition.hash_method') or 'legacy',
+        "hash_bits": db.get_setting('cat_recognition.hash_bits') or '128',
+        "hash_version": cat_recognizer.hash_version,
+    }
+
+
+def select_reference_records(query_embedding: np.ndarray, settings: Dict, query_bits: Optional[np.ndarray] = None):
+    """
+    Return the reference rows to score for a recognition query, together with
+    the search mode actually used.
+
+    In ``pq`` mode the PQ index shortlists ``pq_candidates`` references of
+    approved cats (see :func:`pq_shortlist`); their raw embeddings are then re-read for an exact rerank, or replaced by
+    the PQ reconstruction when ``pq_rerank`` is off.
+
+    In ``hierarchical`` mode cats are first ranked by their aggregated centroid
+    (``cats.embedding_vector``) and only the references of the best
+    ``hierarchical_top_cats`` cats are scored individually.
+
+    Otherwise, when ``max_hamming`` is set and ``query_bits`` are given, the
+    multi-index over reference hashes returns exactly the references within
+    that radius, so the rest of the catalogue is never loaded.
+    """
+    if settings['search_mode'] == 'hierarchical':
+        centroids = [
+            (row['cat_id'], blob_to_embedding(row['embedding_vector']))
+            for row in db.list_cat_centroids()
+        ]
+        shortlist = rank_by_centroid(query_embedding, centroids, settings['hierarchical_top_cats'])
+        if shortlist:
+            records = db.list_reference_vectors(cat_ids=[cat_id for cat_id, _ in shortlist])
+            return records, 'hierarchical'
+    if settings['search_mode'] == 'pq' and pq_index is not None and len(pq_index) and query_embedding.size == pq_index.dim:
+        candidate_ids = pq_shortlist(query_embedding, settings['pq_candidates'], db.filter_eligible_reference_ids)
+        records = db.list_reference_vectors(reference_ids=candidate_ids, include_embedding=settings['pq_rerank'])
+        if not settings['pq_rerank']:
+            approximations = pq_index.reconstruct(candidate_ids)
+            for record in records:
+                approx = approximations.get(record['reference_id'])
+                if approx is not None:
+                    record['embedding_vector'] = embedding_to_blob(approx)
+        return records, 'pq'
+    if settings['max_hamming'] is not None and query_bits is not None and hamming_index is not None:
+        neighbours = hamming_index.search(query_bits, settings['max_hamming'])
+        if neighbours is not None:
+            records = db.list_reference_vectors(reference_ids=[ref_id for ref_id, _ in neighbours])
+            return records, 'hamming'
+    return db.list_reference_vectors(), 'exhaustive'
+
+
+def pq_shortlist(
+    query_embedding: np.ndarray,
+    count: int,
+    filter_eligible: Callable[[List[int]], Set[int]],
+) -> List[int]:
+    """
+    The ``count`` nearest references in the PQ index that ``filter_eligible``
+    keeps, closest first. The index also holds pending and rejected uploads,
+    so the search over-fetches by ``PQ_SHORTLIST_OVERFETCH`` and widens only
+    when too few of the shortlisted references survive; ``filter_eligible``
+    sees just the shortlisted ids.
+    """
+    fetch = count * PQ_SHORTLIST_OVERFETCH
+    while True:
+        shortlist = [ref_id for ref_id, _ in pq_index.search(query_embedding, top_k=fetch)]
+        eligible = filter_eligible(shortlist)
+        candidate_ids = [ref_id for ref_id in shortlist if ref_id in eligible][:count]
+        if len(candidate_ids) >= count or len(shortlist) < fetch:
+            return candidate_ids
+        fetch *= 4
+
+
+def _top_cats_by_similarity(cat_ids: np.ndarray, similarities: np.ndarray, top_k: int) -> List[int]:
+    best: List[int] = []
+    for index in np.argsort(-similarities):
+        if not np.isfinite(similarities[index]):
+            break
+        cat_id = int(cat_ids[index])
+        if cat_id not in best:
+            best.append(cat_id)
+            if len(best) >= top_k:
+                break
+    return best
+
+
+def measure_hash_recall(
+    hash_method: str,
+    num_bits: int,
+    top_k: int = 10,
+    num_candidates: int = 100,
+    sample_size: int = 200,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict:
+    """
+    Compare the active hash with a candidate hash family on stored embeddings:
+    the fraction of each query's true cosine top-``top_k`` that survives a
+    ``num_candidates`` Hamming-distance shortlist. Runs as a background job;
+    ``progress`` counts the queries evaluated over both families.
+    """
+    vectors = [blob_to_embedding(blob) for blob in db.sample_reference_embeddings(20000)]
+    vectors = [vec for vec in vectors if vec.size]
+    if len(vectors) < 2:
+        raise ValueError("At least two reference embeddings are required")
+    dim = vectors[0].size
+    matrix = np.stack([vec for vec in vectors if vec.size == dim]).astype(np.float32)
+
+    recognizer = cat_recognizer
+    if recognizer.hasher is not None and recognizer.hasher.dim == dim:
+        current_bits = recognizer.hasher.hash(matrix)
+    else:
+        current_bits = np.stack([recognizer.hash_signature(vec)[1] for vec in matrix]).astype(bool)
+    candidate = build_hasher(hash_method, num_bits)
+    if candidate is None:
+        candidate_bits = np.stack([legacy_hash(vec) for vec in matrix])
+        candidate_version = LEGACY_HASH_VERSION
+    else:
+        candidate_bits = candidate.hash(matrix)
+        candidate_version = candidate.version
+
+    rng = np.random.default_rng()
+    queries = rng.choice(len(matrix), size=min(sample_size, len(matrix)), replace=False)
+    # The candidate family's queries follow the current family's in the job's progress
+    candidate_progress = None if progress is None else (lambda done: progress(len(queries) + done))
+    return {
+        "reference_count": int(len(matrix)),
+        "sample_size": int(len(queries)),
+        "k": top_k,
+        "candidates": num_candidates,
+        "current": {
+            "hash_version": recognizer.hash_version,
+            "bits": int(current_bits.shape[1]),
+            "recall": hamming_candidate_recall(
+                matrix, current_bits, queries, k=top_k, num_candidates=num_candidates, progress=progress,
+            ),
+        },
+        "candidate": {
+            "hash_version": candidate_version,
+            "bits": int(candidate_bits.shape[1]),
+            "recall": hamming_candidate_recall(
+                matrix, candidate_bits, queries, k=top_k, num_candidates=num_candidates, progress=candidate_progress,
+            ),
+        },
+    }
+
+def measure_search_recall(
+    search_mode: str,
+    sample_size: int = 100,
+    top_k: int = 3,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict:
+    """
+    Estimate how often ``search_mode`` returns the same best cats as an
+    exhaustive scan. Stored reference embeddings are used as leave-one-out
+    queries: the queried reference is excluded from both result sets and, in
+    ``hierarchical`` mode, subtracted from its cat's embedding sum before the
+    centroids are ranked, so it cannot pull its own cat into the shortlist.
+
+    The catalogue is loaded once; the candidate sets of each mode are
+    reproduced in memory (see :func:`select_reference_records`).
+    """
+    settings = get_recognition_settings()
+
+    records = [
+        record for record in db.list_reference_vectors()
+        if record.get('is_approved') and not record.get('is_rejected') and record.get('embedding_vector')
+    ]
+    vectors = [blob_to_embedding(record['embedding_vector']) for record in records]
+    if not vectors:
+        raise ValueError("No approved reference embeddings available")
+    dim = vectors[0].size
+    usable = [(record, vec) for record, vec in zip(records, vectors) if vec.size == dim]
+    reference_ids = np.array([record['reference_id'] for record, _ in usable])
+    cat_ids = np.array([record['cat_id'] for record, _ in usable])
+    raw = np.stack([vec for _, vec in usable]).astype(np.float64)
+    norms = np.linalg.norm(raw, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = (raw / norms).astype(np.float32)
+    positions = {int(ref_id): position for position, ref_id in enumerate(reference_ids)}
+
+    resolved_mode = search_mode
+    if search_mode == 'pq' and not (pq_index is not None and len(pq_index) and dim == pq_index.dim):
+        resolved_mode = 'exhaustive'
+    if resolved_mode == 'hierarchical':
+        centroid_cats, cat_positions = np.unique(cat_ids, return_inverse=True)
+        cat_sums = np.zeros((len(centroid_cats), dim), dtype=np.float64)
+        np.add.at(cat_sums, cat_positions, raw)
+        cat_counts = np.bincount(cat_positions, minlength=len(centroid_cats))
+        sum_norms = np.linalg.norm(cat_sums, axis=1, keepdims=True)
+        sum_norms[sum_norms == 0] = 1.0
+        centroids = (cat_sums / sum_norms).astype(np.float32)
+
+    rng = np.random.default_rng()
+    sample = rng.choice(len(usable), size=min(sample_size, len(usable)), replace=False)
+    hits = 0
+    expected_total = 0
+    comparisons = 0
+    for done, index in enumerate(sample, start=1):
+        query = matrix[index]
+        similarities = matrix @ query
+        similarities[index] = -np.inf
+        expected = _top_cats_by_similarity(cat_ids, similarities, top_k)
+
+        if resolved_mode == 'hierarchical':
+            centroid_similarities = centroids @ query
+            own_cat = cat_positions[index]
+            if cat_counts[own_cat] > 1:
+                centroid = centroid_from_sum(update_embedding_sum(cat_sums[own_cat], raw[index], -1), 1)
+                centroid_similarities[own_cat] = float(centroid @ query)
+            else:
+                centroid_similarities[own_cat] = -np.inf
+            shortlist = [
+                cat for cat in np.argsort(-centroid_similarities)[:settings['hierarchical_top_cats']]
+                if np.isfinite(centroid_similarities[cat])
+            ]
+            candidate_positions = np.flatnonzero(np.isin(cat_positions, shortlist))
+            candidate_positions = candidate_positions[candidate_positions != index]
+            candidate_similarities = similarities[candidate_positions]
+        elif resolved_mode == 'pq':
+            query_id = int(reference_ids[index])
+            # positions holds exactly the approved references with usable embeddings
+            candidate_ids = pq_shortlist(
+                query,
+                settings['pq_candidates'],
+                lambda ids: {ref_id for ref_id in ids if ref_id in positions and ref_id != query_id},
+            )
+            candidate_positions = np.array([positions[ref_id] for ref_id in candidate_ids], dtype=np.int64)
+            if settings['pq_rerank']:
+                candidate_similarities = similarities[candidate_positions]
+            else:
+                approximations = pq_index.reconstruct(candidate_ids)
+                candidate_similarities = np.array([
+                    float(approximations[ref_id] @ query) / (np.linalg.norm(approximations[ref_id]) or 1.0)
+                    if ref_id in approximations else -np.inf
+                    for ref_id in candidate_ids
+                ], dtype=np.float32)
+        else:
+            candidate_positions = np.flatnonzero(np.arange(len(usable)) != index)
+            candidate_similarities = similarities[candidate_positions]
+
+        comparisons += len(candidate_positions)
+        found = _top_cats_by_similarity(cat_ids[candidate_positions], candidate_similarities, top_k)
+        hits += len(set(expected) & set(found))
+        expected_total += len(expected)
+        if progress is not None:
+            progress(done)
+
+    return {
+        "search_mode": search_mode,
+        "resolved_mode": resolved_mode,
+        "queries": int(len(sample)),
+        "top_k": top_k,
+        "recall": (hits / expected_total) if expected_total else None,
+        "mean_comparisons": (comparisons / len(sample)) if len(sample) else 0,
+        "exhaustive_comparisons": max(len(usable) - 1, 0),
     }
 
 
@@ -1731,17 +4093,59 @@ def sanitize_cat_record(cat: Optional[Dict]) -> Optional[Dict]:
     if not cat:
         return None
     sanitized = dict(cat)
-    sanitized.pop('embedding_vector', None)
+    for key in ('embedding_vector', 'embedding_sum', 'hash_votes'):
+        sanitized.pop(key, None)
     for key in ('sterilized', 'microchipped', 'is_adopted', 'is_approved', 'is_rejected'):
         if key in sanitized and sanitized[key] is not None:
             sanitized[key] = bool(sanitized[key])
     return sanitized
 
 
-def send_verification_email(email, name, token):
-    """Send verification email via Resend API"""
+def parse_history_time_bound(value: str, end: bool = False) -> str:
+    """
+    Turn a ``start_date``/``end_date`` query value into a stored-timestamp bound.
+    Dates and times are in the same UTC clock as ``CURRENT_TIMESTAMP``. Start
+    bounds are inclusive; end bounds are returned exclusive, so ``2024-05-31``
+    covers that whole day and ``2024-05-31T18:30`` includes 18:30:00 itself.
+    """
+    try:
+        moment = datetime.datetime.fromisoformat(value.strip())
+    except ValueError as exc:
+        raise ValueError(f"invalid date {value!r}, expected YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]") from exc
+    if moment.tzinfo is not None:
+        raise ValueError("dates must not carry a timezone offset")
+    if not 1999 <= moment.year <= 3000:
+        raise ValueError("dates must be between 1999 and 3000")
+    if end:
+        date_only = len(value.strip()) == 10
+        moment += datetime.timedelta(days=1) if date_only else datetime.timedelta(seconds=1)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+# Used instead of Resend when the 'email.transport' setting is 'stub'
+stub_email_transport = StubTransport()
+
+def email_transport():
+    """The outbox transport: the stub when ``email.transport`` is 'stub', else Resend if a key is set."""
+    if (db.get_setting('email.transport') or 'resend') == 'stub':
+        return stub_email_transport
     api_key = db.get_setting('resend_api_key')
-    if not api_key:
+    return ResendTransport(api_key) if api_key else None
+
+outbox_worker = OutboxWorker(
+    claim=db.claim_outbox_emails,
+    mark_sent=db.mark_outbox_sent,
+    mark_failed=db.mark_outbox_failed,
+    transport=email_transport,
+)
+
+def queue_emails(kind: str, messages: List[Dict]) -> None:
+    db.enqueue_emails(kind, messages)
+    outbox_worker.notify()
+
+def send_verification_email(email, name, token):
+    """Queue the verification email; False when email delivery is not configured."""
+    if email_transport() is None:
         print("Warning: Resend API key not configured. Email not sent.")
         return False
     
@@ -1752,7 +4156,6 @@ def send_verification_email(email, name, token):
     # Get "from" email address from settings or use default
     from_email = db.get_setting('resend_from_email') or "noreply@resend.dev"
     
-    # Prepare email data for Resend API
     email_data = {
         "from": from_email,
         "to": [email],
@@ -1781,42 +4184,18 @@ def send_verification_email(email, name, token):
         </html>
         """
     }
-    
-    # Send request to Resend API
-    try:
-        req = urllib.request.Request(
-            'https://api.resend.com/emails',
-            data=json.dumps(email_data).encode('utf-8'),
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            }
-        )
-        response = urllib.request.urlopen(req)
-        if response.getcode() == 200:
-            return True
-        else:
-            print(f"Resend API error: {response.getcode()}")
-            return False
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8')
-        print(f"Resend API HTTP error: {e.code} - {error_body}")
-        return False
-    except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        return False
+    queue_emails('verification', [email_data])
+    return True
 
 def send_password_reset_email(email, name, code):
-    """Send password reset verification code via Resend API"""
-    api_key = db.get_setting('resend_api_key')
-    if not api_key:
+    """Queue the password reset code; False when email delivery is not configured."""
+    if email_transport() is None:
         print("Warning: Resend API key not configured. Email not sent.")
         return False
     
     # Get "from" email address from settings or use default
     from_email = db.get_setting('resend_from_email') or "noreply@resend.dev"
     
-    # Prepare email data for Resend API
     email_data = {
         "from": from_email,
         "to": [email],
@@ -1843,74 +4222,88 @@ def send_password_reset_email(email, name, code):
         </html>
         """
     }
-    
-    # Send request to Resend API
-    try:
-        req = urllib.request.Request(
-            'https://api.resend.com/emails',
-            data=json.dumps(email_data).encode('utf-8'),
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            }
-        )
-        response = urllib.request.urlopen(req)
-        if response.getcode() == 200:
-            return True
-        else:
-            print(f"Resend API error: {response.getcode()}")
-            return False
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8')
-        print(f"Resend API HTTP error: {e.code} - {error_body}")
-        return False
-    except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        return False
+    queue_emails('password_reset', [email_data])
+    return True
 
 def send_notification_email(subject: str, html_body: str, text_body: Optional[str] = None) -> bool:
-    """Send a notification email to configured team members."""
-    api_key = db.get_setting('resend_api_key')
+    """Queue a notification to each configured team member; False when nothing was queued."""
     recipients = db.get_notification_recipients()
     from_email = db.get_notification_from_email()
 
-    if not api_key:
+    if email_transport() is None:
         print("Warning: Resend API key not configured. Notification not sent.")
         return False
     if not recipients:
         print("Warning: Notification recipients not configured. Notification skipped.")
         return False
 
-    email_data = {
-        "from": from_email,
-        "to": recipients,
-        "subject": subject,
-        "html": html_body,
-    }
-    if text_body:
-        email_data["text"] = text_body
+    # One message per recipient, so members do not see each other's addresses
+    # and a bounce only retries that recipient; the worker sends them in one batch.
+    messages = []
+    for recipient in recipients:
+        email_data = {
+            "from": from_email,
+            "to": [recipient],
+            "subject": subject,
+            "html": html_body,
+        }
+        if text_body:
+            email_data["text"] = text_body
+        messages.append(email_data)
+    queue_emails('notification', messages)
+    return True
+
+# Per-route request metrics, exposed at /api/admin/metrics
+request_metrics = RequestMetrics()
+
+# JSON bodies of 1 KiB or more are compressed when the client accepts it;
+# the cost shows up per route in the catalist_http_compression_* metrics
+response_compressor = ResponseCompressor(
+    on_compress=lambda handler, encoding, bytes_in, bytes_out, cpu_seconds: request_metrics.record_compression(
+        handler.command, handler.path, encoding, bytes_in, bytes_out, cpu_seconds
+    )
+)
 
-    try:
-        req = urllib.request.Request(
-            'https://api.resend.com/emails',
-            data=json.dumps(email_data).encode('utf-8'),
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            }
-        )
-        response = urllib.request.urlopen(req)
-        if response.getcode() == 200:
-            return True
-        print(f"Resend notification error: {response.getcode()}")
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8')
-        print(f"Resend notification HTTP error: {e.code} - {error_body}")
-    except Exception as e:
-        print(f"Error sending notification email: {str(e)}")
-    return False
+# Push channel: handlers publish to 'user:<id>', 'admins' or 'all'; browsers
+# subscribe with EventSource('/api/events')
+event_broker = EventBroker()
+event_hub = SSEHub(event_broker)
+
+def broadcast_messages(sender_id: int, recipient_ids: List[int], subject: str, content: str, progress) -> Dict:
+    sent = db.send_bulk_messages(sender_id, recipient_ids, subject, content, progress=progress)
+    # One event for everyone rather than one per recipient; clients fetch their own changes
+    event_broker.publish(['all'], 'inbox', {})
+    return {"sent": sent}
+
+def publish_inbox_change(user_id: int) -> None:
+    state = db.get_inbox_state(user_id)
+    event_broker.publish(
+        [f'user:{user_id}'], 'inbox', {"unread_count": state['unread_count'], "seq": state['seq']}
+    )
+
+# Admin broadcasts and other long fan-outs; progress is pushed to admins as
+# 'job' events and can be read from /api/admin/jobs/{id}
+job_tracker = JobTracker(on_update=lambda job: event_broker.publish(['admins'], 'job', job))
+
+# ETag / fingerprint digests for the pages, css/ and js/
+static_files = StaticFileIndex()
+
+class CatalistHTTPServer(socketserver.TCPServer):
+    """Serves requests one at a time; event-stream sockets stay open for the SSE hub."""
+
+    def shutdown_request(self, request):
+        if event_hub.owns(request):
+            return
+        super().shutdown_request(request)
 
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Set by do_GET when a fingerprinted asset name was requested
+    static_fingerprint = None
+
+    def send_response(self, code, message=None):
+        self._metrics_status = code
+        super().send_response(code, message)
+
     def end_headers(self):
         # 添加CORS头部
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -1939,12 +4332,29 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 if token == expected_token:
                     return user
         return None
+
+    def parse_page_request(self):
+        """
+        Read keyset paging parameters (``page_size`` / ``cursor``) from the query
+        string. Returns ``(True, page)``, where page is ``None`` for a legacy
+        unpaged request, or sends a 400 and returns ``(False, None)``.
+        """
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        try:
+            return True, parse_page(query_params)
+        except ValueError as exc:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": str(exc)}).encode())
+            return False, None
     
     def do_OPTIONS(self):
         """Handle OPTIONS requests for CORS"""
         self.send_response(200)
         self.end_headers()
     
+    @request_metrics.instrument
+    @response_compressor.instrument
     def do_POST(self):
         """Handle POST requests"""
         if self.path == '/api/login':
@@ -2002,6 +4412,16 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": "Invalid location ID"}).encode())
         elif self.path == '/api/admin/cat-recognition/settings':
             self.handle_update_recognition_settings()
+        elif self.path == '/api/admin/cat-recognition/pq-index':
+            self.handle_rebuild_pq_index()
+        elif self.path == '/api/admin/db-profile':
+            self.handle_update_db_profile()
+        elif self.path == '/api/admin/retention':
+            self.handle_update_retention()
+        elif self.path == '/api/admin/email-outbox':
+            self.handle_update_email_outbox()
+        elif self.path == '/api/admin/retention/run':
+            self.handle_run_retention()
         elif self.path == '/api/logout':
             self.handle_logout()
         elif self.path.startswith('/api/cats/'):
@@ -2121,6 +4541,8 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_response(404)
             self.end_headers()
     
+    @request_metrics.instrument
+    @response_compressor.instrument
     def do_PUT(self):
         """Handle PUT requests"""
         if self.path == '/api/user/profile':
@@ -2150,6 +4572,8 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_response(404)
             self.end_headers()
     
+    @request_metrics.instrument
+    @response_compressor.instrument
     def do_DELETE(self):
         """Handle DELETE requests"""
         if self.path.startswith('/api/admin/reference-images/'):
@@ -2178,13 +4602,15 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_response(404)
             self.end_headers()
     
+    @request_metrics.instrument
+    @response_compressor.instrument
     def do_GET(self):
         """Handle GET requests"""
         # API endpoints
         if self.path.startswith('/api/'):
-            if self.path == '/api/cats':
+            if self.path == '/api/cats' or self.path.startswith('/api/cats?'):
                 self.handle_get_cats()
-            elif self.path == '/api/admin/cats':
+            elif self.path == '/api/admin/cats' or self.path.startswith('/api/admin/cats?'):
                 self.handle_get_cats_admin()
             elif self.path == '/api/current_user':
                 self.handle_get_current_user()
@@ -2192,9 +4618,15 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.handle_get_users()
             elif self.path == '/api/adoption_requests':
                 self.handle_get_adoption_requests()
-            elif self.path == '/api/messages':
+            elif self.path == '/api/messages' or self.path.startswith('/api/messages?'):
                 self.handle_get_messages()
-            elif self.path == '/api/messages/sent':
+            elif self.path == '/api/events' or self.path.startswith('/api/events?'):
+                self.handle_event_stream()
+            elif self.path == '/api/messages/unread-count':
+                self.handle_get_unread_count()
+            elif self.path.startswith('/api/messages/changes?'):
+                self.handle_get_message_changes()
+            elif self.path == '/api/messages/sent' or self.path.startswith('/api/messages/sent?'):
                 self.handle_get_sent_messages()
             elif self.path == '/api/content':
                 self.handle_get_all_content()
@@ -2202,6 +4634,15 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 # Get specific content by ID
                 content_id = self.path.split('/')[-1]
                 self.handle_get_content(content_id)
+            elif self.path.startswith('/api/admin/cats/') and self.path.endswith('/movement'):
+                path_parts = [part for part in self.path.split('/') if part]
+                try:
+                    cat_id = int(path_parts[3])
+                    self.handle_get_cat_movement(cat_id)
+                except (ValueError, IndexError):
+                    self.send_response(400)
+                    self.end_headers()
+                    self.wfile.write(json.dumps({"error": "Invalid cat ID"}).encode())
             elif self.path == '/api/admin/cat-profiles':
                 self.handle_get_cat_profiles_admin()
             elif self.path.startswith('/api/admin/cat-profiles/'):
@@ -2227,12 +4668,32 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.handle_get_recognition_settings()
             elif self.path == '/api/admin/cat-references':
                 self.handle_get_reference_images()
-            elif self.path == '/api/admin/cat-recognition/events':
+            elif self.path == '/api/admin/cat-recognition/events' or self.path.startswith('/api/admin/cat-recognition/events?'):
                 self.handle_get_recognition_events()
+            elif self.path == '/api/admin/cat-recognition/pq-index':
+                self.handle_get_pq_index_status()
+            elif self.path == '/api/admin/metrics':
+                self.handle_get_metrics()
+            elif self.path == '/api/admin/stats' or self.path.startswith('/api/admin/stats?'):
+                self.handle_get_stats()
+            elif self.path == '/api/admin/db-profile' or self.path.startswith('/api/admin/db-profile?'):
+                self.handle_get_db_profile()
+            elif self.path == '/api/admin/retention':
+                self.handle_get_retention()
+            elif self.path == '/api/admin/email-outbox':
+                self.handle_get_email_outbox()
+            elif self.path.startswith('/api/admin/jobs/'):
+                self.handle_get_job(self.path.split('/')[-1])
+            elif self.path == '/api/admin/cat-recognition/recall' or self.path.startswith('/api/admin/cat-recognition/recall?'):
+                self.handle_get_search_recall()
+            elif self.path == '/api/admin/cat-recognition/hash-recall' or self.path.startswith('/api/admin/cat-recognition/hash-recall?'):
+                self.handle_get_hash_recall()
             elif self.path == '/api/messages/recipients':
                 self.handle_get_message_recipients()
             elif self.path == '/api/admin/location-history' or self.path.startswith('/api/admin/location-history?'):
                 self.handle_get_location_history()
+            elif self.path == '/api/admin/location-map' or self.path.startswith('/api/admin/location-map?'):
+                self.handle_get_location_map()
             elif self.path.startswith('/api/admin/location-history/'):
                 # Parse path to get location ID (handle query params)
                 parsed_path = urllib.parse.urlparse(self.path)
@@ -2312,6 +4773,12 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.path = '/admin-cat-editor.html'
             elif path == '/admin-location-map':
                 self.path = '/admin-location-map.html'
+            else:
+                # js/auth.<hash>.js is js/auth.js; the hash only decides how long it may be cached
+                plain_path, fingerprint = split_fingerprint(self.path)
+                if fingerprint and os.path.isfile(self.translate_path(plain_path)):
+                    self.path = plain_path
+                    self.static_fingerprint = fingerprint
             
             # 尝试提供静态文件
             try:
@@ -2500,14 +4967,20 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.wfile.write(json.dumps({"message": "Cat restored to pending review"}).encode())
     
     def handle_get_cats(self):
-        """Handle getting all approved cats"""
+        """Handle getting approved cats, optionally one keyset page at a time"""
+        ok, page = self.parse_page_request()
+        if not ok:
+            return
         try:
-            cats = db.get_all_cats()
+            if page:
+                cats = db.get_all_cats(limit=page.fetch_limit, after=page.after)
+            else:
+                cats = db.get_all_cats()
             cats = [sanitize_cat_record(cat) for cat in cats]
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps(cats).encode())
+            self.wfile.write(json.dumps(page.wrap(cats) if page else cats).encode())
         except Exception as e:
             self.send_response(500)
             self.end_headers()
@@ -2522,16 +4995,20 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
             return
+
+        ok, page = self.parse_page_request()
+        if not ok:
+            return
         
         try:
-            cats = db.get_all_cats_admin()
+            if page:
+                cats = db.get_all_cats_admin(limit=page.fetch_limit, after=page.after)
+            else:
+                cats = db.get_all_cats_admin()
             for cat in cats:
-                cat_id = cat.get('id')
                 sanitized = sanitize_cat_record(cat)
                 if sanitized is None:
                     continue
-                if cat_id is not None:
-                    sanitized['reference_count'] = db.count_reference_images(cat_id)
                 sanitized['owner_name'] = cat.get('owner_name')
                 sanitized['owner_email'] = cat.get('owner_email')
                 cat.clear()
@@ -2539,7 +5016,7 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps(cats).encode())
+            self.wfile.write(json.dumps(page.wrap(cats) if page else cats).encode())
         except Exception as e:
             self.send_response(500)
             self.end_headers()
@@ -2823,10 +5300,14 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 hash_length=hash_length,
                 embedding_bytes=embedding_to_blob(embedding),
                 is_primary=is_primary,
+                hash_version=cat_recognizer.hash_version,
+                rehash_reference=rehash_reference,
             )
 
             if is_primary:
                 db.update_cat_profile(cat_id, {"image_path": stored_path})
+            index_reference_embeddings([(reference_id, embedding)])
+            index_reference_hash(reference_id, hash_bits)
 
             saved_references.append({
                 "id": reference_id,
@@ -2835,7 +5316,6 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 "is_primary": is_primary,
             })
 
-        recompute_cat_signature(cat_id)
         references = db.get_cat_reference_images(cat_id)
 
         self.send_response(201)
@@ -2951,6 +5431,9 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         ids = reference_ids if reference_ids else None
         recompute_cat_signature(cat_id, reference_ids=ids)
         cat = sanitize_cat_record(db.get_cat_by_id(cat_id))
+        event_broker.publish(['admins'], 'reprocess', {
+            "cat_id": cat_id, "reprocessed_count": reprocessed_count, "done": 1, "total": 1,
+        })
 
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
@@ -2977,7 +5460,7 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             total_images = 0
             failed_cats = []
             
-            for cat in cats:
+            for index, cat in enumerate(cats, start=1):
                 cat_id = cat.get('id')
                 if not cat_id:
                     continue
@@ -2993,6 +5476,9 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 except Exception as exc:
                     cat_name = cat.get('name', f'Cat {cat_id}')
                     failed_cats.append({"cat_id": cat_id, "name": cat_name, "error": str(exc)})
+                event_broker.publish(['admins'], 'reprocess', {
+                    "cat_id": cat_id, "done": index, "total": len(cats), "failed": len(failed_cats),
+                })
             
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
@@ -3019,10 +5505,10 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
 
         try:
             cats = db.get_all_cats_admin()
+            references_by_cat = db.get_reference_images_by_cat()
             for cat in cats:
-                cat_id = cat.get('id')
                 sanitized = sanitize_cat_record(cat) or {}
-                references = db.get_cat_reference_images(cat_id)
+                references = references_by_cat.get(cat.get('id'), [])
                 sanitized['reference_images'] = references
                 sanitized['reference_count'] = len(references)
                 sanitized['owner_name'] = cat.get('owner_name')
@@ -3089,6 +5575,12 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             "cat_count": len(cat_ids),
             "device": str(cat_recognizer.device),
         })
+        if user.get('is_admin'):
+            tracing = get_tracing_settings()
+            settings.update({
+                "trace_sample_rate": tracing["sample_rate"],
+                "trace_response_header": tracing["response_header"],
+            })
 
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
@@ -3151,61 +5643,548 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 except (TypeError, ValueError):
                     errors.append("max_hamming must be a non-negative integer or blank")
 
-        reset_recognizer = False
+        reset_recognizer = False
+
+        if 'model_path' in data:
+            model_path = (data['model_path'] or '').strip()
+            updates['cat_recognition.model_path'] = model_path
+            reset_recognizer = True
+
+        if 'hash_length_override' in data:
+            hash_length_value = (data['hash_length_override'] or '').strip()
+            if hash_length_value == '':
+                updates['cat_recognition.hash_length_override'] = ''
+                reset_recognizer = True
+            else:
+                try:
+                    override_int = int(hash_length_value)
+                    if override_int <= 0:
+                        raise ValueError
+                    updates['cat_recognition.hash_length_override'] = str(override_int)
+                    reset_recognizer = True
+                except (TypeError, ValueError):
+                    errors.append("hash_length_override must be a positive integer or blank")
+
+        if 'search_mode' in data:
+            search_mode = (data['search_mode'] or '').strip()
+            if search_mode in RECOGNITION_SEARCH_MODES:
+                updates['cat_recognition.search_mode'] = search_mode
+            else:
+                errors.append(f"search_mode must be one of: {', '.join(RECOGNITION_SEARCH_MODES)}")
+
+        if 'pq_candidates' in data:
+            try:
+                pq_candidates = int(data['pq_candidates'])
+                if pq_candidates <= 0:
+                    raise ValueError
+                updates['cat_recognition.pq_candidates'] = str(pq_candidates)
+            except (TypeError, ValueError):
+                errors.append("pq_candidates must be a positive integer")
+
+        if 'pq_rerank' in data:
+            updates['cat_recognition.pq_rerank'] = 'true' if data['pq_rerank'] else 'false'
+
+        if 'hierarchical_top_cats' in data:
+            try:
+                top_cats = int(data['hierarchical_top_cats'])
+                if top_cats <= 0:
+                    raise ValueError
+                updates['cat_recognition.hierarchical_top_cats'] = str(top_cats)
+            except (TypeError, ValueError):
+                errors.append("hierarchical_top_cats must be a positive integer")
+
+        if 'trace_sample_rate' in data:
+            try:
+                sample_rate = float(data['trace_sample_rate'])
+                if not 0.0 <= sample_rate <= 1.0:
+                    raise ValueError
+                updates['tracing.sample_rate'] = str(sample_rate)
+            except (TypeError, ValueError):
+                errors.append("trace_sample_rate must be a number between 0 and 1")
+
+        if 'trace_response_header' in data:
+            updates['tracing.response_header'] = 'true' if data['trace_response_header'] else 'false'
+
+        hash_configuration = None
+        if 'hash_method' in data or 'hash_bits' in data:
+            hash_method = (data.get('hash_method') or db.get_setting('cat_recognition.hash_method') or 'legacy').strip()
+            try:
+                hash_bits = int(data.get('hash_bits') or db.get_setting('cat_recognition.hash_bits') or 128)
+                if hash_bits <= 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                errors.append("hash_bits must be a positive integer")
+                hash_bits = None
+            if hash_method not in HASH_METHODS:
+                errors.append(f"hash_method must be one of: {', '.join(HASH_METHODS)}")
+            elif hash_bits is not None:
+                hash_configuration = (hash_method, hash_bits)
+
+        if errors:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"errors": errors}).encode())
+            return
+
+        # Fit the hasher before storing anything, so a failure leaves every setting unchanged
+        hasher = None
+        if hash_configuration is not None:
+            try:
+                hasher = build_hasher(*hash_configuration)
+            except ValueError as exc:
+                self.send_response(400)
+                self.end_headers()
+                self.wfile.write(json.dumps({"errors": [str(exc)]}).encode())
+                return
+
+        for key, value in updates.items():
+            db.set_setting(key, value)
+
+        global cat_recognizer
+        if reset_recognizer:
+            cat_recognizer = create_cat_recognizer_from_settings()
+
+        rehash = None
+        if hash_configuration is not None:
+            rehash = apply_hash_configuration(*hash_configuration, hasher)
+        elif reset_recognizer:
+            backfill_runner.start()
+
+        settings = get_recognition_settings()
+        tracing = get_tracing_settings()
+        settings.update({
+            "trace_sample_rate": tracing["sample_rate"],
+            "trace_response_header": tracing["response_header"],
+        })
+        response = {"message": "Recognition settings updated", "settings": settings}
+        if rehash is not None:
+            # References are rehashed in the background; poll /api/admin/db-profile for progress
+            response["rehash"] = rehash
+        self.send_response(202 if rehash is not None else 200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode())
+
+    def handle_get_metrics(self):
+        """Expose request metrics in the Prometheus text format (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        body = request_metrics.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_get_db_profile(self):
+        """Per-method query statistics, slow queries and index candidates (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        try:
+            slow_limit = int(query_params.get('slow', [50])[0])
+        except ValueError:
+            slow_limit = 50
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        profile = query_profiler.snapshot(slow_limit=slow_limit)
+        profile['schema'] = db.get_schema_status()
+        profile['schema']['backfills'] = backfill_runner.status()
+        self.wfile.write(json.dumps(profile).encode())
+
+    def handle_update_db_profile(self):
+        """Change the slow-query threshold and/or reset collected statistics (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except (TypeError, ValueError):
+            content_length = 0
+        payload = self.rfile.read(content_length) if content_length else b''
+        try:
+            data = json.loads(payload.decode('utf-8') or '{}')
+        except json.JSONDecodeError:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Invalid JSON payload"}).encode())
+            return
+
+        if 'slow_query_ms' in data:
+            try:
+                slow_query_ms = float(data['slow_query_ms'])
+                if slow_query_ms < 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                self.send_response(400)
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "slow_query_ms must be a non-negative number"}).encode())
+                return
+            db.set_setting('db.slow_query_ms', str(slow_query_ms))
+            query_profiler.slow_threshold_ms = slow_query_ms
+
+        if data.get('reset'):
+            query_profiler.reset()
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({
+            "message": "Query profiler updated",
+            "slow_threshold_ms": query_profiler.slow_threshold_ms,
+        }).encode())
+
+    def _retention_status(self) -> Dict:
+        policy = get_retention_policy()
+        return {
+            "policy": policy.to_dict(),
+            "in_quiet_hours": in_quiet_hours(policy.quiet_hours),
+            "jobs": maintenance_runner.status(),
+            "archived_events": event_archiver.archived,
+            "removed_images": query_image_collector.removed,
+            "removed_image_bytes": query_image_collector.removed_bytes,
+            "archive_files": archive_writer.list_files(),
+        }
+
+    def handle_get_retention(self):
+        """Retention policy, maintenance job state and archive files (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(self._retention_status()).encode())
+
+    def handle_update_retention(self):
+        """Change retention periods, downsampling, image grace period or quiet hours (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except (TypeError, ValueError):
+            content_length = 0
+        payload = self.rfile.read(content_length) if content_length else b''
+        try:
+            data = json.loads(payload.decode('utf-8') or '{}')
+        except json.JSONDecodeError:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Invalid JSON payload"}).encode())
+            return
+
+        values = get_retention_policy().to_dict()
+        values.update({key: data[key] for key in DEFAULT_POLICY if key in data})
+        try:
+            policy = RetentionPolicy.from_values(values)
+        except ValueError as exc:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": str(exc)}).encode())
+            return
+        for key, value in policy.to_dict().items():
+            db.set_setting(f'retention.{key}', str(value))
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({"message": "Retention policy updated", "policy": policy.to_dict()}).encode())
+
+    def handle_run_retention(self):
+        """Start archival and image cleanup now instead of waiting for quiet hours (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        maintenance_runner.start()
+        self.send_response(202)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({"message": "Retention run started", "jobs": maintenance_runner.status()}).encode())
+
+    def handle_get_email_outbox(self):
+        """Queued, sent and failed email counts plus recent delivery errors (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        status = db.get_outbox_status()
+        status['transport'] = db.get_setting('email.transport') or 'resend'
+        status['configured'] = email_transport() is not None
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(status).encode())
+
+    def handle_update_email_outbox(self):
+        """Switch between the Resend and stub transports and/or requeue failed emails (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except (TypeError, ValueError):
+            content_length = 0
+        payload = self.rfile.read(content_length) if content_length else b''
+        try:
+            data = json.loads(payload.decode('utf-8') or '{}')
+        except json.JSONDecodeError:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Invalid JSON payload"}).encode())
+            return
+
+        if 'transport' in data:
+            if data['transport'] not in ('resend', 'stub'):
+                self.send_response(400)
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "transport must be 'resend' or 'stub'"}).encode())
+                return
+            db.set_setting('email.transport', data['transport'])
+
+        retried = db.retry_failed_emails() if data.get('retry_failed') else 0
+        outbox_worker.notify()
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({
+            "message": "Email outbox updated",
+            "transport": db.get_setting('email.transport') or 'resend',
+            "retried": retried,
+        }).encode())
+
+    def handle_get_pq_index_status(self):
+        """Return the state of the product-quantization index (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        status = {"available": pq_index is not None, "path": PQ_INDEX_PATH}
+        if pq_index is not None:
+            status.update({
+                "reference_count": len(pq_index),
+                "dim": pq_index.dim,
+                "num_subspaces": pq_index.quantizer.num_subspaces,
+                "num_centroids": pq_index.quantizer.num_centroids,
+            })
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(status).encode())
+
+    def handle_rebuild_pq_index(self):
+        """Start retraining PQ codebooks and re-encoding every reference in the background (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except (TypeError, ValueError):
+            content_length = 0
+        payload = self.rfile.read(content_length) if content_length else b''
+        try:
+            data = json.loads(payload.decode('utf-8') or '{}')
+        except json.JSONDecodeError:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Invalid JSON payload"}).encode())
+            return
+
+        try:
+            num_subspaces = int(data.get('num_subspaces', 16))
+            num_centroids = int(data.get('num_centroids', 256))
+            train_size = int(data.get('train_size', 50000))
+            if num_subspaces <= 0 or not 1 <= num_centroids <= 256 or train_size <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "num_subspaces and train_size must be positive, num_centroids between 1 and 256"}).encode())
+            return
+
+        job_id = job_tracker.submit(
+            'pq_rebuild',
+            db.count_reference_embeddings(),
+            lambda progress: rebuild_pq_index(
+                num_subspaces=num_subspaces,
+                num_centroids=num_centroids,
+                train_size=train_size,
+                progress=progress,
+            ),
+        )
+
+        self.send_response(202)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({
+            "message": "PQ index rebuild started",
+            "job": job_tracker.get(job_id),
+        }).encode())
+
+    def handle_get_search_recall(self):
+        """Start a background measurement of candidate-search recall against exhaustive search (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        search_mode = query_params.get('mode', ['hierarchical'])[0]
+        if search_mode not in RECOGNITION_SEARCH_MODES:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"mode must be one of: {', '.join(RECOGNITION_SEARCH_MODES)}"}).encode())
+            return
+        try:
+            sample_size = int(query_params.get('sample', [100])[0])
+            top_k = int(query_params.get('k', [3])[0])
+            if sample_size <= 0 or top_k <= 0:
+                raise ValueError
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "sample and k must be positive integers"}).encode())
+            return
+
+        job_id = job_tracker.submit(
+            'search_recall',
+            sample_size,
+            lambda progress: measure_search_recall(search_mode, sample_size=sample_size, top_k=top_k, progress=progress),
+        )
 
-        if 'model_path' in data:
-            model_path = (data['model_path'] or '').strip()
-            updates['cat_recognition.model_path'] = model_path
-            reset_recognizer = True
+        self.send_response(202)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({
+            "message": f"Recall measurement for {search_mode} search started",
+            "job": job_tracker.get(job_id),
+        }).encode())
 
-        if 'hash_length_override' in data:
-            hash_length_value = (data['hash_length_override'] or '').strip()
-            if hash_length_value == '':
-                updates['cat_recognition.hash_length_override'] = ''
-                reset_recognizer = True
-            else:
-                try:
-                    override_int = int(hash_length_value)
-                    if override_int <= 0:
-                        raise ValueError
-                    updates['cat_recognition.hash_length_override'] = str(override_int)
-                    reset_recognizer = True
-                except (TypeError, ValueError):
-                    errors.append("hash_length_override must be a positive integer or blank")
+    def handle_get_hash_recall(self):
+        """Start a background comparison of the active hash family with a candidate one (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
 
-        if errors:
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        hash_method = query_params.get('method', ['itq'])[0]
+        if hash_method not in HASH_METHODS:
             self.send_response(400)
             self.end_headers()
-            self.wfile.write(json.dumps({"errors": errors}).encode())
+            self.wfile.write(json.dumps({"error": f"method must be one of: {', '.join(HASH_METHODS)}"}).encode())
+            return
+        try:
+            num_bits = int(query_params.get('bits', [64])[0])
+            top_k = int(query_params.get('k', [10])[0])
+            num_candidates = int(query_params.get('candidates', [100])[0])
+            sample_size = int(query_params.get('sample', [200])[0])
+            if min(num_bits, top_k, num_candidates, sample_size) <= 0:
+                raise ValueError
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "bits, k, candidates and sample must be positive integers"}).encode())
             return
 
-        for key, value in updates.items():
-            db.set_setting(key, value)
-
-        global cat_recognizer
-        if reset_recognizer:
-            cat_recognizer = create_cat_recognizer_from_settings()
+        job_id = job_tracker.submit(
+            'hash_recall',
+            2 * sample_size,
+            lambda progress: measure_hash_recall(
+                hash_method,
+                num_bits,
+                top_k=top_k,
+                num_candidates=num_candidates,
+                sample_size=sample_size,
+                progress=progress,
+            ),
+        )
 
-        settings = get_recognition_settings()
-        self.send_response(200)
+        self.send_response(202)
         self.send_header('Content-type', 'application/json')
         self.end_headers()
-        self.wfile.write(json.dumps({"message": "Recognition settings updated", "settings": settings}).encode())
+        self.wfile.write(json.dumps({
+            "message": f"Hash recall comparison with {hash_method} ({num_bits} bits) started",
+            "job": job_tracker.get(job_id),
+        }).encode())
 
     def handle_recognize_cat(self):
-        """Match an uploaded cat photo against known cats."""
+        """
+        Match an uploaded cat photo against known cats, tracing each stage.
+        Tracing settings are read once per request; ``X-Trace-Sample: 1``
+        forces sampling for admins only.
+        """
         user = self.get_current_user()
+        tracing = get_tracing_settings()
+        forced = bool(user and user.get('is_admin')) and self.headers.get('X-Trace-Sample') == '1'
+        start_trace(sampled=forced or should_sample(tracing['sample_rate']))
+        try:
+            self._recognize_cat(user, tracing)
+        finally:
+            finish_trace()
+
+    def _recognize_cat(self, user: Optional[Dict], tracing: Dict):
+        trace = current_trace()
         if not user:
             self.send_response(401)
             self.end_headers()
             self.wfile.write(json.dumps({"error": "Authentication required"}).encode())
             return
 
-        form = cgi.FieldStorage(
-            fp=self.rfile,
-            headers=self.headers,
-            environ={'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': self.headers.get('Content-Type')}
-        )
+        with span("parse_form"):
+            form = cgi.FieldStorage(
+                fp=self.rfile,
+                headers=self.headers,
+                environ={'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': self.headers.get('Content-Type')}
+            )
 
         if 'image' not in form:
             self.send_response(400)
@@ -3232,7 +6211,8 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             return
 
         try:
-            embedding, hash_hex, hash_bits = cat_recognizer.compute_signature(image_bytes)
+            with span("compute_signature"):
+                embedding, hash_hex, hash_bits = cat_recognizer.compute_signature(image_bytes)
         except Exception as exc:  # pragma: no cover
             self.send_response(500)
             self.end_headers()
@@ -3240,71 +6220,75 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             return
 
         settings = get_recognition_settings()
-        reference_records = db.list_reference_vectors()
+        with span("load_references"):
+            reference_records, search_mode = select_reference_records(embedding, settings, query_bits=hash_bits)
         references = []
         reference_lookup = {}
         cat_ids = set()
 
-        for record in reference_records:
-            if not record.get('is_approved') or record.get('is_rejected'):
-                continue
-            hash_hex_ref = record.get('hash_hex')
-            hash_length = record.get('hash_length')
-            if not hash_hex_ref or not hash_length:
-                continue
-            ref_bits = hex_to_bits(hash_hex_ref, hash_length)
-            embedding_blob = record.get('embedding_vector')
-            ref_embedding = blob_to_embedding(embedding_blob) if embedding_blob else np.array([], dtype=np.float32)
-            references.append((record['cat_id'], record['reference_id'], ref_bits, ref_embedding))
-            reference_lookup[record['reference_id']] = record
-            cat_ids.add(record['cat_id'])
-
-        raw_matches = (
-            cat_recognizer.match_against(
-                query_hash=hash_bits,
-                query_embedding=embedding,
-                references=references,
-                max_results=settings['max_results'],
-                similarity_threshold=settings['threshold'],
-                max_hamming=settings['max_hamming'],
+        with span("prepare_references"):
+            for record in reference_records:
+                if not record.get('is_approved') or record.get('is_rejected'):
+                    continue
+                hash_hex_ref = record.get('hash_hex')
+                hash_length = record.get('hash_length')
+                if not hash_hex_ref or not hash_length:
+                    continue
+                ref_bits = hex_to_bits(hash_hex_ref, hash_length)
+                embedding_blob = record.get('embedding_vector')
+                ref_embedding = blob_to_embedding(embedding_blob) if embedding_blob else np.array([], dtype=np.float32)
+                references.append((record['cat_id'], record['reference_id'], ref_bits, ref_embedding))
+                reference_lookup[record['reference_id']] = record
+                cat_ids.add(record['cat_id'])
+
+        with span("match"):
+            raw_matches = (
+                cat_recognizer.match_against(
+                    query_hash=hash_bits,
+                    query_embedding=embedding,
+                    references=references,
+                    max_results=settings['max_results'],
+                    similarity_threshold=settings['threshold'],
+                    max_hamming=settings['max_hamming'],
+                )
+                if references
+                else []
             )
-            if references
-            else []
-        )
 
         cat_cache = {}
         results_payload = []
         best_by_cat: Dict[str, Dict] = {}
 
-        for result in raw_matches:
-            cat_info = None
-            if result.cat_id is not None:
-                if result.cat_id not in cat_cache:
-                    cat_cache[result.cat_id] = sanitize_cat_record(db.get_cat_by_id(result.cat_id))
-                cat_info = cat_cache.get(result.cat_id)
-            reference_meta = reference_lookup.get(result.reference_image_id or -1)
-            payload_item = {
-                "cat": cat_info,
-                "similarity": result.similarity,
-                "hamming_distance": result.hamming_distance,
-                "matched": result.matched,
-                "reference_image_id": result.reference_image_id,
-                "reference_image_path": reference_meta.get('image_path') if reference_meta else None,
-            }
-            key = (
-                f"cat:{result.cat_id}"
-                if result.cat_id is not None
-                else f"ref:{result.reference_image_id}"
-            )
-            existing = best_by_cat.get(key)
-            if not existing or (
-                payload_item["similarity"] > existing["similarity"]
-                or (
-                    payload_item["similarity"] == existing["similarity"]
-                    and payload_item["hamming_distance"] < existing["hamming_distance"]
+        with span("build_results"):
+            for result in raw_matches:
+                cat_info = None
+                if result.cat_id is not None:
+                    if result.cat_id not in cat_cache:
+                        cat_cache[result.cat_id] = sanitize_cat_record(db.get_cat_by_id(result.cat_id))
+                    cat_info = cat_cache.get(result.cat_id)
+                reference_meta = reference_lookup.get(result.reference_image_id or -1)
+                payload_item = {
+                    "cat": cat_info,
+                    "similarity": result.similarity,
+                    "hamming_distance": result.hamming_distance,
+                    "matched": result.matched,
+                    "reference_image_id": result.reference_image_id,
+                    "reference_image_path": reference_meta.get('image_path') if reference_meta else None,
+                }
+                key = (
+                    f"cat:{result.cat_id}"
+                    if result.cat_id is not None
+                    else f"ref:{result.reference_image_id}"
                 )
-            ):
-                best_by_cat[key] = payload_item
+                existing = best_by_cat.get(key)
+                if not existing or (
+                    payload_item["similarity"] > existing["similarity"]
+                    or (
+                        payload_item["similarity"] == existing["similarity"]
+                        and payload_item["hamming_distance"] < existing["hamming_distance"]
+                    )
+                ):
+                    best_by_cat[key] = payload_item
 
         results_payload = sorted(
             best_by_cat.values(),
@@ -3317,22 +6301,35 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         save_query = str(form.getvalue('save_query', 'true')).lower() != 'false'
         query_image_path = None
         if save_query:
-            query_image_path = save_uploaded_file('uploads/cat_queries', file_item.filename, image_bytes)
+            with span("save_upload"):
+                query_image_path = save_uploaded_file(QUERY_IMAGE_DIR, file_item.filename, image_bytes)
 
         top_match = next((match for match in raw_matches if match.matched), None)
-        recognition_event_id = db.record_recognition_event(
-            cat_id=top_match.cat_id if top_match else None,
-            matched=bool(top_match),
-            match_score=float(top_match.similarity) if top_match else 0.0,
-            hash_distance=int(top_match.hamming_distance) if top_match else None,
-            metadata={
-                "threshold": settings['threshold'],
-                "max_results": settings['max_results'],
-                "references_considered": len(references),
-                "matches_returned": len(raw_matches),
-            },
-            image_path=query_image_path,
-        )
+        metadata = {
+            "threshold": settings['threshold'],
+            "max_results": settings['max_results'],
+            "references_considered": len(references),
+            "matches_returned": len(raw_matches),
+            "search_mode": search_mode,
+        }
+        if trace.sampled:
+            # The event write itself cannot be part of the stored trace; it is
+            # only reported in the Server-Timing header.
+            metadata["trace"] = trace.to_dict()
+        with span("record_event"):
+            recognition_event_id = db.record_recognition_event(
+                cat_id=top_match.cat_id if top_match else None,
+                matched=bool(top_match),
+                match_score=float(top_match.similarity) if top_match else 0.0,
+                hash_distance=int(top_match.hamming_distance) if top_match else None,
+                metadata=metadata,
+                image_path=query_image_path,
+            )
+        event_broker.publish(['admins'], 'recognition', {
+            "recognition_event_id": recognition_event_id,
+            "cat_id": top_match.cat_id if top_match else None,
+            "matched": bool(top_match),
+        })
 
         response_payload = {
             "matches": confirmed_matches,
@@ -3345,6 +6342,9 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
 
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
+        if trace.sampled and tracing['response_header']:
+            self.send_header('X-Trace-Id', trace.trace_id)
+            self.send_header('Server-Timing', trace.server_timing())
         self.end_headers()
         self.wfile.write(json.dumps(response_payload).encode())
 
@@ -3388,6 +6388,8 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         try:
             deleted = db.delete_reference_image(reference_id)
             if deleted:
+                remove_from_pq_index([reference_id])
+                remove_from_hamming_index(reference_id)
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
                 self.end_headers()
@@ -3538,14 +6540,32 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
             return
 
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
         try:
-            limit_param = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).get('limit', [None])[0]
+            limit_param = query_params.get('limit', [None])[0]
             limit = int(limit_param) if limit_param else 200
         except ValueError:
             limit = 200
+        try:
+            min_total_param = query_params.get('min_total_ms', [None])[0]
+            min_total_ms = float(min_total_param) if min_total_param else None
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "min_total_ms must be a number"}).encode())
+            return
+        trace_id = query_params.get('trace_id', [None])[0]
+        ok, page = self.parse_page_request()
+        if not ok:
+            return
 
         try:
-            events = db.list_recognition_events(limit)
+            if page:
+                events = db.list_recognition_events(
+                    page.fetch_limit, min_total_ms=min_total_ms, trace_id=trace_id, after=page.after
+                )
+            else:
+                events = db.list_recognition_events(limit, min_total_ms=min_total_ms, trace_id=trace_id)
             for event in events:
                 event['matched'] = bool(event.get('matched'))
                 metadata = event.get('request_metadata')
@@ -3557,7 +6577,7 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps(events).encode())
+            self.wfile.write(json.dumps(page.wrap(events) if page else events).encode())
         except Exception as exc:
             self.send_response(500)
             self.end_headers()
@@ -3687,6 +6707,9 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         message_subject = f"领养申请已更新：{cat.get('name')}"
         message_content = f"您的领养申请状态已更新为：{status}。如需了解详情，请联系管理员。"
         db.send_message(user['id'], adopter['id'], message_subject, message_content)
+        publish_inbox_change(adopter['id'])
+        adoption_event = {"request_id": request_id, "cat_id": request_record['cat_id'], "status": status}
+        event_broker.publish([f"user:{adopter['id']}", 'admins'], 'adoption', adoption_event)
 
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
@@ -3719,6 +6742,7 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         
         # Send message
         message_id = db.send_message(user['id'], receiver_id, subject, content)
+        publish_inbox_change(receiver_id)
         
         self.send_response(201)
         self.send_header('Content-type', 'application/json')
@@ -3734,18 +6758,118 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"error": "Authentication required"}).encode())
             return
+
+        ok, page = self.parse_page_request()
+        if not ok:
+            return
         
         try:
-            messages = db.get_user_messages(user['id'])
+            if page:
+                messages = db.get_user_messages(user['id'], limit=page.fetch_limit, after=page.after)
+            else:
+                messages = db.get_user_messages(user['id'])
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps(messages).encode())
+            self.wfile.write(json.dumps(page.wrap(messages) if page else messages).encode())
         except Exception as e:
             self.send_response(500)
             self.end_headers()
             self.wfile.write(json.dumps({"error": str(e)}).encode())
 
+    def handle_event_stream(self):
+        """
+        Server-sent events for the current user: 'inbox', 'adoption' and, for
+        admins, 'job', 'reprocess' and 'recognition'. The socket is handed to
+        the SSE hub and this request returns immediately.
+        """
+        user = self.get_current_user()
+        if not user:
+            self.send_response(401)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Authentication required"}).encode())
+            return
+
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        raw_last_id = self.headers.get('Last-Event-ID') or query_params.get('last_event_id', [None])[0]
+        try:
+            last_event_id = int(raw_last_id) if raw_last_id else None
+        except ValueError:
+            last_event_id = None
+
+        channels = [f"user:{user['id']}", 'all']
+        if user.get('is_admin'):
+            channels.append('admins')
+
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.end_headers()
+        self.close_connection = True
+        event_hub.attach(self.connection, channels, last_event_id)
+
+    def handle_get_unread_count(self):
+        """Unread inbox count and current change sequence; one primary-key read."""
+        user = self.get_current_user()
+        if not user:
+            self.send_response(401)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Authentication required"}).encode())
+            return
+
+        state = db.get_inbox_state(user['id'])
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({"unread_count": state['unread_count'], "seq": state['seq']}).encode())
+
+    def handle_get_message_changes(self):
+        """
+        Inbox messages added or changed after ``since`` (a ``seq`` from a previous
+        response). ``resync`` means messages were deleted and the client should
+        reload the inbox; ``has_more`` means another call with the returned
+        ``seq`` has further changes.
+        """
+        user = self.get_current_user()
+        if not user:
+            self.send_response(401)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Authentication required"}).encode())
+            return
+
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        try:
+            since = int(query_params['since'][0])
+            limit = min(max(int(query_params.get('limit', [MESSAGE_CHANGES_LIMIT])[0]), 1), MESSAGE_CHANGES_LIMIT)
+            if since < 0:
+                raise ValueError("since must not be negative")
+        except (KeyError, ValueError) as exc:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"Invalid query parameters: {exc}"}).encode())
+            return
+
+        state = db.get_inbox_state(user['id'])
+        response = {"unread_count": state['unread_count'], "seq": state['seq'], "resync": False, "has_more": False}
+        if since < state['resync_seq'] or since > state['seq']:
+            response["resync"] = True
+            response["messages"] = []
+        else:
+            messages = db.get_inbox_changes(user['id'], since, limit + 1)
+            response["has_more"] = len(messages) > limit
+            response["messages"] = messages[:limit]
+            if response["has_more"]:
+                response["seq"] = response["messages"][-1]['inbox_seq']
+            elif messages:
+                # A message stored after the state was read is already included
+                response["seq"] = max(state['seq'], messages[-1]['inbox_seq'])
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode())
+
     def handle_mark_message_read(self, message_id: int):
         """Mark a message as read for the current user"""
         user = self.get_current_user()
@@ -3757,6 +6881,8 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
 
         success = db.mark_message_as_read_for_user(message_id, user['id'])
         if success:
+            # Other open tabs of the same user update their badge
+            publish_inbox_change(user['id'])
             self.send_response(200)
             self.end_headers()
             self.wfile.write(json.dumps({"message": "Message marked as read"}).encode())
@@ -3774,13 +6900,20 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"error": "Authentication required"}).encode())
             return
+
+        ok, page = self.parse_page_request()
+        if not ok:
+            return
         
         try:
-            messages = db.get_user_sent_messages(user['id'])
+            if page:
+                messages = db.get_user_sent_messages(user['id'], limit=page.fetch_limit, after=page.after)
+            else:
+                messages = db.get_user_sent_messages(user['id'])
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps(messages).encode())
+            self.wfile.write(json.dumps(page.wrap(messages) if page else messages).encode())
         except Exception as e:
             self.send_response(500)
             self.end_headers()
@@ -3846,18 +6979,42 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.wfile.write(json.dumps({"error": "Subject and content are required"}).encode())
             return
 
-        recipients = db.get_all_users()
-        targets = [
-            r for r in recipients
-            if r['id'] != user['id'] and (include_admins or not r.get('is_admin'))
-        ]
+        recipient_ids = db.list_broadcast_recipient_ids(user['id'], include_admins)
+        sender_id = user['id']
+        job_id = job_tracker.submit(
+            'broadcast',
+            len(recipient_ids),
+            lambda progress: broadcast_messages(sender_id, recipient_ids, subject, content, progress),
+        )
+
+        self.send_response(202)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({
+            "message": f"Broadcast to {len(recipient_ids)} recipients started",
+            "job": job_tracker.get(job_id),
+        }).encode())
+
+    def handle_get_job(self, job_id: str):
+        """Progress of a background job (admin only)."""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
 
-        for recipient in targets:
-            db.send_message(user['id'], recipient['id'], subject, content)
+        job = job_tracker.get(job_id)
+        if not job:
+            self.send_response(404)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Job not found"}).encode())
+            return
 
         self.send_response(200)
+        self.send_header('Content-type', 'application/json')
         self.end_headers()
-        self.wfile.write(json.dumps({"message": f"Broadcast sent to {len(targets)} recipients"}).encode())
+        self.wfile.write(json.dumps(job).encode())
     
     def handle_get_content(self, content_id):
         """Handle getting specific content by ID"""
@@ -4734,6 +7891,8 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 recognition_event_id=recognition_event_id,
                 image_path=image_path,
             )
+            # Recompute the cat's simplified trajectory in the background.
+            backfill_runner.start()
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
@@ -4755,6 +7914,10 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
             return
 
+        ok, page = self.parse_page_request()
+        if not ok:
+            return
+
         try:
             query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
             start_year = query_params.get('start_year', [None])[0]
@@ -4764,6 +7927,12 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             start_year = int(start_year) if start_year else None
             end_year = int(end_year) if end_year else None
             cat_id = int(cat_id) if cat_id else None
+            start_date = query_params.get('start_date', [None])[0]
+            end_date = query_params.get('end_date', [None])[0]
+            bbox = query_params.get('bbox', [None])[0]
+            start_time = parse_history_time_bound(start_date) if start_date else None
+            end_time = parse_history_time_bound(end_date, end=True) if end_date else None
+            bbox = parse_bbox(bbox) if bbox else None
 
             # Validate year range (1999-3000)
             if start_year is not None and not (1999 <= start_year <= 3000):
@@ -4782,6 +7951,11 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 start_year=start_year,
                 end_year=end_year,
                 cat_id=cat_id,
+                limit=page.fetch_limit if page else None,
+                after=page.after if page else None,
+                start_time=start_time,
+                end_time=end_time,
+                bbox=bbox,
             )
 
             # Ensure locations is a list
@@ -4801,7 +7975,7 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps(locations, ensure_ascii=False).encode())
+            self.wfile.write(json.dumps(page.wrap(locations) if page else locations, ensure_ascii=False).encode())
         except ValueError as ve:
             self.send_response(400)
             self.end_headers()
@@ -4814,6 +7988,153 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"error": f"Internal server error: {str(exc)}"}).encode())
 
+    def handle_get_stats(self):
+        """
+        Recognition and sighting trends from the rollup tables (admin only).
+        Query: ``granularity`` (hour|day), optional ``start_date`` / ``end_date``
+        and ``cat_id`` (filters the sighting figures).
+        """
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        try:
+            query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            granularity = query_params.get('granularity', ['day'])[0]
+            start_date = query_params.get('start_date', [None])[0]
+            end_date = query_params.get('end_date', [None])[0]
+            cat_id = query_params.get('cat_id', [None])[0]
+            cat_id = int(cat_id) if cat_id else None
+            first_bucket, stop_bucket = bucket_range(
+                granularity,
+                parse_history_time_bound(start_date) if start_date else None,
+                parse_history_time_bound(end_date, end=True) if end_date else None,
+            )
+        except ValueError as ve:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"Invalid query parameters: {str(ve)}"}).encode())
+            return
+
+        stats = db.get_rollup_stats(granularity, first_bucket, stop_bucket, cat_id=cat_id)
+        stats.update(
+            granularity=granularity,
+            start=first_bucket,
+            end=stop_bucket,
+            backfilling=db.has_pending_rollup_backfill(),
+        )
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(stats, ensure_ascii=False).encode())
+
+    def handle_get_cat_movement(self, cat_id: int):
+        """Precomputed movement summary of one cat: last seen, home range and recent path (admin only)"""
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        summary = db.get_cat_movement_summary(cat_id)
+        if summary is None:
+            self.send_response(404)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "No sightings recorded for this cat"}).encode())
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(summary, ensure_ascii=False).encode())
+
+    def handle_get_location_map(self):
+        """
+        Viewport query for the admin location map (``bbox`` and Leaflet ``zoom``
+        required). Below ``POINTS_MIN_ZOOM`` the response holds per-cell cluster
+        counts sized to the zoom level; from there on it holds individual points.
+        """
+        user = self.get_current_user()
+        if not user or not user.get('is_admin'):
+            self.send_response(403)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Admin access required"}).encode())
+            return
+
+        try:
+            query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            bbox = query_params.get('bbox', [None])[0]
+            zoom = query_params.get('zoom', [None])[0]
+            if not bbox or zoom is None:
+                raise ValueError("bbox and zoom are required")
+            bbox = parse_bbox(bbox)
+            zoom = int(zoom)
+            if not 0 <= zoom <= 22:
+                raise ValueError("zoom must be between 0 and 22")
+            cat_id = query_params.get('cat_id', [None])[0]
+            cat_id = int(cat_id) if cat_id else None
+            start_date = query_params.get('start_date', [None])[0]
+            end_date = query_params.get('end_date', [None])[0]
+            start_time = parse_history_time_bound(start_date) if start_date else None
+            end_time = parse_history_time_bound(end_date, end=True) if end_date else None
+        except ValueError as ve:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"Invalid query parameters: {str(ve)}"}).encode())
+            return
+
+        try:
+            response = {
+                "zoom": zoom,
+                "indexing": backfill_runner.is_running('location_geohashes'),
+            }
+            if zoom >= POINTS_MIN_ZOOM:
+                points = db.get_location_points(
+                    covering_geohashes(bbox),
+                    bbox,
+                    cat_id=cat_id,
+                    start_time=start_time,
+                    end_time=end_time,
+                    limit=LOCATION_MAP_MAX_POINTS + 1,
+                )
+                response.update(
+                    mode='points',
+                    points=points[:LOCATION_MAP_MAX_POINTS],
+                    total=min(len(points), LOCATION_MAP_MAX_POINTS),
+                    truncated=len(points) > LOCATION_MAP_MAX_POINTS,
+                )
+            else:
+                precision = cluster_precision(zoom)
+                clusters = db.get_location_clusters(
+                    precision,
+                    covering_geohashes(bbox, max_precision=precision),
+                    cat_id=cat_id,
+                    start_time=start_time,
+                    end_time=end_time,
+                )
+                response.update(
+                    mode='clusters',
+                    precision=precision,
+                    clusters=clusters,
+                    total=sum(cluster['point_count'] for cluster in clusters),
+                    truncated=False,
+                )
+
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode())
+        except Exception as exc:
+            print(f"Error in handle_get_location_map: {exc}")
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"Internal server error: {str(exc)}"}).encode())
+
     def handle_get_location_by_id(self, location_id: int):
         """Get a single location record by ID (admin only)"""
         user = self.get_current_user()
@@ -4945,6 +8266,45 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"error": "Failed to reset password"}).encode())
     
+    def send_head(self):
+        """Serve static files with ETag / Last-Modified validators, answering 304 when unchanged."""
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path) or path.endswith('/'):
+            return super().send_head()
+        # Build-time .br / .gz variants are sent as-is when the client accepts them
+        variant = precompressed_variant(path, self.headers.get('Accept-Encoding'))
+        encoding, body_path = variant if variant else (None, path)
+        try:
+            info = static_files.get(path)
+            f = open(body_path, 'rb')
+        except OSError:
+            return super().send_head()
+        etag = variant_etag(info, encoding)
+        if self.static_fingerprint and self.static_fingerprint == info.fingerprint:
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            cache_control = REVALIDATE_CACHE_CONTROL
+        if not_modified(self.headers, info, etag):
+            f.close()
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', info.last_modified)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return None
+        self.send_response(200)
+        self.send_header('Content-type', self.guess_type(path))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', info.last_modified)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        return f
+
     def guess_type(self, path):
         # 使用mimetypes模块猜测MIME类型
         mimetype, _ = mimetypes.guess_type(path)
@@ -4952,9 +8312,6 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             mimetype = 'application/octet-stream'
         return mimetype
 
-# 设置当前工作目录
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
-
 # Generate super admin login link on startup
 def generate_startup_admin_login_link():
     """Generate and display super admin login link on server startup.
@@ -5001,14 +8358,34 @@ def generate_startup_admin_login_link():
         print(f"\n⚠️  警告: 生成超级管理员登录链接时出错: {str(e)}")
         print("   Warning: Error generating super admin login link:", str(e))
 
-# Generate admin login link on startup
-generate_startup_admin_login_link()
+if __name__ == '__main__':
+    # 设置当前工作目录
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-# 启动服务器
-with socketserver.TCPServer((HOST, PORT), CustomHTTPRequestHandler) as httpd:
-    print(f"流浪猫公益项目服务器运行在 http://{HOST}:{PORT}/")
-    print("按 Ctrl+C 停止服务器")
-    try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        print("\n服务器已停止")
\ No newline at end of file
+    # Generate admin login link on startup
+    generate_startup_admin_login_link()
+
+    # Bulk data migrations run in batches while the server already accepts requests
+    backfill_runner.start()
+
+    # Archival of old recognition events and query-photo cleanup run in quiet hours
+    retention_scheduler.start()
+
+    # Emails are delivered from the outbox; messages a previous run was sending go out again
+    released = db.release_outbox_claims()
+    if released:
+        print(f"[Email] Requeued {released} messages interrupted by the last shutdown")
+    outbox_worker.start()
+
+    # Pushes server-sent events to the sockets of /api/events requests
+    event_hub.start()
+
+    # 启动服务器
+    with CatalistHTTPServer((HOST, PORT), CustomHTTPRequestHandler) as httpd:
+        print(f"流浪猫公益项目服务器运行在 http://{HOST}:{PORT}/")
+        print("按 Ctrl+C 停止服务器")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            save_pq_index()
+            print("\n服务器已停止")
\ No newline at end of file